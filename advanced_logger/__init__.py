@@ -1,4 +1,10 @@
 from .advanced_logger import register_logger, deregister_logger, clear_all_loggers, \
-    initialize_logger_settings, basic_config, set_global_log_level, \
-    AdvancedLogger, random_chance
+    initialize_logger_settings, basic_config, set_global_log_level, flush_rate_limit_summaries, get_registry_stats, \
+    get_metrics_snapshot, reset_metrics, \
+    AdvancedLogger, BoundAdvancedLogger, random_chance, \
+    bind_request_context, reset_request_context, request_context, copy_request_context
 from .json_encoder.advanced_json_encoder import AdvancedJSONEncoder
+from .sampling import Sampler, RandomSampler, EveryNthSampler, HashSampler
+from .rate_limiting import RateLimiter
+from .exception_aggregation import ExceptionAggregator
+from .payload_limits import PayloadLimits
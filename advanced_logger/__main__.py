@@ -0,0 +1,10 @@
+"""
+python -m advanced_logger, the same as the advanced-logger-query command, see advanced_logger.log_reader
+"""
+import sys
+
+from advanced_logger.log_reader import main
+
+__author__ = 'neil@everymundo.com'
+
+sys.exit(main())
@@ -1,16 +1,43 @@
 import os
 import re
+import json
+import hashlib
 import sys
 import random
+import threading
+import time
+import weakref
+import contextvars
 import traceback
-import json
+import linecache
 import logging
-from datetime import datetime
+from contextlib import contextmanager
+from functools import partial, lru_cache
 from logging import Logger as BaseLogger
-from typing import Optional, Dict, Union, List, Callable, TextIO
+from typing import Optional, Dict, Union, List, Callable, TextIO, Hashable, NamedTuple
 from typing.io import IO
 
-from advanced_logger.json_encoder.advanced_json_encoder import RE_TYPE, AdvancedJSONEncoder
+from advanced_logger.json_encoder.advanced_json_encoder import RE_TYPE
+from advanced_logger.json_encoder.json_backends import get_json_backend
+from advanced_logger.handlers.async_queue_handler import AsyncQueueHandler, OVERFLOW_BLOCK
+from advanced_logger.handlers.buffered_handler import BufferedStreamHandler, BufferedFileHandler, \
+    DEFAULT_MAX_BUFFER_BYTES, DEFAULT_FLUSH_INTERVAL
+from advanced_logger.handlers.mmap_file_handler import MmapSegmentFileHandler, DEFAULT_SEGMENT_SIZE
+from advanced_logger.handlers.binary_file_handler import BinaryFileHandler
+from advanced_logger.handlers.indexed_file_handler import IndexedFileHandler
+from advanced_logger.handlers.compressed_file_handler import CompressedSegmentFileHandler, check_compression
+from advanced_logger.handlers.multiprocess_handler import MultiprocessLogServer, MultiprocessClientHandler
+from advanced_logger.handlers.asyncio_sink import get_asyncio_sink, close_asyncio_sink
+from advanced_logger.sampling import Sampler, get_ratio_sampler
+from advanced_logger.rate_limiting import RateLimiter, SuppressedSummary
+from advanced_logger.exception_aggregation import ExceptionAggregator
+from advanced_logger.log_index import DEFAULT_BUCKET_SECONDS
+from advanced_logger.metrics import PipelineMetrics
+from advanced_logger.payload_limits import PayloadLimits
+from advanced_logger.registry import LoggerRegistry, RegistryStats
+from advanced_logger.timestamps import TimestampProvider, get_timestamp_provider, format_timestamp
+from advanced_logger.context import ContextFragment, get_request_context, set_request_context, \
+    reset_request_context, join_context_json, splice_context_json
 
 __author__ = 'neil@everymundo.com'
 
@@ -22,21 +49,137 @@ def _default_is_testing_fn():
 
 
 _GLOBAL_LOG_LEVEL = logging.DEBUG
+# bumped by set_global_log_level(update_existing=True), each logger picks up _GLOBAL_LOG_LEVEL the next time it's used
+_LEVEL_GENERATION = 0
+_MANAGER = logging.Logger.manager
+# the level methods which are swapped for no-ops on loggers which don't have their level enabled
+_LEVEL_METHOD_NAMES = (
+    (logging.DEBUG, 'debug'),
+    (logging.INFO, 'info'),
+    (logging.WARNING, 'warning'),
+    (logging.ERROR, 'error'),
+    (logging.CRITICAL, 'critical'),
+)
 _LOG_STREAM_DESTINATION = sys.stdout
 _LOG_FILE_DESTINATION = None
 
-_registered_loggers = set()
+
+
+def _remove_from_manager(lgr: BaseLogger):
+    # only if it's still the logger registered with the stdlib logging manager under that name
+    if logging.Logger.manager.loggerDict.get(lgr.name) is lgr:
+        del logging.Logger.manager.loggerDict[lgr.name]
+
+
+_registered_loggers = LoggerRegistry(on_release=_remove_from_manager)
+# guards changes to _registered_loggers, replaced in the child after a fork in case another thread was holding it
+_REGISTRY_LOCK = threading.RLock()
+
+
+def _acquire_registry_lock_before_fork():
+    _REGISTRY_LOCK.acquire()
+
+
+def _release_registry_lock_after_fork_in_parent():
+    _REGISTRY_LOCK.release()
+
+
+def _reinit_registry_lock_after_fork_in_child():
+    global _REGISTRY_LOCK
+    _REGISTRY_LOCK = threading.RLock()
+
+
+if hasattr(os, 'register_at_fork'):
+    # the registry is never forked half way through a change, e.g. for pre-fork servers
+    os.register_at_fork(
+        before=_acquire_registry_lock_before_fork,
+        after_in_parent=_release_registry_lock_after_fork_in_parent,
+        after_in_child=_reinit_registry_lock_after_fork_in_child,
+    )
+
 
 _PROJECT_DIR_NAME: Optional[str] = None
 _PREFIX = ""
 _IS_TESTING = _default_is_testing_fn
 _TESTING_HOOK = None
 _DEBUG_HOOK = None
-_AdvancedJSONEncoder = AdvancedJSONEncoder  # TODO, swappable
+_JSON_TYPE_ENCODERS = None  # type: Optional[Dict[type, Callable]]
+_JSON_BACKEND = get_json_backend('stdlib')
 _CURRENT_BASE_LOGGER_CLASS = logging.Logger
 
+_ASYNC_EMISSION = False
+_ASYNC_QUEUE_SIZE = 10000
+_ASYNC_OVERFLOW_POLICY = OVERFLOW_BLOCK
+_BUFFERED_OUTPUT = False
+_BUFFER_MAX_BYTES = DEFAULT_MAX_BUFFER_BYTES
+_BUFFER_FLUSH_INTERVAL = DEFAULT_FLUSH_INTERVAL
+_LOG_FILE_SINK = 'file'
+_LOG_FILE_SEGMENT_SIZE = DEFAULT_SEGMENT_SIZE
+_LOG_FILE_SEGMENT_INTERVAL = None  # type: Optional[float]
+_LOG_FILE_COMPRESSION = 'gzip'
+_LOG_FILE_INDEX = False
+_LOG_FILE_INDEX_BUCKET = DEFAULT_BUCKET_SECONDS
+_MULTIPROCESS_MODE = False
+_MULTIPROCESS_SOCKET_PATH = None  # type: Optional[str]
+_MULTIPROCESS_SERVER = None  # type: Optional[MultiprocessLogServer]
+_RATE_LIMITER = None  # type: Optional[RateLimiter]
+_EXCEPTION_AGGREGATOR = None  # type: Optional[ExceptionAggregator]
+_TIMESTAMP_PROVIDER = get_timestamp_provider('iso')  # type: TimestampProvider
+_PAYLOAD_LIMITS = None  # type: Optional[PayloadLimits]
+_LOG_FILE_SINKS = ('file', 'mmap', 'compressed', 'binary')
+# set when an option which changes the root handlers has been updated, so basic_config knows to replace them
+_OUTPUT_SETTINGS_CHANGED = False
+
 _LOGGER_OUTPUT_TYPE = Union[str, List, '_LOGGER_OUTPUT_TYPE']
 
+# placeholders for the per record values, which are split out of the encoded envelope
+_ENVELOPE_MSG = '__advanced_logger_envelope_msg__'
+_ENVELOPE_TIME = '__advanced_logger_envelope_time__'
+# spliced into meta right after the time, when the record's msg was cut by the payload limits
+_TRUNCATED_META_JSON = ', "truncated": true'
+# bumped by initialize_logger_settings, so every logger rebuilds its envelopes with the current settings
+_ENVELOPE_GENERATION = 0
+
+# counters and histograms of the pipeline, None when turned off with initialize_logger_settings(metrics=False)
+_METRICS = PipelineMetrics()  # type: Optional[PipelineMetrics]
+# seconds between the records with the metrics logged on _METRICS_LOGGER_NAME, None for no records
+_METRICS_INTERVAL = None  # type: Optional[float]
+_METRICS_LOGGER_NAME = 'advanced_logger.metrics'
+# records the library logs itself on behalf of a logger which isn't registered (anymore) go through this logger,
+# so looking it up doesn't put a released logger back in the stdlib logging manager
+_INTERNAL_LOGGER_NAME = 'advanced_logger'
+# frames in here are skipped when looking for the call site of a logging call
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+
+_TRACEBACK_FILE_LINE_RE = re.compile(r'^(.*)", (line [0-9]+), in (.+)$')
+_CAUSE_MESSAGE = 'The above exception was the direct cause of the following exception:'
+_CONTEXT_MESSAGE = 'During handling of the above exception, another exception occurred:'
+# same as the traceback module, recursive frames past this many are collapsed into one line
+_RECURSIVE_CUTOFF = 3
+
+
+class _DeferredJSONMessage(object):
+    """
+    Stand-in for a LogRecord's msg which only serializes the log object the first time the record is formatted.
+    Records dropped by filters or handler levels never pay for json.dumps, and records formatted by
+    several handlers are only serialized once.
+    """
+    __slots__ = ('_serialize_fn', '_serialized')
+
+    def __init__(self, serialize_fn: Callable[[], str]):
+        self._serialize_fn = serialize_fn
+        self._serialized = None  # type: Optional[str]
+
+    def __str__(self) -> str:
+        if self._serialized is None:
+            self._serialized = self._serialize_fn()
+            # drop the reference to the log object so it can be garbage collected while the record is still alive
+            self._serialize_fn = None
+        return self._serialized
+
+    def __repr__(self) -> str:
+        return '<{} serialized={}>'.format(self.__class__.__name__, self._serialized is not None)
+
 
 class AdvancedLogger(BaseLogger):
     def __init__(self, name: str, level: int = None, testing_hook_fn: Callable = None, debug_hook_fn: Callable = None):
@@ -47,33 +190,147 @@ class AdvancedLogger(BaseLogger):
             level = _GLOBAL_LOG_LEVEL
         self.testing_hook = testing_hook_fn or _TESTING_HOOK
         self.debug_hook = debug_hook_fn or _DEBUG_HOOK
+        self.sampler = None  # type: Optional[Sampler]
+        # falls back to the global one from initialize_logger_settings if not set
+        self.rate_limiter = None  # type: Optional[RateLimiter]
+        self.exception_aggregator = None  # type: Optional[ExceptionAggregator]
+        # level -> the encoded record around msg and time, see _get_envelope
+        self._envelopes = {}  # type: Dict[int, tuple]
+        self._envelope_generation = _ENVELOPE_GENERATION
 
         super(AdvancedLogger, self).__init__(name, level)
 
+    @property
+    def level(self) -> int:
+        if self._level_generation != _LEVEL_GENERATION:
+            self._apply_global_level()
+        return self._level
+
+    @level.setter
+    def level(self, level: int):
+        self._level = level
+        self._level_generation = _LEVEL_GENERATION
+        self._swap_level_methods()
+
+    def _apply_global_level(self):
+        """
+        set_global_log_level(update_existing=True) was called since this logger's level was last set
+        """
+        self._level = _GLOBAL_LOG_LEVEL
+        self._level_generation = _LEVEL_GENERATION
+        self._cache.clear()
+        self._swap_level_methods()
+
+    def _swap_level_methods(self):
+        """
+        Calls to a level which isn't enabled are the most common ones (e.g. debug in a loop), so the level methods of
+        those levels are replaced on this instance by _disabled_level_method, which only checks that the level
+        settings haven't changed since
+        """
+        if self._level_generation != _LEVEL_GENERATION:
+            # swaps them again
+            self._apply_global_level()
+            return
+        level = self._level
+        manager_disable = _MANAGER.disable
+        logger_ref = weakref.ref(self)
+        for method_level, method_name in _LEVEL_METHOD_NAMES:
+            # with no level of its own, the parents' levels are checked on every call
+            if level != logging.NOTSET and method_level < level:
+                self.__dict__[method_name] = _make_disabled_level_method(logger_ref, method_name, _LEVEL_GENERATION)
+            elif level != logging.NOTSET and method_level <= manager_disable:
+                self.__dict__[method_name] = _make_disabled_level_method(
+                    logger_ref, method_name, _LEVEL_GENERATION, manager_disable
+                )
+            else:
+                self.__dict__.pop(method_name, None)
+
+    def isEnabledFor(self, level: int) -> bool:
+        if self._level_generation != _LEVEL_GENERATION:
+            self._apply_global_level()
+        return BaseLogger.isEnabledFor(self, level)
+
+    def setLevel(self, level):
+        super(AdvancedLogger, self).setLevel(level)
+        self.clear_envelope_cache()
+
+    def handle(self, record: logging.LogRecord):
+        """
+        Logger.handle, counting the records which are emitted and the ones dropped by this logger's filters
+        """
+        if self.disabled:
+            return
+        metrics = _METRICS
+        filtered = self.filter(record)
+        if not filtered:
+            if metrics is not None:
+                metrics.dropped_filtered += 1
+            return
+        if isinstance(filtered, logging.LogRecord):
+            # filters can return a replacement record since python 3.12
+            record = filtered
+        self.callHandlers(record)
+        if metrics is not None:
+            try:
+                metrics.emitted[record.levelno] += 1
+            except KeyError:
+                metrics.emitted[record.levelno] = 1
+            if _METRICS_INTERVAL and metrics.is_report_due(_METRICS_INTERVAL):
+                _log_metrics_record(metrics)
+
+    def clear_envelope_cache(self):
+        self._envelopes = {}
+        self._envelope_generation = _ENVELOPE_GENERATION
+
+    def _get_envelope(self, level: int) -> tuple:
+        """
+        The record's JSON is the same for every record of a level apart from msg and time, so it's encoded once
+        and split into the (before msg, between msg and time, after time) parts
+        """
+        if self._envelope_generation != _ENVELOPE_GENERATION:
+            self.clear_envelope_cache()
+        envelope = self._envelopes.get(level)
+        if envelope is None:
+            template = _JSON_BACKEND.dumps({
+                'msg': _ENVELOPE_MSG,
+                'meta': {
+                    'name': self.name,
+                    'time': _ENVELOPE_TIME,
+                    'level': logging.getLevelName(level),
+                },
+            })
+            before_msg, _, rest = template.partition('"{}"'.format(_ENVELOPE_MSG))
+            before_time, _, after_time = rest.partition('"{}"'.format(_ENVELOPE_TIME))
+            envelope = self._envelopes[level] = (before_msg, before_time, after_time)
+        return envelope
+
+    # the level methods are replaced by no-ops on instances which don't have their level enabled,
+    # see _swap_level_methods
+
     def debug(self, msg, *args, **kwargs) -> Optional[str]:
         if self.isEnabledFor(logging.DEBUG):
             if self.debug_hook:
                 self.debug_hook(msg, *args, **kwargs)
-            return self.log(logging.DEBUG, msg, *args, **kwargs)
+            return self._log_enabled(logging.DEBUG, msg, *args, **kwargs)
 
     def info(self, msg, *args, **kwargs) -> Optional[str]:
         if self.isEnabledFor(logging.INFO):
-            return self.log(logging.INFO, msg, *args, **kwargs)
+            return self._log_enabled(logging.INFO, msg, *args, **kwargs)
 
     def warning(self, msg, *args, **kwargs) -> Optional[str]:
         if self.isEnabledFor(logging.WARNING):
-            return self.log(logging.WARNING, msg, *args, **kwargs)
+            return self._log_enabled(logging.WARNING, msg, *args, **kwargs)
 
     def warn(self, msg, *args, **kwargs) -> Optional[str]:
         return self.warning(msg, *args, **kwargs)
 
     def error(self, msg, *args, **kwargs) -> Optional[str]:
         if self.isEnabledFor(logging.ERROR):
-            return self.log(logging.ERROR, msg, *args, **kwargs)
+            return self._log_enabled(logging.ERROR, msg, *args, **kwargs)
 
     def critical(self, msg, *args, **kwargs) -> Optional[str]:
         if self.isEnabledFor(logging.CRITICAL):
-            return self.log(logging.CRITICAL, msg, *args, **kwargs)
+            return self._log_enabled(logging.CRITICAL, msg, *args, **kwargs)
 
     def log_exception_info(self, e: Exception = None, *args, msg: str = None, **kwargs) -> Optional[Dict]:
         # legacy name from when this was an internal library
@@ -83,6 +340,13 @@ class AdvancedLogger(BaseLogger):
         return _log_exception_info(self, e=e, *args, msg=msg, **kwargs)
 
     def log(self, level, msg, *args, **kwargs) -> Optional[str]:
+        if self.testing_hook and _IS_TESTING and _IS_TESTING():
+            self.testing_hook(msg, *args, **kwargs)
+        if self.isEnabledFor(level):
+            return __log__(self, level, msg, *args, **kwargs)
+
+    def _log_enabled(self, level, msg, *args, **kwargs) -> Optional[str]:
+        # log(), for the level methods which have already checked the level
         if self.testing_hook and _IS_TESTING and _IS_TESTING():
             self.testing_hook(msg, *args, **kwargs)
         return __log__(self, level, msg, *args, **kwargs)
@@ -90,6 +354,183 @@ class AdvancedLogger(BaseLogger):
     def deregister(self):
         deregister_logger(self)
 
+    def bind(self, **ctx) -> 'BoundAdvancedLogger':
+        """
+        :return: a logger which adds ctx to every record it logs, under "ctx"
+        """
+        return BoundAdvancedLogger(self, ContextFragment(ctx, _encode_json))
+
+    # Awaitable counterparts of the methods above, for use in coroutines.
+    # The record is encoded in the caller, and written by the running loop's asyncio sink off the loop.
+
+    async def adebug(self, msg, *args, **kwargs) -> Optional[str]:
+        if self.isEnabledFor(logging.DEBUG):
+            if self.debug_hook:
+                self.debug_hook(msg, *args, **kwargs)
+            return await self.alog(logging.DEBUG, msg, *args, **kwargs)
+
+    async def ainfo(self, msg, *args, **kwargs) -> Optional[str]:
+        if self.isEnabledFor(logging.INFO):
+            return await self.alog(logging.INFO, msg, *args, **kwargs)
+
+    async def awarning(self, msg, *args, **kwargs) -> Optional[str]:
+        if self.isEnabledFor(logging.WARNING):
+            return await self.alog(logging.WARNING, msg, *args, **kwargs)
+
+    async def aerror(self, msg, *args, **kwargs) -> Optional[str]:
+        if self.isEnabledFor(logging.ERROR):
+            return await self.alog(logging.ERROR, msg, *args, **kwargs)
+
+    async def acritical(self, msg, *args, **kwargs) -> Optional[str]:
+        if self.isEnabledFor(logging.CRITICAL):
+            return await self.alog(logging.CRITICAL, msg, *args, **kwargs)
+
+    async def aexception(self, e: Exception = None, *args, msg: str = None, **kwargs) -> Optional[Dict]:
+        log_it = kwargs.pop('log_it', True)
+        return_it = kwargs.pop('return_it', False)
+        context = kwargs.pop('context', None)
+        exception_record = _make_exception_record(self, e, msg, context, log_it, **kwargs)
+        if exception_record is None:
+            return
+        obj, context_json = exception_record
+        if log_it:
+            obj_as_str = _encode_json_with_context(obj, context_json, indent=kwargs.get('indent'))
+            await _submit_record(self, logging.ERROR, obj_as_str, args)
+        if return_it:
+            return obj
+
+    async def alog(
+            self, level, msg, *args, exc_info=None, extra=None, stack_info=False,
+            log_it=True, return_it=False, **kwargs
+    ) -> Optional[str]:
+        if self.testing_hook and _IS_TESTING and _IS_TESTING():
+            self.testing_hook(msg, *args, **kwargs)
+        if not self.isEnabledFor(level):
+            return
+        msg = __log__(self, level, msg, *args, log_it=False, return_it=True, **kwargs)
+        if msg is None:
+            return
+        if log_it:
+            await _submit_record(self, level, msg, args, exc_info=exc_info, extra=extra, stack_info=stack_info)
+        if return_it:
+            return msg
+
+    async def aclose(self):
+        """
+        Waits until everything logged with the awaitable methods on the running loop has been written and flushed
+        """
+        await close_asyncio_sink()
+
+
+class BoundAdvancedLogger(object):
+    """
+    Logs through an AdvancedLogger, adding its context to every record.
+    Cheap to create, and not registered anywhere, so one can be bound per request
+    """
+    __slots__ = ('logger', 'context')
+
+    def __init__(self, logger: AdvancedLogger, context: ContextFragment):
+        self.logger = logger
+        self.context = context
+
+    @property
+    def name(self) -> str:
+        return self.logger.name
+
+    def bind(self, **ctx) -> 'BoundAdvancedLogger':
+        return BoundAdvancedLogger(self.logger, self.context.merged(ctx, _encode_json))
+
+    def isEnabledFor(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def debug(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.debug(msg, *args, context=self.context, **kwargs)
+
+    def info(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.info(msg, *args, context=self.context, **kwargs)
+
+    def warning(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.warning(msg, *args, context=self.context, **kwargs)
+
+    def warn(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.warning(msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.error(msg, *args, context=self.context, **kwargs)
+
+    def critical(self, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.critical(msg, *args, context=self.context, **kwargs)
+
+    def exception(self, e: Exception = None, *args, msg: str = None, **kwargs) -> Optional[Dict]:
+        return self.logger.exception(e, *args, msg=msg, context=self.context, **kwargs)
+
+    def log(self, level, msg, *args, **kwargs) -> Optional[str]:
+        return self.logger.log(level, msg, *args, context=self.context, **kwargs)
+
+    async def adebug(self, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.adebug(msg, *args, context=self.context, **kwargs)
+
+    async def ainfo(self, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.ainfo(msg, *args, context=self.context, **kwargs)
+
+    async def awarning(self, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.awarning(msg, *args, context=self.context, **kwargs)
+
+    async def aerror(self, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.aerror(msg, *args, context=self.context, **kwargs)
+
+    async def acritical(self, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.acritical(msg, *args, context=self.context, **kwargs)
+
+    async def aexception(self, e: Exception = None, *args, msg: str = None, **kwargs) -> Optional[Dict]:
+        return await self.logger.aexception(e, *args, msg=msg, context=self.context, **kwargs)
+
+    async def alog(self, level, msg, *args, **kwargs) -> Optional[str]:
+        return await self.logger.alog(level, msg, *args, context=self.context, **kwargs)
+
+    def __repr__(self) -> str:
+        return '<{} {} {}>'.format(self.__class__.__name__, self.logger.name, self.context.json)
+
+
+def bind_request_context(**ctx) -> contextvars.Token:
+    """
+    Adds ctx to every record logged in the current context (i.e. the current asyncio task, or thread),
+    on top of any request context which is already bound.
+    :return: the token to pass to reset_request_context once the request is over
+    """
+    request_context = get_request_context()
+    if request_context is None:
+        fragment = ContextFragment(ctx, _encode_json)
+    else:
+        fragment = request_context.merged(ctx, _encode_json)
+    return set_request_context(fragment)
+
+
+@contextmanager
+def request_context(**ctx):
+    """
+    with request_context(request_id=...): binds ctx for the duration of the block
+    """
+    token = bind_request_context(**ctx)
+    try:
+        yield
+    finally:
+        reset_request_context(token)
+
+
+def copy_request_context(fn: Callable) -> Callable:
+    """
+    Wraps fn to run with the current request context, for functions submitted to a thread pool,
+    which doesn't carry over contextvars on its own
+    """
+    captured = contextvars.copy_context()
+
+    def run_in_request_context(*args, **kwargs):
+        # a copy for each call, the same context can't be entered by two threads at once
+        return captured.copy().run(fn, *args, **kwargs)
+
+    return run_in_request_context
+
 
 def initialize_logger_settings(
         *,
@@ -105,9 +546,98 @@ def initialize_logger_settings(
         reset_values_if_not_argument=False,
         update_existing=False,
         base_logger_class=None,
+        json_type_encoders: Dict[type, Callable] = None,
+        json_backend: str = None,
+        async_emission: bool = None,
+        async_queue_size: int = None,
+        async_overflow_policy: str = None,
+        buffered_output: bool = None,
+        buffer_max_bytes: int = None,
+        buffer_flush_interval: float = None,
+        log_file_sink: str = None,
+        log_file_segment_size: int = None,
+        log_file_segment_interval: float = None,
+        log_file_compression: str = None,
+        log_file_index: bool = None,
+        log_file_index_bucket: float = None,
+        multiprocess_mode: bool = None,
+        multiprocess_socket_path: str = None,
+        rate_limiter: RateLimiter = None,
+        exception_aggregator: ExceptionAggregator = None,
+        timestamp_format: str = None,
+        registry_mode: str = None,
+        registry_max_loggers: int = None,
+        registry_idle_timeout: float = None,
+        metrics: bool = None,
+        metrics_interval: float = None,
+        payload_limits: PayloadLimits = None,
 ):
+    """
+    :param async_emission: format records on the calling thread, but write them from a background thread
+    :param async_queue_size: max records waiting to be written when using async_emission,
+        and for the writer thread of the 'compressed' log_file_sink
+    :param async_overflow_policy: what to do when one of those queues is full,
+        one of 'block', 'drop_oldest', 'drop_new'
+    :param buffered_output: coalesce records into large writes to the stream/file destination,
+        which are flushed on a size threshold, a time threshold or an ERROR/CRITICAL record
+    :param buffer_max_bytes: size threshold for buffered_output
+    :param buffer_flush_interval: time threshold in seconds for buffered_output
+    :param log_file_sink: how records are written to log_file_destination, one of
+        'file': appended to the file
+        'mmap': written through a memory map into pre-allocated segment files which are rotated when full,
+            see MmapSegmentFileHandler
+        'compressed': compressed on a background thread into segment files which can each be decoded on their own,
+            see CompressedSegmentFileHandler
+        'binary': appended in a length-prefixed binary format with the time, level and logger name in front of the
+            JSON, so other programs can filter records without decoding them, see advanced_logger.binary_format
+    :param log_file_segment_size: size in bytes of each segment file for log_file_sink='mmap',
+        or of the records written to each segment (before compression) for log_file_sink='compressed'
+    :param log_file_segment_interval: seconds after which log_file_sink='compressed' starts a new segment,
+        pass 0 to only start them by size
+    :param log_file_compression: 'gzip' (the default) or 'zstd' (needs zstandard installed)
+        for log_file_sink='compressed'
+    :param log_file_index: keep a sparse index of log_file_destination's times and levels next to it,
+        so a time range can be read without scanning the file, see IndexedFileHandler and
+        advanced_logger.log_index.iter_time_range. Only for log_file_sink='file', and not buffered
+    :param log_file_index_bucket: seconds covered by each entry of the log_file_index
+    :param multiprocess_mode: for pre-fork servers, call this in the master process before forking.
+        Starts a writer process which owns the file/stream destination, and every process sends it its records
+        over a unix socket, see MultiprocessLogServer
+    :param multiprocess_socket_path: the unix socket for multiprocess_mode, defaults to one in the temp directory
+    :param rate_limiter: limits records per logger name + call site/exception type, for every logger
+        which doesn't have its own from register_logger. Pass False to remove it, see advanced_logger.rate_limiting
+    :param exception_aggregator: logs the full traceback of an exception only the first time it's seen in a window,
+        and compact records with a count after that, for every logger which doesn't have its own from register_logger.
+        Pass False to remove it, see advanced_logger.exception_aggregation
+    :param timestamp_format: how meta.time is logged, one of
+        'iso': UTC in ISO 8601 format without an offset, the default
+        'epoch_ns': integer nanoseconds since the epoch
+    :param registry_mode: how register_logger holds on to loggers, one of
+        'strong': until they're deregistered, the default
+        'weak': until nothing else references them, they're also left out of the stdlib logging manager
+        'lru': until registry_max_loggers is reached and/or they haven't been registered or looked up
+            for registry_idle_timeout seconds, the default if either of those is given
+        see advanced_logger.registry and get_registry_stats
+    :param registry_max_loggers: max loggers kept by the 'lru' registry_mode
+    :param registry_idle_timeout: seconds after which the 'lru' registry_mode releases an unused logger
+    :param metrics: keep counters and histograms of the logging pipeline, on by default,
+        see advanced_logger.metrics and get_metrics_snapshot
+    :param metrics_interval: log a record with the metrics every this many seconds, on the
+        'advanced_logger.metrics' logger. Checked when records are logged, pass 0 to stop
+    :param payload_limits: max depth, items per container, string length and total size of what's logged,
+        larger msgs are cut before they're encoded and marked with meta.truncated. Pass False to remove it,
+        see advanced_logger.payload_limits
+    """
     global _LOG_STREAM_DESTINATION, _LOG_FILE_DESTINATION, _PREFIX, _PROJECT_DIR_NAME, \
-        _IS_TESTING, _TESTING_HOOK, _DEBUG_HOOK, _CURRENT_BASE_LOGGER_CLASS
+        _IS_TESTING, _TESTING_HOOK, _DEBUG_HOOK, _CURRENT_BASE_LOGGER_CLASS, _JSON_TYPE_ENCODERS, _JSON_BACKEND, \
+        _ASYNC_EMISSION, _ASYNC_QUEUE_SIZE, _ASYNC_OVERFLOW_POLICY, _OUTPUT_SETTINGS_CHANGED, \
+        _BUFFERED_OUTPUT, _BUFFER_MAX_BYTES, _BUFFER_FLUSH_INTERVAL, _LOG_FILE_SINK, _LOG_FILE_SEGMENT_SIZE, \
+        _LOG_FILE_SEGMENT_INTERVAL, _LOG_FILE_COMPRESSION, _LOG_FILE_INDEX, _LOG_FILE_INDEX_BUCKET, \
+        _MULTIPROCESS_MODE, _MULTIPROCESS_SOCKET_PATH, \
+        _RATE_LIMITER, _EXCEPTION_AGGREGATOR, _ENVELOPE_GENERATION, _TIMESTAMP_PROVIDER, _METRICS, _METRICS_INTERVAL, \
+        _PAYLOAD_LIMITS
+
+    previous_output_settings = _get_output_settings()
 
     if log_stream_destination is not None or reset_values_if_not_argument:
         if not log_stream_destination:
@@ -147,42 +677,255 @@ def initialize_logger_settings(
         if base_logger_class is None:
             base_logger_class = logging.Logger
         _CURRENT_BASE_LOGGER_CLASS = base_logger_class
+    if json_type_encoders is not None or json_backend is not None or reset_values_if_not_argument:
+        if json_type_encoders is not None or reset_values_if_not_argument:
+            _JSON_TYPE_ENCODERS = json_type_encoders or None
+        if json_backend is None:
+            json_backend = 'stdlib' if reset_values_if_not_argument else _JSON_BACKEND.name
+        _JSON_BACKEND = get_json_backend(json_backend, type_encoders=_JSON_TYPE_ENCODERS)
+    if async_emission is not None or reset_values_if_not_argument:
+        _ASYNC_EMISSION = bool(async_emission)
+    if async_queue_size is not None or reset_values_if_not_argument:
+        _ASYNC_QUEUE_SIZE = async_queue_size or 10000
+    if async_overflow_policy is not None or reset_values_if_not_argument:
+        _ASYNC_OVERFLOW_POLICY = async_overflow_policy or OVERFLOW_BLOCK
+    if buffered_output is not None or reset_values_if_not_argument:
+        _BUFFERED_OUTPUT = bool(buffered_output)
+    if buffer_max_bytes is not None or reset_values_if_not_argument:
+        _BUFFER_MAX_BYTES = buffer_max_bytes or DEFAULT_MAX_BUFFER_BYTES
+    if buffer_flush_interval is not None or reset_values_if_not_argument:
+        _BUFFER_FLUSH_INTERVAL = buffer_flush_interval or DEFAULT_FLUSH_INTERVAL
+    if log_file_sink is not None or reset_values_if_not_argument:
+        if log_file_sink and log_file_sink not in _LOG_FILE_SINKS:
+            raise ValueError("log_file_sink must be one of {}".format(_LOG_FILE_SINKS))
+        _LOG_FILE_SINK = log_file_sink or 'file'
+    if log_file_segment_size is not None or reset_values_if_not_argument:
+        _LOG_FILE_SEGMENT_SIZE = log_file_segment_size or DEFAULT_SEGMENT_SIZE
+    if log_file_segment_interval is not None or reset_values_if_not_argument:
+        _LOG_FILE_SEGMENT_INTERVAL = log_file_segment_interval or None
+    if log_file_compression is not None or reset_values_if_not_argument:
+        log_file_compression = log_file_compression or 'gzip'
+        check_compression(log_file_compression)
+        _LOG_FILE_COMPRESSION = log_file_compression
+    if log_file_index is not None or reset_values_if_not_argument:
+        _LOG_FILE_INDEX = bool(log_file_index)
+    if log_file_index_bucket is not None or reset_values_if_not_argument:
+        _LOG_FILE_INDEX_BUCKET = log_file_index_bucket or DEFAULT_BUCKET_SECONDS
+    if _LOG_FILE_INDEX and (_LOG_FILE_SINK != 'file' or _BUFFERED_OUTPUT):
+        raise ValueError("log_file_index is only for log_file_sink='file' without buffered_output")
+    if multiprocess_mode is not None or reset_values_if_not_argument:
+        _MULTIPROCESS_MODE = bool(multiprocess_mode)
+    if multiprocess_socket_path is not None or reset_values_if_not_argument:
+        _MULTIPROCESS_SOCKET_PATH = multiprocess_socket_path
+    if rate_limiter is not None or reset_values_if_not_argument:
+        # False removes it
+        _RATE_LIMITER = rate_limiter if rate_limiter is not False else None
+    if exception_aggregator is not None or reset_values_if_not_argument:
+        _EXCEPTION_AGGREGATOR = exception_aggregator if exception_aggregator is not False else None
+    if timestamp_format is not None or reset_values_if_not_argument:
+        _TIMESTAMP_PROVIDER = get_timestamp_provider(timestamp_format or 'iso')
+    if registry_mode is not None or registry_max_loggers is not None or registry_idle_timeout is not None \
+            or reset_values_if_not_argument:
+        if registry_mode is None:
+            registry_mode = 'lru' if registry_max_loggers is not None or registry_idle_timeout is not None else 'strong'
+        _configure_registry(registry_mode, registry_max_loggers, registry_idle_timeout)
+    if metrics is not None or reset_values_if_not_argument:
+        if metrics is False:
+            _METRICS = None
+        elif _METRICS is None:
+            _METRICS = PipelineMetrics()
+    if metrics_interval is not None or reset_values_if_not_argument:
+        _METRICS_INTERVAL = metrics_interval or None
+        if _METRICS is not None:
+            _METRICS.next_report = None
+    if payload_limits is not None or reset_values_if_not_argument:
+        _PAYLOAD_LIMITS = payload_limits if payload_limits is not False else None
+
+    if _get_output_settings() != previous_output_settings:
+        _OUTPUT_SETTINGS_CHANGED = True
+    # the prefix, JSON backend or type encoders may have changed
+    _ENVELOPE_GENERATION += 1
 
     logging.setLoggerClass(AdvancedLogger)
     basic_config()
 
 
+def _get_output_settings() -> tuple:
+    return (
+        _ASYNC_EMISSION, _ASYNC_QUEUE_SIZE, _ASYNC_OVERFLOW_POLICY,
+        _BUFFERED_OUTPUT, _BUFFER_MAX_BYTES, _BUFFER_FLUSH_INTERVAL,
+        _LOG_FILE_SINK, _LOG_FILE_SEGMENT_SIZE, _LOG_FILE_SEGMENT_INTERVAL, _LOG_FILE_COMPRESSION,
+        _LOG_FILE_INDEX, _LOG_FILE_INDEX_BUCKET,
+        _MULTIPROCESS_MODE, _MULTIPROCESS_SOCKET_PATH,
+    )
+
+
+def _uses_output_handlers() -> bool:
+    return _ASYNC_EMISSION or _BUFFERED_OUTPUT or _LOG_FILE_SINK != 'file' or _LOG_FILE_INDEX or _MULTIPROCESS_MODE or \
+        _MULTIPROCESS_SERVER is not None
+
+
+def _get_multiprocess_server(filename: Optional[str], stream: Optional[TextIO]) -> Optional[MultiprocessLogServer]:
+    """
+    Starts, replaces or stops the writer process for multiprocess_mode as needed.
+    Worker processes inherit the master's server, which they use but never start or stop
+    """
+    global _MULTIPROCESS_SERVER
+    server = _MULTIPROCESS_SERVER
+    if server is not None and server.owner_pid != os.getpid():
+        return server if _MULTIPROCESS_MODE else None
+
+    if server is not None:
+        is_same_destination = server.filename == (os.path.abspath(filename) if filename else None) and \
+            server.socket_path == (_MULTIPROCESS_SOCKET_PATH or server.socket_path)
+        if _MULTIPROCESS_MODE and is_same_destination and server.is_running:
+            return server
+        server.stop()
+        _MULTIPROCESS_SERVER = server = None
+
+    if _MULTIPROCESS_MODE:
+        server = MultiprocessLogServer(socket_path=_MULTIPROCESS_SOCKET_PATH, filename=filename, stream=stream)
+        server.start()
+        _MULTIPROCESS_SERVER = server
+    return server
+
+
+def _count_queue_overflow():
+    if _METRICS is not None:
+        _METRICS.dropped_queue_overflow += 1
+
+
+def _build_output_handlers(kwargs: Dict) -> List[logging.Handler]:
+    """
+    Builds the root handlers for the output options that logging.basicConfig can't set up on its own.
+    Takes the same stream/filename arguments as basicConfig, and removes them from kwargs
+    """
+    stream = kwargs.pop('stream', None)
+    filename = kwargs.pop('filename', None)
+    filemode = kwargs.pop('filemode', 'a')
+    encoding = kwargs.pop('encoding', None)
+
+    server = _get_multiprocess_server(filename, stream)
+    if server is not None:
+        handler = MultiprocessClientHandler(server.socket_path)
+    elif _LOG_FILE_SINK == 'mmap':
+        if not filename:
+            raise ValueError("log_file_sink='mmap' requires a log_file_destination")
+        handler = MmapSegmentFileHandler(filename, segment_size=_LOG_FILE_SEGMENT_SIZE)
+    elif _LOG_FILE_SINK == 'binary':
+        if not filename:
+            raise ValueError("log_file_sink='binary' requires a log_file_destination")
+        handler = BinaryFileHandler(filename)
+    elif _LOG_FILE_SINK == 'compressed':
+        if not filename:
+            raise ValueError("log_file_sink='compressed' requires a log_file_destination")
+        handler = CompressedSegmentFileHandler(
+            filename,
+            compression=_LOG_FILE_COMPRESSION,
+            segment_size=_LOG_FILE_SEGMENT_SIZE,
+            segment_interval=_LOG_FILE_SEGMENT_INTERVAL,
+            max_queue_size=_ASYNC_QUEUE_SIZE,
+            overflow_policy=_ASYNC_OVERFLOW_POLICY,
+            on_drop=_count_queue_overflow,
+        )
+    elif _LOG_FILE_INDEX:
+        if not filename:
+            raise ValueError("log_file_index requires a log_file_destination")
+        handler = IndexedFileHandler(filename, bucket_seconds=_LOG_FILE_INDEX_BUCKET)
+    elif _BUFFERED_OUTPUT:
+        buffer_kwargs = {'max_buffer_bytes': _BUFFER_MAX_BYTES, 'flush_interval': _BUFFER_FLUSH_INTERVAL}
+        if filename:
+            handler = BufferedFileHandler(filename, filemode, encoding=encoding, **buffer_kwargs)
+        else:
+            handler = BufferedStreamHandler(stream, **buffer_kwargs)
+    elif filename:
+        handler = logging.FileHandler(filename, filemode, encoding=encoding)
+    else:
+        handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter(kwargs.get('format'), kwargs.get('datefmt'), kwargs.get('style', '%')))
+
+    if _ASYNC_EMISSION:
+        handler = AsyncQueueHandler(
+            [handler], max_queue_size=_ASYNC_QUEUE_SIZE, overflow_policy=_ASYNC_OVERFLOW_POLICY,
+            on_drop=_count_queue_overflow,
+        )
+    return [handler]
+
+
 def basic_config(**kwargs):
+    global _OUTPUT_SETTINGS_CHANGED
+
     if 'project_dir_name' in kwargs:
         global _PROJECT_DIR_NAME
         _PROJECT_DIR_NAME = kwargs['project_dir_name']
-    if 'stream' not in kwargs and _LOG_STREAM_DESTINATION:
-        kwargs['stream'] = _LOG_STREAM_DESTINATION
-    if 'filename' not in kwargs and _LOG_FILE_DESTINATION:
-        kwargs['filename'] = _LOG_FILE_DESTINATION
+    if 'stream' not in kwargs and 'filename' not in kwargs and 'handlers' not in kwargs:
+        # basicConfig only takes one of them, the file destination wins over the stream
+        if _LOG_FILE_DESTINATION:
+            kwargs['filename'] = _LOG_FILE_DESTINATION
+        elif _LOG_STREAM_DESTINATION:
+            kwargs['stream'] = _LOG_STREAM_DESTINATION
     if 'format' not in kwargs:
         kwargs['format'] = '{message}'
     if 'style' not in kwargs:
         kwargs['style'] = '{'
     if 'level' not in kwargs:
         kwargs['level'] = _GLOBAL_LOG_LEVEL
+    if _OUTPUT_SETTINGS_CHANGED and 'force' not in kwargs:
+        # basicConfig is a no-op once the root logger has handlers, unless forced to replace them
+        kwargs['force'] = True
+    _OUTPUT_SETTINGS_CHANGED = False
+    if 'handlers' not in kwargs and _uses_output_handlers():
+        kwargs['handlers'] = _build_output_handlers(kwargs)
 
     logging.basicConfig(**kwargs)
 
 
 def set_global_log_level(log_level: int, update_existing: bool = True):
-    global _GLOBAL_LOG_LEVEL
+    """
+    With update_existing, every existing logger takes on the new level, including ones given their own level.
+    Rather than going through every logger now, each one applies it the next time its level is checked
+    """
+    global _GLOBAL_LOG_LEVEL, _LEVEL_GENERATION
     _GLOBAL_LOG_LEVEL = log_level
 
     if update_existing:
+        _LEVEL_GENERATION += 1
+        # plain loggers without a level of their own cache isEnabledFor from their advanced parents' levels,
+        # like setLevel does
+        _MANAGER._clear_cache()
+
+
+def _configure_registry(mode: str, max_loggers: Optional[int], idle_timeout: Optional[float]):
+    with _REGISTRY_LOCK:
+        _registered_loggers.configure(mode, max_loggers, idle_timeout)
         for lgr in _registered_loggers:
-            lgr.setLevel(log_level)
+            if mode == 'weak':
+                _remove_from_manager(lgr)
+            else:
+                logging.Logger.manager.loggerDict.setdefault(lgr.name, lgr)
 
 
-def register_logger(name: str, level: int = None) -> AdvancedLogger:
+def get_registry_stats() -> RegistryStats:
+    """
+    How many loggers are registered, and how many have been released by the registry_mode
+    """
+    with _REGISTRY_LOCK:
+        return _registered_loggers.stats()._replace(manager_loggers=len(logging.Logger.manager.loggerDict))
+
+
+def register_logger(
+        name: str,
+        level: int = None,
+        sampler: Sampler = None,
+        rate_limiter: RateLimiter = None,
+        exception_aggregator: ExceptionAggregator = None,
+) -> AdvancedLogger:
     """
     Creates, registers and returns a logger with a given name and level.
     Only if testing, it makes sure that no logger name is re-used
+    If a sampler is given, only the records it keeps are logged, see advanced_logger.sampling
+    If a rate_limiter is given, it's used instead of the global one, see advanced_logger.rate_limiting
+    Likewise for an exception_aggregator, see advanced_logger.exception_aggregation
 
     Adds logger to _registered_loggers list, and wraps the log function to use our own
     As well as adds our own log_exception_info
@@ -192,14 +935,29 @@ def register_logger(name: str, level: int = None) -> AdvancedLogger:
     # Use the stdlib logging module to get our logger and set it's logging level
     # TODO swappable
     logging.setLoggerClass(AdvancedLogger)
-    # noinspection PyTypeChecker
-    _logger = logging.getLogger(_PREFIX + name)  # type: AdvancedLogger
-    _logger.disabled = False
-    _logger.setLevel(level=level or _GLOBAL_LOG_LEVEL)
-
-    # Add it into our internal set of managed loggers if it isn't present
-    if _logger not in _registered_loggers:
-        _registered_loggers.add(_logger)
+    with _REGISTRY_LOCK:
+        # in the 'weak' registry_mode, the registry is the only place registered loggers can be found
+        _logger = _registered_loggers.get(_PREFIX + name)
+        if _logger is None:
+            # noinspection PyTypeChecker
+            _logger = logging.getLogger(_PREFIX + name)  # type: AdvancedLogger
+            if _registered_loggers.mode == 'weak':
+                _remove_from_manager(_logger)
+        _logger.disabled = False
+        # setLevel clears the isEnabledFor cache of every logger, so it's skipped when the level is already right
+        if _logger.level != (level or _GLOBAL_LOG_LEVEL):
+            _logger.setLevel(level=level or _GLOBAL_LOG_LEVEL)
+        _logger.clear_envelope_cache()
+        if sampler is not None:
+            _logger.sampler = sampler
+        if rate_limiter is not None:
+            _logger.rate_limiter = rate_limiter
+        if exception_aggregator is not None:
+            _logger.exception_aggregator = exception_aggregator
+
+        # Add it into our internal registry of managed loggers if it isn't present
+        if _logger not in _registered_loggers:
+            _registered_loggers.add(_logger)
 
     # # TODO why was this line being done?
     # logging.setLoggerClass(_ORIGINAL_BASE_LOGGER_CLASS)
@@ -213,78 +971,261 @@ def deregister_logger(logger_or_name: Union[AdvancedLogger, str]):
     else:
         lgr = logger_or_name
 
-    lgr.disabled = True
-    _registered_loggers.remove(lgr)
-    del logging.Logger.manager.loggerDict[lgr.name]
+    with _REGISTRY_LOCK:
+        lgr.disabled = True
+        _registered_loggers.remove(lgr)
+        _remove_from_manager(lgr)
     del lgr
 
 
 def _get_logger_by_name(name: str) -> AdvancedLogger:
     name = _PREFIX + name
-    for lgr in _registered_loggers:
-        if lgr.name == name:
-            return lgr
-    else:
+    with _REGISTRY_LOCK:
+        lgr = _registered_loggers.get(name)
+    if lgr is None:
         raise ValueError("Could not find logger matching name {}".format(name))
+    return lgr
 
 
-def clear_all_loggers(*, exact_filter: str = None, substr_filter: str = None, regex_filter: RE_TYPE = None):
+def flush_rate_limit_summaries():
+    """
+    Logs the summaries of every record suppressed so far, which would otherwise wait for their key to be logged again
+    or for the summary interval. Useful before shutting down
+    """
+    with _REGISTRY_LOCK:
+        rate_limiters = {
+            id(lgr.rate_limiter): lgr.rate_limiter for lgr in _registered_loggers if lgr.rate_limiter is not None
+        }
+    if _RATE_LIMITER is not None:
+        rate_limiters[id(_RATE_LIMITER)] = _RATE_LIMITER
+    for rate_limiter in rate_limiters.values():
+        _log_suppressed_summaries(rate_limiter.take_summaries())
+
+
+def clear_all_loggers(
+        *,
+        exact_filter: str = None,
+        prefix_filter: str = None,
+        substr_filter: str = None,
+        regex_filter: RE_TYPE = None,
+):
+    """
+    Deregisters every logger, or only the ones whose full name (with the global prefix) matches one of the filters.
+    exact_filter and prefix_filter (e.g. 'tenant.' for a part of the logger hierarchy) are looked up in the registry's
+    indexes, substr_filter and regex_filter have to check every name
+    """
     if substr_filter and regex_filter:
         raise ValueError("can't use both substr_filter and regex_filter")
 
-    dereg_list = []
-
-    for lgr in _registered_loggers:
+    with _REGISTRY_LOCK:
         if exact_filter:
-            if lgr.name == exact_filter:
-                dereg_list.append(lgr)
+            lgr = _registered_loggers.get(exact_filter)
+            dereg_list = [lgr] if lgr is not None else []
+        elif prefix_filter:
+            dereg_list = _registered_loggers.with_prefix(prefix_filter)
         elif substr_filter:
-            if substr_filter in lgr.name:
-                dereg_list.append(lgr)
+            dereg_list = [lgr for lgr in _registered_loggers if substr_filter in lgr.name]
         elif regex_filter:
-            if re.search(regex_filter, lgr.name):
-                dereg_list.append(lgr)
+            search = re.compile(regex_filter).search
+            dereg_list = [lgr for lgr in _registered_loggers if search(lgr.name)]
         else:
-            dereg_list.append(lgr)
+            dereg_list = list(_registered_loggers)
 
-    for lgr in dereg_list:
-        deregister_logger(lgr)
+        for lgr in dereg_list:
+            deregister_logger(lgr)
 
 
-def __should_log_random__(**kwargs):
-    if 'out_of' in kwargs:
-        likelihood = kwargs['likelihood'] if 'likelihood' in kwargs else 1
-        if random_chance(likelihood, out_of=kwargs['out_of']):
-            return True
+def __should_log_random__(self=None, sampler: Sampler = None, trace_id=None, **kwargs) -> bool:
+    """
+    A sampler passed for this call wins over likelihood/out_of, which win over the logger's own sampler
+    """
+    if sampler is None:
+        if 'out_of' in kwargs:
+            sampler = get_ratio_sampler(kwargs.get('likelihood', 1), kwargs['out_of'])
+        elif self is not None:
+            sampler = self.sampler
+    if sampler is None:
+        return True
+    if sampler.should_log(trace_id):
+        return True
+    if _METRICS is not None:
+        _METRICS.dropped_sampled += 1
+    return False
+
+
+class _CallSite(NamedTuple):
+    filename: str
+    lineno: int
+
+    def __str__(self) -> str:
+        return '{}:{}'.format(self.filename, self.lineno)
+
+
+def _get_call_site() -> Optional[_CallSite]:
+    """
+    The file and line of the logging call, the first frame outside of advanced_logger and the logging module
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_PACKAGE_DIR) and filename != logging._srcfile:
+            return _CallSite(filename, frame.f_lineno)
+        frame = frame.f_back
+    return None
+
+
+def _rate_limit_key(e=None) -> Hashable:
+    """
+    Exceptions are keyed by their type, everything else by the call site, so the same message is limited together
+    however it was formatted. Use the rate_limit_key kwarg to key records differently
+    """
+    if isinstance(e, BaseException):
+        return type(e).__qualname__
+    return _get_call_site()
+
+
+def _is_rate_limited(self, level: int, key: Hashable = None, e=None) -> bool:
+    """
+    :param key: the rate_limit_key kwarg, see _rate_limit_key when it's not given
+    :param e: the exception of a logger.exception() call
+    """
+    rate_limiter = self.rate_limiter if self.rate_limiter is not None else _RATE_LIMITER
+    if rate_limiter is None:
         return False
-    return True
+    if key is None:
+        key = _rate_limit_key(e)
+    allowed, summaries = rate_limiter.check((self.name, key), level)
+    if summaries:
+        _log_suppressed_summaries(summaries)
+    if not allowed and _METRICS is not None:
+        _METRICS.dropped_rate_limited += 1
+    return not allowed
+
+
+def _get_logger_for_internal_record(name: str) -> BaseLogger:
+    """
+    The registered logger called name, or the internal logger if there isn't one, e.g. it was released
+    by the 'weak' or 'lru' registry_mode (logging.getLogger would put it back in the logging manager for good)
+    """
+    with _REGISTRY_LOCK:
+        lgr = _registered_loggers.get(name)
+    return lgr if lgr is not None else logging.getLogger(_INTERNAL_LOGGER_NAME)
+
+
+def _log_metrics_record(metrics: PipelineMetrics):
+    name = _PREFIX + _METRICS_LOGGER_NAME
+    lgr = _get_logger_for_internal_record(name)
+    log_obj = {
+        'msg': 'advanced_logger metrics',
+        'metrics': metrics.snapshot(),
+        'meta': {
+            'name': name,
+            'time': _TIMESTAMP_PROVIDER.now(),
+            'level': logging.getLevelName(logging.INFO),
+        },
+    }
+    # noinspection PyProtectedMember
+    _CURRENT_BASE_LOGGER_CLASS._log(
+        self=lgr,
+        level=logging.INFO,
+        msg=_DeferredJSONMessage(partial(_serialize_log_obj, lgr, log_obj)),
+        args=(),
+    )
+
+
+def get_metrics_snapshot() -> Optional[Dict]:
+    """
+    :return: the pipeline's counters and histograms since they were last reset, see advanced_logger.metrics,
+        or None if metrics are turned off
+    """
+    metrics = _METRICS
+    return metrics.snapshot() if metrics is not None else None
+
+
+def reset_metrics():
+    if _METRICS is not None:
+        _METRICS.reset()
+
+
+def _log_suppressed_summaries(summaries: List[SuppressedSummary]):
+    for (name, key), count, level in summaries:
+        lgr = _get_logger_for_internal_record(name)
+        log_obj = {
+            'msg': '{} similar records were suppressed by rate limiting'.format(count),
+            'suppressed': {'count': count, 'key': str(key) if isinstance(key, _CallSite) else key},
+            'meta': {
+                'name': name,
+                'time': _TIMESTAMP_PROVIDER.now(),
+                'level': logging.getLevelName(level),
+            },
+        }
+        # noinspection PyProtectedMember
+        _CURRENT_BASE_LOGGER_CLASS._log(
+            self=lgr,
+            level=level,
+            msg=_DeferredJSONMessage(partial(_serialize_log_obj, lgr, log_obj)),
+            args=(),
+        )
+
+
+def _make_disabled_level_method(
+        logger_ref: weakref.ReferenceType, method_name: str, level_generation: int, manager_disable: int = None
+) -> Callable:
+    """
+    :param manager_disable: given when the level is only disabled by logging.disable, not by the logger's level.
+        logging.disable can only disable more levels for loggers whose level disables it, so they don't check it
+    :return: a stand-in for a level method of a logger which doesn't have that level enabled, see _swap_level_methods.
+        If set_global_log_level or logging.disable have been called since, the level methods are swapped again,
+        and the call goes to whichever method is there now.
+        A closure rather than a partial, which is slower to call with *args and **kwargs
+    """
+    def swap_and_call(*args, **kwargs) -> Optional[str]:
+        lgr = logger_ref()  # type: AdvancedLogger
+        # noinspection PyProtectedMember
+        lgr._swap_level_methods()
+        return getattr(lgr, method_name)(*args, **kwargs)
+
+    if manager_disable is None:
+        def disabled_level_method(*args, **kwargs) -> Optional[str]:
+            if level_generation == _LEVEL_GENERATION:
+                return None
+            return swap_and_call(*args, **kwargs)
+    else:
+        def disabled_level_method(*args, **kwargs) -> Optional[str]:
+            # Manager.disable is a property around _disable, which is several times slower to read
+            if level_generation == _LEVEL_GENERATION and manager_disable == _MANAGER._disable:
+                return None
+            return swap_and_call(*args, **kwargs)
+
+    return disabled_level_method
 
 
 def __log__(
         self, level=logging.INFO, msg=None,
         *args, exc_info=None, extra=None, stack_info=False,
-        log_it=True, return_it=False, **kwargs
+        log_it=True, return_it=False, context: ContextFragment = None, **kwargs
 ) -> Optional[str]:
-    if not self.isEnabledFor(level):
+    # the level has already been checked by the caller
+    # the kwargs are almost always empty, so most calls only pay for the sampler check if they use one
+    if (kwargs or self.sampler is not None) and not __should_log_random__(self, **kwargs):
         return
-    if not __should_log_random__(**kwargs):
+    # keyed by the call site, so the same message with different args is limited together
+    if _is_rate_limited(self, level, kwargs.get('rate_limit_key')):
         return
 
-    log_obj = {
-        'msg': msg,
-        'meta': {
-            'name': self.name,
-            'time': datetime.utcnow(),
-            'level': logging.getLevelName(level),
-        },
-    }
+    # the record is {'msg': msg, 'meta': {'name': self.name, 'time': ..., 'level': level name}},
+    # but only msg and time are encoded per record, the rest comes from the logger's cached envelope
+    envelope = self._get_envelope(level)
+    # already encoded, and only the fraction of a second is formatted for most records
+    time_json = _TIMESTAMP_PROVIDER.now_json()
+    # read now, the request context may have changed by the time a deferred message is serialized
+    context_json = join_context_json(get_request_context(), context, encode_fn=_encode_json)
 
-    try:
-        msg = json.dumps(cls=_AdvancedJSONEncoder, obj=log_obj)
-    except Exception as e:
-        self.log_exception_info(e, msg='Error while converting log msg to JSON')
-        log_obj['msg'] = str(msg)
-        msg = json.dumps(cls=_AdvancedJSONEncoder, obj=log_obj, )
+    if return_it:
+        # the caller wants the string, so there's nothing to gain by deferring
+        msg = _serialize_record(self, envelope, msg, time_json, context_json)
+    else:
+        msg = _DeferredJSONMessage(partial(_serialize_record, self, envelope, msg, time_json, context_json))
 
     if log_it:
         # noinspection PyProtectedMember
@@ -299,6 +1240,101 @@ def __log__(
         return msg
 
 
+def _make_record(
+        self, level: int, msg: str, args, exc_info=None, extra: Dict = None, stack_info: bool = False
+) -> logging.LogRecord:
+    """
+    Builds the record the same way Logger._log does, without handing it to the handlers
+    """
+    try:
+        fn, lno, func, sinfo = self.findCaller(stack_info)
+    except ValueError:
+        fn, lno, func, sinfo = '(unknown file)', 0, '(unknown function)', None
+    if exc_info:
+        if isinstance(exc_info, BaseException):
+            exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+        elif not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+    return self.makeRecord(self.name, level, fn, lno, msg, args, exc_info, func, extra, sinfo)
+
+
+async def _submit_record(self, level: int, msg: str, args, **kwargs):
+    await get_asyncio_sink().submit(self, _make_record(self, level, msg, args, **kwargs))
+
+
+def _encode_json(obj, indent: int = None) -> str:
+    # backends are built once per configuration, so this doesn't build a new encoder for every record
+    return _JSON_BACKEND.dumps(obj, indent=indent)
+
+
+def _serialize_record(self, envelope: tuple, msg, time_json: str, context_json: Optional[str]) -> str:
+    start_ns = time.perf_counter_ns()
+    before_msg, before_time, after_time = envelope
+    limits = _PAYLOAD_LIMITS
+    truncated = False
+    budget = None
+    if limits is not None:
+        if limits.max_bytes is not None:
+            # what's left for msg once the rest of the record is in
+            budget = limits.max_bytes - len(before_msg) - len(before_time) - len(time_json) - len(after_time) \
+                - len(_TRUNCATED_META_JSON) - (len(context_json) + len('"ctx": , ') if context_json else 0)
+            budget = max(budget, 0)
+        msg, truncated = limits.bound(msg, budget)
+    try:
+        msg_json = _encode_json(msg)
+    except Exception as e:
+        if _METRICS is not None:
+            _METRICS.encode_fallbacks += 1
+        self.log_exception_info(e, msg='Error while converting log msg to JSON')
+        if limits is not None:
+            msg, str_truncated = limits.bound_str(msg, budget)
+            truncated = truncated or str_truncated
+            msg_json = _encode_json(msg)
+        else:
+            msg_json = _encode_json(str(msg))
+    if budget is not None and len(msg_json) > budget:
+        # the walk's estimate was off, e.g. from a type encoder or escaped characters
+        msg_json = limits.fit_json(msg_json, budget, _encode_json)
+        truncated = True
+    if truncated:
+        after_time = _TRUNCATED_META_JSON + after_time
+    serialized = splice_context_json(before_msg + msg_json + before_time + time_json + after_time, context_json)
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.encode_time.record(time.perf_counter_ns() - start_ns)
+        metrics.bytes_written += len(serialized)
+    return serialized
+
+
+def _serialize_log_obj(self, log_obj: Dict, context_json: str = None) -> str:
+    start_ns = time.perf_counter_ns()
+    try:
+        serialized = _encode_json(log_obj)
+    except Exception as e:
+        if _METRICS is not None:
+            _METRICS.encode_fallbacks += 1
+        self.log_exception_info(e, msg='Error while converting log msg to JSON')
+        log_obj['msg'] = str(log_obj['msg'])
+        serialized = _encode_json(log_obj)
+    # the context was serialized when it was bound, so it's spliced in rather than encoded with every record
+    serialized = splice_context_json(serialized, context_json)
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.encode_time.record(time.perf_counter_ns() - start_ns)
+        metrics.bytes_written += len(serialized)
+    return serialized
+
+
+def _encode_json_with_context(obj, context_json: Optional[str], indent: int = None) -> str:
+    start_ns = time.perf_counter_ns()
+    serialized = splice_context_json(_encode_json(obj, indent=indent), context_json)
+    metrics = _METRICS
+    if metrics is not None:
+        metrics.encode_time.record(time.perf_counter_ns() - start_ns)
+        metrics.bytes_written += len(serialized)
+    return serialized
+
+
 def _log_exception_info(
         self,
         e: Union[Exception, str],
@@ -306,39 +1342,19 @@ def _log_exception_info(
         msg=None,
         log_it=True,
         return_it=False,
+        context: ContextFragment = None,
         **kwargs,
         # airline_code=None, route_code=None  # TODO
 ) -> Optional[Dict]:
-    if not self.isEnabledFor(logging.CRITICAL):
-        return
-    if not __should_log_random__(**kwargs):
+    exception_record = _make_exception_record(self, e, msg, context, log_it, **kwargs)
+    if exception_record is None:
         return
-
-    if isinstance(e, str) or e is None:
-        formatted_tb = 'traceback not provided'
-    else:
-        tb = traceback.format_exception(etype=type(e), value=e, tb=e.__traceback__)
-
-        formatted_tb = []
-        inner_formatted_tb = formatted_tb
-        for line in tb:
-            formatted_line, start_of_chained_exception = _format_traceback_line(line)
-            inner_formatted_tb += formatted_line
-            if start_of_chained_exception:
-                inner_formatted_tb.append([])
-                inner_formatted_tb = inner_formatted_tb[-1]
-
-    obj = {
-        'msg': msg,
-        'e': str(e),
-        'traceback': formatted_tb,
-    }
+    obj, context_json = exception_record
 
     if log_it:
-        if 'indent' in kwargs:
-            obj_as_str = json.dumps(obj, cls=_AdvancedJSONEncoder, indent=kwargs['indent'])
-        else:
-            obj_as_str = json.dumps(obj, cls=_AdvancedJSONEncoder)
+        obj_as_str = _DeferredJSONMessage(
+            partial(_encode_json_with_context, obj, context_json, kwargs.get('indent'))
+        )
         # noinspection PyProtectedMember
         _CURRENT_BASE_LOGGER_CLASS._log(
             self=self,
@@ -352,6 +1368,294 @@ def _log_exception_info(
         return obj
 
 
+def _make_exception_record(
+        self, e: Union[Exception, str], msg, context: Optional[ContextFragment], log_it: bool, **kwargs
+) -> Optional[tuple]:
+    """
+    The checks and the record of logger.exception() and logger.aexception()
+    :return: (the record, the JSON of its context), or None if it isn't logged
+    """
+    if not self.isEnabledFor(logging.CRITICAL):
+        return
+    if (kwargs or self.sampler is not None) and not __should_log_random__(self, **kwargs):
+        return
+    if _is_rate_limited(self, logging.ERROR, kwargs.get('rate_limit_key'), e):
+        return
+
+    exception_aggregator = self.exception_aggregator if self.exception_aggregator is not None \
+        else _EXCEPTION_AGGREGATOR
+    if isinstance(e, str) or e is None:
+        obj = {
+            'msg': msg,
+            'e': str(e),
+            'traceback': 'traceback not provided',
+        }
+    else:
+        start_ns = time.perf_counter_ns()
+        if exception_aggregator is not None:
+            obj = _get_aggregated_exception_obj(exception_aggregator, e, msg)
+        else:
+            obj = {
+                'msg': msg,
+                'e': str(e),
+                'traceback': _format_exception_traceback(e),
+            }
+        if _METRICS is not None:
+            _METRICS.traceback_time.record(time.perf_counter_ns() - start_ns)
+    context_json = join_context_json(get_request_context(), context, encode_fn=_encode_json) if log_it else None
+    if _PAYLOAD_LIMITS is not None:
+        obj = _bound_exception_obj(_PAYLOAD_LIMITS, obj, context_json)
+    return obj, context_json
+
+
+def _bound_exception_obj(limits: PayloadLimits, obj: Dict, context_json: Optional[str]) -> Dict:
+    """
+    Bounds msg, the exception's message and the traceback's lines, then drops frames or cuts the largest field
+    until the record fits in max_bytes.
+    Exception records don't have a meta otherwise, so a truncated one only has the flag in it
+    """
+    budget = field_budget = None
+    if limits.max_bytes is not None:
+        budget = max(limits.max_bytes - (len(context_json) + len('"ctx": , ') if context_json else 0), 0)
+        # so a large msg or message doesn't crowd the traceback out
+        field_budget = budget // 2
+    msg, msg_truncated = limits.bound(obj['msg'], field_budget)
+    e, e_truncated = limits.bound_string(obj['e'], field_budget)
+    bounded = dict(obj, msg=msg, e=e, meta={'truncated': True})
+    truncated = msg_truncated or e_truncated
+    if 'traceback' in obj:
+        bounded['traceback'], traceback_truncated = _bound_traceback(limits, obj['traceback'], budget)
+        truncated = truncated or traceback_truncated
+    if budget is not None:
+        # measured with the truncated flag, which the record gets if anything has to go
+        try:
+            truncated = _fit_exception_obj(limits, bounded, budget) or truncated
+        except Exception:
+            # msg can't be encoded, which fails the same way without limits
+            pass
+    return bounded if truncated else obj
+
+
+def _bound_traceback(limits: PayloadLimits, formatted_tb, budget: Optional[int]) -> (_LOGGER_OUTPUT_TYPE, bool):
+    """
+    Cuts each of the traceback's strings, including the exception's own line at the end, which repeats its message
+    """
+    if isinstance(formatted_tb, str):
+        return limits.bound_string(formatted_tb, budget)
+    if not isinstance(formatted_tb, list):
+        return formatted_tb, False
+    bounded = []
+    truncated = False
+    for item in formatted_tb:
+        item, item_truncated = _bound_traceback(limits, item, budget)
+        bounded.append(item)
+        truncated = truncated or item_truncated
+    return bounded if truncated else formatted_tb, truncated
+
+
+def _fit_exception_obj(limits: PayloadLimits, obj: Dict, budget: int) -> bool:
+    """
+    Drops the oldest frames first, then cuts whichever of msg, e and the traceback is the largest, until obj fits
+    :return: whether anything was dropped or cut
+    """
+    excess = len(_encode_json(obj)) - budget
+    if excess <= 0:
+        return False
+    if isinstance(obj.get('traceback'), list):
+        obj['traceback'] = _drop_traceback_frames(obj['traceback'], excess)[0]
+        excess = len(_encode_json(obj)) - budget
+    while excess > 0:
+        fields_json = {key: _encode_json(obj[key]) for key in ('msg', 'e', 'traceback') if key in obj}
+        key, field_json = max(fields_json.items(), key=lambda item: len(item[1]))
+        if isinstance(obj[key], str):
+            value = limits.bound_string(obj[key], len(field_json) - excess)[0]
+        else:
+            value = json.loads(limits.fit_json(field_json, len(field_json) - excess, _encode_json))
+        if len(_encode_json(value)) >= len(field_json):
+            break
+        obj[key] = value
+        excess = len(_encode_json(obj)) - budget
+    return True
+
+
+def _drop_traceback_frames(formatted_tb: List, excess: int) -> (List, int):
+    """
+    Drops frames, oldest first, until about excess characters are gone. Each run of dropped frames is replaced by
+    a marker, so the traceback still shows where frames are missing
+    :return: the traceback and what's left of excess
+    """
+    kept = []
+    dropped = 0
+    for item in formatted_tb:
+        is_frame = isinstance(item, list) and item and isinstance(item[0], list)
+        if is_frame and excess > 0:
+            if not dropped:
+                # the marker's size, as if it was for all the frames
+                excess += len(_encode_json('...<{} more frames>'.format(len(formatted_tb)))) + len(', ')
+            dropped += 1
+            excess -= len(_encode_json(item)) + len(', ')
+            continue
+        if dropped:
+            kept.append('...<{} more frames>'.format(dropped))
+            dropped = 0
+        if not is_frame and isinstance(item, list) and excess > 0:
+            # the traceback of an exception raised while handling this one
+            item, excess = _drop_traceback_frames(item, excess)
+        kept.append(item)
+    if dropped:
+        kept.append('...<{} more frames>'.format(dropped))
+    return kept, excess
+
+
+def _get_aggregated_exception_obj(exception_aggregator: ExceptionAggregator, e: BaseException, msg) -> Dict:
+    fingerprint = _get_exception_fingerprint(e)
+    occurrence = exception_aggregator.record(fingerprint)
+    if occurrence.is_first:
+        return {
+            'msg': msg,
+            'e': str(e),
+            'fingerprint': fingerprint,
+            'traceback': _format_exception_traceback(e),
+        }
+    return {
+        'msg': msg,
+        'e': str(e),
+        'fingerprint': fingerprint,
+        'count': occurrence.count,
+        'first_seen': format_timestamp(occurrence.first_seen),
+        'last_seen': format_timestamp(occurrence.last_seen),
+    }
+
+
+def _get_exception_fingerprint(e: BaseException) -> str:
+    """
+    Identifies an exception by its type, where it was raised from, and the same for each exception it was chained to,
+    but not by its message, which often has ids or values in it
+    """
+    key = tuple(
+        (
+            chained_msg == _CAUSE_MESSAGE,
+            type(exc).__module__,
+            type(exc).__qualname__,
+            _get_frame_locations(exc.__traceback__) if exc.__traceback__ is not None else (),
+        )
+        for chained_msg, exc in _get_exception_chain(e)
+    )
+    return _hash_exception_fingerprint(key, _PROJECT_DIR_NAME)
+
+
+@lru_cache(maxsize=1024)
+def _hash_exception_fingerprint(key: tuple, project_dir_name: Optional[str]) -> str:
+    # uses the trimmed paths, so the fingerprint is the same wherever the project is deployed
+    parts = []
+    for is_cause, module, qualname, frame_locations in key:
+        parts.append('{}|{}.{}'.format('cause' if is_cause else 'context', module, qualname))
+        for filename, lineno, name in frame_locations:
+            parts.append('{}|{}|{}'.format(_trim_traceback_path(filename, project_dir_name), lineno, name))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def _format_exception_traceback(e: BaseException) -> List[_LOGGER_OUTPUT_TYPE]:
+    """
+    Builds the same structure as running traceback.format_exception's lines through _format_traceback_line,
+    but straight from the exception chain and its frames rather than rendering the traceback and parsing it back.
+    The frames are formatted once per code location, so an exception which keeps being raised from the same place
+    only costs a walk over its frames
+    """
+    formatted_tb = []  # type: List[_LOGGER_OUTPUT_TYPE]
+    inner_formatted_tb = formatted_tb
+    for chained_msg, exc in _get_exception_chain(e):
+        if chained_msg is not None:
+            inner_formatted_tb.append(chained_msg)
+            if chained_msg == _CONTEXT_MESSAGE:
+                inner_formatted_tb.append([])
+                inner_formatted_tb = inner_formatted_tb[-1]
+        if exc.__traceback__ is not None:
+            inner_formatted_tb.append('Traceback (most recent call last):')
+            for frame in _format_frames(_get_frame_locations(exc.__traceback__), _PROJECT_DIR_NAME):
+                if isinstance(frame, str):
+                    inner_formatted_tb.append(frame)
+                else:
+                    # fresh lists, so the cached frames can't be changed through the returned object
+                    location, code_line = frame
+                    inner_formatted_tb.append([list(location), code_line] if code_line else [list(location)])
+        for line in traceback.format_exception_only(type(exc), exc):
+            inner_formatted_tb += _format_traceback_line(line)[0]
+    return formatted_tb
+
+
+def _get_exception_chain(e: BaseException) -> List[tuple]:
+    """
+    :return: (message introducing the exception, exception) for e and the exceptions it was raised from or during,
+        oldest first, following the same rules as the traceback module
+    """
+    chain = []
+    seen = set()
+    while e is not None and id(e) not in seen:
+        seen.add(id(e))
+        if e.__cause__ is not None:
+            chained_msg, chained_exc = _CAUSE_MESSAGE, e.__cause__
+        elif e.__context__ is not None and not e.__suppress_context__:
+            chained_msg, chained_exc = _CONTEXT_MESSAGE, e.__context__
+        else:
+            chained_msg, chained_exc = None, None
+        chain.append((chained_msg, e))
+        e = chained_exc
+    chain.reverse()
+    return chain
+
+
+def _get_frame_locations(tb) -> tuple:
+    return tuple((f.f_code.co_filename, lineno, f.f_code.co_name) for f, lineno in traceback.walk_tb(tb))
+
+
+@lru_cache(maxsize=1024)
+def _format_frames(frame_locations: tuple, project_dir_name: Optional[str]) -> tuple:
+    """
+    :param frame_locations: (filename, line number, function name) of each frame, which is also the cache key
+    :return: ((trimmed path, 'line N', function name), code line) for each frame, or a str for collapsed recursion
+    """
+    out = []
+    last_location = None
+    count = 0
+    for location in frame_locations:
+        if location != last_location:
+            if count > _RECURSIVE_CUTOFF:
+                out.append(_format_repeated_frames(count - _RECURSIVE_CUTOFF))
+            last_location = location
+            count = 0
+        count += 1
+        if count > _RECURSIVE_CUTOFF:
+            continue
+
+        filename, lineno, name = location
+        code_line = linecache.getline(filename, lineno or 0).strip()
+        trimmed_location = (
+            _trim_traceback_path(filename, project_dir_name), 'line {}'.format(lineno), name.replace(os.path.sep, '.')
+        )
+        out.append((trimmed_location, '    ' + code_line if code_line else None))
+    if count > _RECURSIVE_CUTOFF:
+        out.append(_format_repeated_frames(count - _RECURSIVE_CUTOFF))
+    return tuple(out)
+
+
+def _format_repeated_frames(count: int) -> str:
+    return '  [Previous line repeated {} more time{}]'.format(count, 's' if count > 1 else '')
+
+
+@lru_cache(maxsize=4096)
+def _trim_traceback_path(filename: str, project_dir_name: Optional[str]) -> str:
+    """
+    Removes extra path info from the start of the file path, up to the project's directory if it's in it
+    """
+    path = '  File "' + filename
+    if project_dir_name:
+        index = path.find(project_dir_name)
+        if index != -1:
+            path = path[index:]
+    return path.replace(os.path.sep, '.')
+
+
 def _format_traceback_line(line: str) -> (List[_LOGGER_OUTPUT_TYPE], bool):
     """
     Takes in a traceback line by line
@@ -378,7 +1682,7 @@ def _format_traceback_line(line: str) -> (List[_LOGGER_OUTPUT_TYPE], bool):
                 pass
             split_line = split_line.replace(os.path.sep, '.')
 
-            match = re.match(r'^(.*)", (line [0-9]+), in (.+)$', split_line)
+            match = _TRACEBACK_FILE_LINE_RE.match(split_line)
             if match:
                 out.append([[match.group(1), match.group(2), match.group(3)]])
             else:
@@ -397,4 +1701,5 @@ def _format_traceback_line(line: str) -> (List[_LOGGER_OUTPUT_TYPE], bool):
 
 
 def random_chance(likelihood=1, out_of=1000) -> bool:
-    return likelihood >= random.randint(1, out_of)
+    # same odds as likelihood >= random.randint(1, out_of), without randint's overhead
+    return random.random() * out_of < likelihood
@@ -0,0 +1,150 @@
+"""
+A binary, length-prefixed format for log files which are read by other programs (e.g. a log shipper),
+so they can skip and filter records by time, level and logger name without decoding the JSON.
+
+A file starts with MAGIC, followed by entries which each have a fixed size little-endian header:
+  * kind: 1 byte, KIND_RECORD or KIND_NAME
+  * level: 1 byte, the record's level number
+  * name id: 4 bytes
+  * time: 8 bytes, nanoseconds since the epoch
+  * payload length: 4 bytes
+and then the payload. A KIND_NAME entry defines a logger name id, its payload is the UTF-8 name, it comes before
+the first record using the id. A KIND_RECORD entry's payload is the record's JSON, the same text that would have been
+written as a line.
+Ids are only unique within a file, and a file appended to by several handlers (e.g. after a restart) may define
+the same id again, the latest definition wins.
+"""
+import json
+import mmap
+import struct
+from typing import Any, Container, Dict, Iterator, NamedTuple, Optional
+
+__author__ = 'neil@everymundo.com'
+
+MAGIC = b'ALOGBIN1'
+KIND_RECORD = 1
+KIND_NAME = 2
+HEADER = struct.Struct('<BBIqI')
+MAX_PAYLOAD_SIZE = 0xFFFFFFFF
+
+
+def pack_entry(kind: int, level: int, name_id: int, time_ns: int, payload: bytes) -> bytes:
+    return HEADER.pack(kind, level, name_id, time_ns, len(payload)) + payload
+
+
+class BinaryRecord(NamedTuple):
+    time_ns: int
+    level: int
+    name: str
+    # a view into the file's memory map, only valid until the reader is closed, bytes(payload) to keep it
+    payload: memoryview
+
+    def decode(self) -> Any:
+        return json.loads(bytes(self.payload))
+
+
+class BinaryLogReader(object):
+    """
+    Reads a file written in the binary format through a read-only memory map, the records' payloads are views into
+    the map rather than copies.
+
+        with BinaryLogReader(filename) as reader:
+            for record in reader.records(min_level=logging.ERROR):
+                ship(record.name, record.payload)
+
+    Records appended after the reader was opened aren't seen, and a record which is still being written
+    at the end of the file is skipped.
+    The payloads must be released (or no longer referenced) before the reader is closed, mmap can't be closed while
+    views into it exist
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self._file = open(filename, 'rb')
+        self._mmap = None  # type: Optional[mmap.mmap]
+        self._view = None  # type: Optional[memoryview]
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can't be mapped
+            pass
+        else:
+            self._view = memoryview(self._mmap)
+            if self._mmap[:len(MAGIC)] != MAGIC:
+                self.close()
+                raise ValueError("{} is not an advanced_logger binary log".format(filename))
+
+    def __enter__(self) -> 'BinaryLogReader':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def records(
+            self,
+            min_level: int = None,
+            names: Container[str] = None,
+            since_ns: int = None,
+            until_ns: int = None,
+    ) -> Iterator[BinaryRecord]:
+        """
+        :param min_level: only records at this level or above
+        :param names: only records from these logger names
+        :param since_ns: only records at this time or later, in nanoseconds since the epoch
+        :param until_ns: only records before this time
+        """
+        view = self._view
+        if view is None:
+            return
+        end = len(view)
+        offset = len(MAGIC)
+        header_size = HEADER.size
+        unpack_from = HEADER.unpack_from
+        names_by_id = {}  # type: Dict[int, str]
+        while offset + header_size <= end:
+            kind, level, name_id, time_ns, length = unpack_from(view, offset)
+            start = offset + header_size
+            offset = start + length
+            if offset > end:
+                break
+            if kind == KIND_NAME:
+                names_by_id[name_id] = str(view[start:offset], 'utf-8')
+                continue
+            if kind != KIND_RECORD:
+                continue
+            if min_level is not None and level < min_level:
+                continue
+            if since_ns is not None and time_ns < since_ns:
+                continue
+            if until_ns is not None and time_ns >= until_ns:
+                continue
+            name = names_by_id.get(name_id)
+            if names is not None and name not in names:
+                continue
+            yield BinaryRecord(time_ns, level, name, view[start:offset])
+
+    def __iter__(self) -> Iterator[BinaryRecord]:
+        return self.records()
+
+
+def iter_binary_records(filename: str, **filters) -> Iterator[BinaryRecord]:
+    """
+    The records of a binary log, with their payloads copied so they can be kept after iterating,
+    takes the same filters as BinaryLogReader.records
+    """
+    with BinaryLogReader(filename) as reader:
+        for record in reader.records(**filters):
+            payload = record.payload
+            try:
+                yield record._replace(payload=memoryview(bytes(payload)))
+            finally:
+                payload.release()
@@ -0,0 +1,85 @@
+"""
+Key/value context which is added to records under "ctx", either bound to a logger (logger.bind(request_id=...))
+or set for the current request with contextvars (request_context(request_id=...)), which follows asyncio tasks
+and can be carried into thread pools with copy_request_context.
+Context is serialized once when it's bound, and the JSON is spliced into each record rather than encoded again.
+"""
+import contextvars
+from types import MappingProxyType
+from typing import Callable, Dict, Optional
+
+__author__ = 'neil@everymundo.com'
+
+
+class ContextFragment(object):
+    """
+    Immutable context values, along with their JSON
+    """
+    __slots__ = ('values', 'json')
+
+    def __init__(self, values: Dict, encode_fn: Callable[[Dict], str]):
+        values = dict(values)
+        self.values = MappingProxyType(values)
+        self.json = encode_fn(values)
+
+    def merged(self, values: Dict, encode_fn: Callable[[Dict], str]) -> 'ContextFragment':
+        return ContextFragment(dict(self.values, **values), encode_fn)
+
+    def __bool__(self) -> bool:
+        return bool(self.values)
+
+    def __repr__(self) -> str:
+        return '<{} {}>'.format(self.__class__.__name__, self.json)
+
+
+_REQUEST_CONTEXT = contextvars.ContextVar(
+    'advanced_logger_request_context', default=None
+)  # type: contextvars.ContextVar[Optional[ContextFragment]]
+
+
+def get_request_context() -> Optional[ContextFragment]:
+    return _REQUEST_CONTEXT.get()
+
+
+def set_request_context(fragment: Optional[ContextFragment]) -> contextvars.Token:
+    return _REQUEST_CONTEXT.set(fragment)
+
+
+def reset_request_context(token: contextvars.Token):
+    _REQUEST_CONTEXT.reset(token)
+
+
+def join_context_json(
+        *fragments: Optional[ContextFragment], encode_fn: Callable[[Dict], str]
+) -> Optional[str]:
+    """
+    :param encode_fn: encodes the merged values when fragments have keys in common
+    :return: the JSON object with the values of every fragment, where later fragments win,
+        or None if there aren't any values
+    """
+    fragments = [fragment for fragment in fragments if fragment]
+    if not fragments:
+        return None
+    if len(fragments) == 1:
+        return fragments[0].json
+    keys = fragments[0].values.keys()
+    for fragment in fragments[1:]:
+        if not keys.isdisjoint(fragment.values):
+            # JSON with duplicate keys is rejected by some consumers, and others keep the first value
+            merged = {}
+            for overlapping in fragments:
+                merged.update(overlapping.values)
+            return encode_fn(merged)
+        if fragment is not fragments[-1]:
+            keys = keys | fragment.values.keys()
+    # the keys are all different, so the objects are joined without encoding anything
+    return '{' + ', '.join(fragment.json[1:-1] for fragment in fragments) + '}'
+
+
+def splice_context_json(serialized: str, context_json: Optional[str]) -> str:
+    """
+    Adds "ctx" as the first key of an already serialized JSON object
+    """
+    if not context_json:
+        return serialized
+    return '{"ctx": ' + context_json + ', ' + serialized[1:]
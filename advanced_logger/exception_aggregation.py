@@ -0,0 +1,64 @@
+"""
+Aggregation for logger.exception(), so an exception raised over and over (e.g. during an incident) doesn't log its full
+traceback every time.
+Each exception gets a fingerprint from its type, its frames and the exceptions it was chained to. The first time
+a fingerprint is seen in a window, the full traceback is logged along with the fingerprint. After that, until the window
+is over, only a compact record with the fingerprint, how many times it's been seen in the window and when it was first
+and last seen is logged.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+__author__ = 'neil@everymundo.com'
+
+
+class ExceptionOccurrence(NamedTuple):
+    is_first: bool
+    count: int
+    first_seen: float
+    last_seen: float
+
+
+class _FingerprintEntry(object):
+    __slots__ = ('count', 'first_seen', 'last_seen')
+
+    def __init__(self, now: float):
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+
+
+class ExceptionAggregator(object):
+    """
+    Tracks up to max_fingerprints fingerprints, the least recently seen one is forgotten when a new one comes in,
+    which means its next occurrence gets a full traceback again
+    """
+
+    def __init__(self, window: float = 60, max_fingerprints: int = 10000, clock: Callable[[], float] = time.time):
+        if window <= 0:
+            raise ValueError("window must be positive")
+        if max_fingerprints < 1:
+            raise ValueError("max_fingerprints must be at least 1")
+        self.window = window
+        self.max_fingerprints = max_fingerprints
+        self._clock = clock
+        self._entries = OrderedDict()  # type: OrderedDict[str, _FingerprintEntry]
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, fingerprint: str) -> ExceptionOccurrence:
+        with self._lock:
+            now = self._clock()
+            entry = self._entries.get(fingerprint)
+            if entry is None or now - entry.first_seen >= self.window:
+                entry = self._entries[fingerprint] = _FingerprintEntry(now)
+                if len(self._entries) > self.max_fingerprints:
+                    self._entries.popitem(last=False)
+            self._entries.move_to_end(fingerprint)
+            entry.count += 1
+            entry.last_seen = now
+            return ExceptionOccurrence(entry.count == 1, entry.count, entry.first_seen, entry.last_seen)
@@ -0,0 +1,196 @@
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+
+__author__ = 'neil@everymundo.com'
+
+OVERFLOW_BLOCK = 'block'
+OVERFLOW_DROP_OLDEST = 'drop_oldest'
+OVERFLOW_DROP_NEW = 'drop_new'
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEW)
+
+
+class AsyncQueueHandler(logging.Handler):
+    """
+    Formats records on the calling thread, then hands them to a background writer thread
+    which drains the queue in batches into the wrapped handlers.
+
+    The queue is bounded, when it's full the overflow policy decides what happens:
+      * block: the calling thread waits for the writer to make room
+      * drop_oldest: the oldest queued record is discarded to make room
+      * drop_new: the new record is discarded
+    Dropped records are counted in dropped_count, and reported to on_drop if it's given.
+    Anything still queued is written out when the handler is closed, which happens at interpreter exit at the latest,
+    records emitted once it's closed are dropped.
+    """
+
+    def __init__(
+            self,
+            handlers: List[logging.Handler],
+            max_queue_size: int = 10000,
+            overflow_policy: str = OVERFLOW_BLOCK,
+            batch_size: int = 512,
+            on_drop: Callable[[], None] = None,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of {}".format(OVERFLOW_POLICIES))
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+        super(AsyncQueueHandler, self).__init__()
+
+        self.handlers = list(handlers)
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.batch_size = batch_size
+        self.dropped_count = 0
+        self._on_drop = on_drop
+
+        self._queue = deque()
+        self._in_flight = 0
+        self._closing = False
+        # set once close() has written out the queue, the wrapped handlers are closed after it
+        self._closed = False
+        self._writer_thread = None  # type: Optional[threading.Thread]
+        self._init_queue_lock()
+        self._start_writer_thread()
+
+        atexit.register(self.close)
+        register_after_fork_in_child(self)
+
+    def _init_queue_lock(self):
+        self._queue_lock = threading.Lock()
+        self._not_empty = threading.Condition(self._queue_lock)
+        self._not_full = threading.Condition(self._queue_lock)
+        self._drained = threading.Condition(self._queue_lock)
+
+    def _start_writer_thread(self):
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, name='AdvancedLoggerAsyncWriter', daemon=True
+        )
+        self._writer_thread.start()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Does all of the formatting (i.e. the JSON encoding) on the calling thread, so the writer thread only writes
+        and the message can't change if the logged object is mutated after the log call
+        """
+        msg = self.format(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.enqueue(self.prepare(record))
+        except Exception:
+            self.handleError(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        with self._queue_lock:
+            is_writer_thread = threading.current_thread() is self._writer_thread
+            if self.overflow_policy == OVERFLOW_BLOCK and not is_writer_thread:
+                while len(self._queue) >= self.max_queue_size and not self._closing:
+                    self._not_full.wait()
+
+            # checked after waiting, the writer thread may have stopped in the meantime
+            if self._closed:
+                self._drop()
+                return
+            if self._closing or is_writer_thread:
+                # nothing will drain the queue (or we are the thread draining it), write it out directly
+                self._handle_batch([record])
+                return
+
+            if len(self._queue) >= self.max_queue_size:
+                if self.overflow_policy == OVERFLOW_DROP_NEW:
+                    self._drop()
+                    return
+                self._queue.popleft()
+                self._drop()
+
+            self._queue.append(record)
+            self._not_empty.notify()
+
+    def _drop(self):
+        self.dropped_count += 1
+        if self._on_drop is not None:
+            self._on_drop()
+
+    def _writer_loop(self):
+        while True:
+            with self._queue_lock:
+                while not self._queue and not self._closing:
+                    self._not_empty.wait()
+                if not self._queue:
+                    return
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+                self._not_full.notify_all()
+
+            self._handle_batch(batch)
+
+            with self._queue_lock:
+                self._in_flight = 0
+                if not self._queue:
+                    self._drained.notify_all()
+
+    def _handle_batch(self, batch: List[logging.LogRecord]):
+        for handler in self.handlers:
+            for record in batch:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            handler.flush()
+
+    def _after_fork_in_child(self):
+        # the writer thread doesn't exist in the child, and whatever was queued will be written by the parent
+        self._init_queue_lock()
+        self._queue.clear()
+        self._in_flight = 0
+        if not self._closing:
+            self._start_writer_thread()
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._queue)
+
+    def flush(self, timeout: float = None):
+        """
+        Waits for the writer thread to write out everything which has been queued so far
+        """
+        with self._queue_lock:
+            if self._writer_thread is not None and self._writer_thread.is_alive():
+                self._drained.wait_for(lambda: not self._queue and not self._in_flight, timeout=timeout)
+        for handler in self.handlers:
+            handler.flush()
+
+    def close(self):
+        with self._queue_lock:
+            if self._closing:
+                return
+            self._closing = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        atexit.unregister(self.close)
+
+        if self._writer_thread is not None and self._writer_thread is not threading.current_thread():
+            self._writer_thread.join()
+
+        with self._queue_lock:
+            # only left over if the writer thread died
+            leftover = list(self._queue)
+            self._queue.clear()
+            if leftover:
+                self._handle_batch(leftover)
+            self._closed = True
+
+        for handler in self.handlers:
+            handler.close()
+        super(AsyncQueueHandler, self).close()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+__author__ = 'neil@everymundo.com'
+
+_SINKS = weakref.WeakKeyDictionary()  # type: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncioLogSink]
+
+_QueuedRecord = Tuple[logging.Logger, logging.LogRecord]
+
+
+def _handle_batch(batch: List[_QueuedRecord]):
+    for logger, record in batch:
+        logger.handle(record)
+
+
+def _flush_handlers(loggers: List[logging.Logger]):
+    flushed = set()
+    for logger in loggers:
+        # the same handlers callHandlers would have used
+        current = logger
+        while current:
+            for handler in current.handlers:
+                if handler not in flushed:
+                    flushed.add(handler)
+                    handler.flush()
+            current = current.parent if current.propagate else None
+
+
+class AsyncioLogSink(object):
+    """
+    Receives already encoded records from coroutines on one event loop.
+    A consumer task drains the queue in batches and hands each batch to a single writer thread,
+    so the handlers' I/O never runs on the loop and records are written in the order they were submitted.
+    Submitting only waits (without blocking the loop) when the queue is full.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue_size: int = 10000, batch_size: int = 512):
+        self.batch_size = batch_size
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=max_queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='AdvancedLoggerAsyncioWriter')
+        self._loggers = weakref.WeakSet()
+        self._closed = False
+        self._consumer_task = loop.create_task(self._consume())
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    async def submit(self, logger: logging.Logger, record: logging.LogRecord):
+        if self._closed:
+            raise RuntimeError("can't log to a closed asyncio sink")
+        self._loggers.add(logger)
+        await self._queue.put((logger, record))
+
+    def _get_batch(self, first: _QueuedRecord) -> List[_QueuedRecord]:
+        batch = [first]
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _consume(self):
+        try:
+            while True:
+                batch = self._get_batch(await self._queue.get())
+                try:
+                    await self._loop.run_in_executor(self._executor, _handle_batch, batch)
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+        except asyncio.CancelledError:
+            # the loop is shutting down, possibly without aclose having been awaited,
+            # so write out whatever is left once the writer thread is done with the current batch
+            self._executor.shutdown(wait=True)
+            leftover = []
+            while not self._queue.empty():
+                leftover.append(self._queue.get_nowait())
+                self._queue.task_done()
+            _handle_batch(leftover)
+            raise
+
+    async def aclose(self):
+        """
+        Waits for every submitted record to be handled and the handlers to be flushed, then stops the consumer task
+        """
+        if self._closed:
+            return
+        self._closed = True
+        await self._queue.join()
+        await self._loop.run_in_executor(self._executor, _flush_handlers, list(self._loggers))
+        self._consumer_task.cancel()
+        try:
+            await self._consumer_task
+        except asyncio.CancelledError:
+            pass
+        if _SINKS.get(self._loop) is self:
+            del _SINKS[self._loop]
+
+
+def get_asyncio_sink() -> AsyncioLogSink:
+    """
+    The sink for the running event loop, created on first use
+    """
+    loop = asyncio.get_running_loop()
+    sink = _SINKS.get(loop)  # type: Optional[AsyncioLogSink]
+    if sink is None or sink.closed:
+        sink = _SINKS[loop] = AsyncioLogSink(loop)
+    return sink
+
+
+async def close_asyncio_sink():
+    sink = _SINKS.get(asyncio.get_running_loop())  # type: Optional[AsyncioLogSink]
+    if sink is not None:
+        await sink.aclose()
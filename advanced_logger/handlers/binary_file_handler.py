@@ -0,0 +1,81 @@
+import logging
+import zlib
+from typing import Dict, Tuple
+
+from advanced_logger.binary_format import MAGIC, KIND_NAME, KIND_RECORD, MAX_PAYLOAD_SIZE, pack_entry
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+
+__author__ = 'neil@everymundo.com'
+
+_MAX_LEVEL = 0xFF
+_MAX_NAME_ID = 0xFFFFFFFF
+
+
+class BinaryFileHandler(logging.FileHandler):
+    """
+    Appends records to a file in the binary, length-prefixed format of advanced_logger.binary_format,
+    read it with BinaryLogReader.
+
+    A logger name's id is the CRC32 of the name, so processes appending to the same file (e.g. forked workers)
+    agree on the ids without sharing any state. Each process defines a name the first time it logs with it,
+    in the same write as the record, so the definition always comes first in the file
+    """
+
+    def __init__(self, filename: str, mode: str = 'ab', delay: bool = False):
+        if 'b' not in mode:
+            raise ValueError("BinaryFileHandler needs a binary file mode, e.g. 'ab'")
+        self._name_ids = {}  # type: Dict[str, int]
+        self._used_ids = {}  # type: Dict[int, str]
+        super(BinaryFileHandler, self).__init__(filename, mode, delay=delay)
+        register_after_fork_in_child(self)
+
+    def _after_fork_in_child(self):
+        # the parent may log with names for the first time after the fork, so the child defines its own names
+        self._name_ids = {}
+        self._used_ids = {}
+
+    def _open(self):
+        stream = super(BinaryFileHandler, self)._open()
+        if stream.tell() == 0:
+            stream.write(MAGIC)
+            stream.flush()
+        # the names have to be defined again in a new file
+        self._name_ids = {}
+        self._used_ids = {}
+        return stream
+
+    def _get_name_id(self, name: str) -> Tuple[int, bool]:
+        """
+        :return: the name's id, and whether it's new
+        """
+        name_id = self._name_ids.get(name)
+        if name_id is not None:
+            return name_id, False
+        name_id = zlib.crc32(name.encode('utf-8'))
+        # two names with the same CRC32 in one process, the chances of that are tiny
+        while name_id in self._used_ids:
+            name_id = (name_id + 1) & _MAX_NAME_ID
+        self._name_ids[name] = name_id
+        self._used_ids[name_id] = name
+        return name_id, True
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            payload = self.format(record).encode('utf-8')
+            if len(payload) > MAX_PAYLOAD_SIZE:
+                raise ValueError("record of {} bytes is too large for the binary format".format(len(payload)))
+            time_ns = int(record.created * 1e9)
+            level = min(record.levelno, _MAX_LEVEL)
+            name_id, is_new_name = self._get_name_id(record.name)
+            data = pack_entry(KIND_RECORD, level, name_id, time_ns, payload)
+            if is_new_name:
+                data = pack_entry(KIND_NAME, 0, name_id, time_ns, record.name.encode('utf-8')) + data
+            # a single write, so records appended by other processes never end up in between
+            self.stream.write(data)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+
+__author__ = 'neil@everymundo.com'
+
+DEFAULT_MAX_BUFFER_BYTES = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+
+class _BufferingMixin(object):
+    """
+    Coalesces formatted records into a single write, which happens when any of these is hit:
+      * the buffer holds max_buffer_bytes (measured in characters)
+      * flush_interval seconds have passed since the last write, unless it's None
+      * a record at flush_level or above is emitted
+    A background thread makes sure the time threshold is honoured even when nothing else is being logged.
+    """
+    terminator = '\n'
+
+    def _init_buffering(self, max_buffer_bytes: int, flush_interval: Optional[float], flush_level: int):
+        self.max_buffer_bytes = max_buffer_bytes
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+
+        self._buffer = []  # type: List[str]
+        self._buffer_size = 0
+        self._last_flush = time.monotonic()
+        self._closed = threading.Event()
+        self._flusher_thread = None  # type: Optional[threading.Thread]
+        if flush_interval:
+            self._start_flusher_thread()
+        register_after_fork_in_child(self)
+
+    def _start_flusher_thread(self):
+        self._flusher_thread = threading.Thread(
+            target=self._flusher_loop, name='AdvancedLoggerBufferFlusher', daemon=True
+        )
+        self._flusher_thread.start()
+
+    def _flusher_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            if self._buffer and time.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def _after_fork_in_child(self):
+        # the buffered records will be written by the parent, and the flusher thread doesn't exist in the child
+        self._buffer.clear()
+        self._buffer_size = 0
+        if self.flush_interval and not self._closed.is_set():
+            self._start_flusher_thread()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            msg = self.format(record) + self.terminator
+            self._buffer.append(msg)
+            self._buffer_size += len(msg)
+            if self._buffer_size >= self.max_buffer_bytes \
+                    or record.levelno >= self.flush_level \
+                    or (self.flush_interval is not None
+                        and time.monotonic() - self._last_flush >= self.flush_interval):
+                self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.acquire()
+        try:
+            stream = getattr(self, 'stream', None)
+            if stream is None:
+                return
+            if self._buffer:
+                stream.write(''.join(self._buffer))
+                self._buffer.clear()
+                self._buffer_size = 0
+            if hasattr(stream, 'flush'):
+                stream.flush()
+            self._last_flush = time.monotonic()
+        finally:
+            self.release()
+
+    def close(self):
+        self._closed.set()
+        # noinspection PyUnresolvedReferences
+        super(_BufferingMixin, self).close()
+
+
+class BufferedStreamHandler(_BufferingMixin, logging.StreamHandler):
+    def __init__(
+            self,
+            stream=None,
+            max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+            flush_interval: Optional[float] = DEFAULT_FLUSH_INTERVAL,
+            flush_level: int = logging.ERROR,
+    ):
+        super(BufferedStreamHandler, self).__init__(stream)
+        self._init_buffering(max_buffer_bytes, flush_interval, flush_level)
+
+    def close(self):
+        # StreamHandler.close doesn't flush, and the stream itself is left open
+        self.flush()
+        super(BufferedStreamHandler, self).close()
+
+
+class BufferedFileHandler(_BufferingMixin, logging.FileHandler):
+    def __init__(
+            self,
+            filename: str,
+            mode: str = 'a',
+            encoding: str = None,
+            max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES,
+            flush_interval: Optional[float] = DEFAULT_FLUSH_INTERVAL,
+            flush_level: int = logging.ERROR,
+    ):
+        super(BufferedFileHandler, self).__init__(filename, mode, encoding=encoding)
+        self._init_buffering(max_buffer_bytes, flush_interval, flush_level)
@@ -0,0 +1,372 @@
+import atexit
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Callable, Dict, Iterator, List, Optional
+
+from advanced_logger.handlers.async_queue_handler import OVERFLOW_BLOCK, OVERFLOW_DROP_NEW, OVERFLOW_DROP_OLDEST, \
+    OVERFLOW_POLICIES
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+from advanced_logger.handlers.mmap_file_handler import DEFAULT_SEGMENT_SIZE
+from advanced_logger.handlers.segment_index import read_index, segment_filename, write_index
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+__author__ = 'neil@everymundo.com'
+
+COMPRESSION_FORMATS = ('gzip', 'zstd')
+_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+# wbits for a zlib stream with a gzip header and trailer
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class _GzipCompressor(object):
+    def __init__(self, level: int = None):
+        self._compressor = zlib.compressobj(6 if level is None else level, zlib.DEFLATED, _GZIP_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        # ends on a byte boundary, so everything compressed so far can be decoded from the file
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _ZstdCompressor(object):
+    def __init__(self, level: int = None):
+        self._compressor = zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def _make_compressor(compression: str, level: int = None):
+    if compression == 'gzip':
+        return _GzipCompressor(level)
+    return _ZstdCompressor(level)
+
+
+def _make_decompressor(compression: str):
+    if compression == 'gzip':
+        return zlib.decompressobj(_GZIP_WBITS)
+    if zstandard is None:
+        raise ImportError("zstandard is not installed")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def check_compression(compression: str):
+    if compression not in COMPRESSION_FORMATS:
+        raise ValueError("compression must be one of {}".format(COMPRESSION_FORMATS))
+    if compression == 'zstd' and zstandard is None:
+        raise ImportError("zstandard is not installed")
+
+
+class CompressedSegmentFileHandler(logging.Handler):
+    """
+    Writes records as JSON lines through a streaming compressor (gzip, or zstd when zstandard is installed)
+    into segment files, named {filename}.000000.gz, {filename}.000001.gz, etc.
+
+    Each segment is a complete gzip member/zstd frame, so it can be decoded on its own (e.g. with zcat) once
+    it's finished. A segment is finished when segment_size bytes of records (before compression) have been written
+    to it, when it's been open for segment_interval seconds, and when the handler is closed.
+
+    Records are formatted on the calling thread, and queued for a background thread which does the compression
+    and the writes. flush() waits for everything queued to be compressed and written out, in a state where
+    the unfinished segment can be decoded up to the last record too.
+    The queue holds at most max_queue_size records, when the writer falls behind the overflow policy decides
+    what happens, like AsyncQueueHandler's. Records dropped because the queue was full, or because they were logged
+    after the handler was closed, are counted in dropped_count, and reported to on_drop if it's given.
+
+    An index of the segments, with their uncompressed/compressed sizes, record counts and first/last record times,
+    is published to {filename}.index.json whenever a segment is started or finished and when the handler is closed.
+    A process forked from the one which created the handler writes its own set of segments, {filename}.{pid}.000000.gz
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            compression: str = 'gzip',
+            segment_size: int = DEFAULT_SEGMENT_SIZE,
+            segment_interval: float = None,
+            compression_level: int = None,
+            encoding: str = 'utf-8',
+            max_queue_size: int = 10000,
+            overflow_policy: str = OVERFLOW_BLOCK,
+            on_drop: Callable[[], None] = None,
+    ):
+        check_compression(compression)
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of {}".format(OVERFLOW_POLICIES))
+        if max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+        if segment_size < 1:
+            raise ValueError("segment_size must be at least 1")
+        if segment_interval is not None and segment_interval <= 0:
+            raise ValueError("segment_interval must be positive")
+        super(CompressedSegmentFileHandler, self).__init__()
+        self.base_filename = os.path.abspath(filename)
+        self.compression = compression
+        self.segment_size = segment_size
+        self.segment_interval = segment_interval
+        self.compression_level = compression_level
+        self.encoding = encoding
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.dropped_count = 0
+        self._on_drop = on_drop
+
+        self._segments = read_index(self.base_filename)['segments']  # type: List[Dict]
+        self._current = None  # type: Optional[Dict]
+        self._file = None
+        self._compressor = None
+        self._segment_started = 0.0
+
+        # (formatted record, record time), or None to ask the writer to flush
+        self._queue = deque()
+        # the records in _queue, which also has the flush requests
+        self._queued_records = 0
+        self._closing = False
+        self._writer_thread = None  # type: Optional[threading.Thread]
+        self._init_queue_lock()
+        self._start_writer_thread()
+
+        atexit.register(self.close)
+        register_after_fork_in_child(self)
+
+    def _init_queue_lock(self):
+        self._queue_lock = threading.Lock()
+        self._not_empty = threading.Condition(self._queue_lock)
+        self._not_full = threading.Condition(self._queue_lock)
+        self._flushed = threading.Condition(self._queue_lock)
+        self._flush_requests = 0
+        self._flushes_done = 0
+
+    def _start_writer_thread(self):
+        self._writer_thread = threading.Thread(
+            target=self._writer_loop, name='AdvancedLoggerCompressedWriter', daemon=True
+        )
+        self._writer_thread.start()
+
+    def _after_fork_in_child(self):
+        # the segment belongs to the parent, drop our copy without finishing it, and whatever was queued
+        # will be written by the parent
+        self._init_queue_lock()
+        self._queue.clear()
+        self._queued_records = 0
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self._compressor = None
+        self._current = None
+        self.base_filename = '{}.{}'.format(self.base_filename, os.getpid())
+        self._segments = read_index(self.base_filename)['segments']
+        if not self._closing:
+            self._start_writer_thread()
+
+    def _open_segment(self, created: float):
+        segment_number = self._segments[-1]['segment'] + 1 if self._segments else 0
+        filename = segment_filename(self.base_filename, segment_number) + _EXTENSIONS[self.compression]
+        self._file = open(filename, 'wb')
+        self._compressor = _make_compressor(self.compression, self.compression_level)
+        self._segment_started = time.monotonic()
+        self._current = {
+            'segment': segment_number,
+            'file': os.path.basename(filename),
+            'compression': self.compression,
+            'bytes': 0,
+            'compressed_bytes': 0,
+            'records': 0,
+            'first_time': created,
+            'last_time': created,
+        }
+        self._segments.append(self._current)
+        self._publish_index()
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._write_compressed(self._compressor.finish())
+        self._file.close()
+        self._file = None
+        self._compressor = None
+        self._publish_index()
+
+    def _write_compressed(self, data: bytes):
+        if data:
+            self._file.write(data)
+            self._current['compressed_bytes'] += len(data)
+
+    def _publish_index(self):
+        write_index(self.base_filename, self.segment_size, self._segments)
+
+    def _is_segment_due(self) -> bool:
+        return self.segment_interval is not None and self._file is not None \
+            and time.monotonic() - self._segment_started >= self.segment_interval
+
+    def _write_batch(self, batch: List) -> int:
+        flushes = 0
+        for item in batch:
+            if item is None:
+                flushes += 1
+                continue
+            data, created = item
+            if self._file is not None and (self._current['bytes'] >= self.segment_size or self._is_segment_due()):
+                self._close_segment()
+            if self._file is None:
+                self._open_segment(created)
+            self._write_compressed(self._compressor.compress(data))
+            current = self._current
+            current['bytes'] += len(data)
+            current['records'] += 1
+            current['last_time'] = created
+        if flushes and self._file is not None:
+            self._write_compressed(self._compressor.flush())
+            self._file.flush()
+        return flushes
+
+    def _writer_loop(self):
+        while True:
+            with self._queue_lock:
+                while not self._queue and not self._closing:
+                    # wakes up to finish a segment which has been open for segment_interval, even when idle
+                    self._not_empty.wait(self.segment_interval)
+                    if not self._queue and self._is_segment_due():
+                        break
+                if not self._queue and self._closing:
+                    return
+                batch = list(self._queue)
+                self._queue.clear()
+                self._queued_records = 0
+                self._not_full.notify_all()
+
+            try:
+                if self._is_segment_due():
+                    self._close_segment()
+                flushes = self._write_batch(batch)
+            except Exception:
+                flushes = batch.count(None)
+                self.handleError(None)
+
+            if flushes:
+                with self._queue_lock:
+                    self._flushes_done += flushes
+                    self._flushed.notify_all()
+
+    def _drop(self):
+        self.dropped_count += 1
+        if self._on_drop is not None:
+            self._on_drop()
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + '\n').encode(self.encoding)
+            with self._queue_lock:
+                # the writer thread only logs here when something goes wrong, it can't wait for itself to make room
+                if self._queued_records >= self.max_queue_size \
+                        and threading.current_thread() is not self._writer_thread:
+                    if self.overflow_policy == OVERFLOW_DROP_NEW:
+                        self._drop()
+                        return
+                    elif self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                        self._drop_oldest()
+                    else:
+                        while self._queued_records >= self.max_queue_size and not self._closing:
+                            self._not_full.wait()
+                if self._closing:
+                    # the segment is finished, there's nowhere to write it
+                    self._drop()
+                    return
+                self._queue.append((data, record.created))
+                self._queued_records += 1
+                self._not_empty.notify()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _drop_oldest(self):
+        for i, item in enumerate(self._queue):
+            # flush requests stay, their callers are waiting for them
+            if item is not None:
+                del self._queue[i]
+                self._queued_records -= 1
+                self._drop()
+                return
+
+    @property
+    def queue_size(self) -> int:
+        return self._queued_records
+
+    def flush(self):
+        """
+        Waits for everything logged so far to be compressed and written to the segment file
+        """
+        with self._queue_lock:
+            if self._closing or threading.current_thread() is self._writer_thread:
+                return
+            self._flush_requests += 1
+            target = self._flush_requests
+            self._queue.append(None)
+            self._not_empty.notify()
+            while self._flushes_done < target and self._writer_thread.is_alive():
+                self._flushed.wait(1.0)
+
+    def close(self):
+        with self._queue_lock:
+            already_closing = self._closing
+            self._closing = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
+        if not already_closing:
+            atexit.unregister(self.close)
+            if self._writer_thread is not None and self._writer_thread is not threading.current_thread():
+                self._writer_thread.join()
+            self.acquire()
+            try:
+                self._close_segment()
+            finally:
+                self.release()
+        super(CompressedSegmentFileHandler, self).close()
+
+
+def iter_compressed_lines(filename: str) -> Iterator[bytes]:
+    """
+    Yields every line written by a CompressedSegmentFileHandler to filename, in order, without the trailing newline.
+    Safe to use while the handler is still writing, the unfinished segment is read up to its last flush()
+    """
+    base_filename = os.path.abspath(filename)
+    for segment in read_index(base_filename)['segments']:
+        try:
+            f = open(os.path.join(os.path.dirname(base_filename), segment['file']), 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            decompressor = _make_decompressor(segment.get('compression', 'gzip'))
+            pending = b''
+            while True:
+                chunk = f.read(1024 * 1024)
+                if not chunk:
+                    break
+                try:
+                    pending += decompressor.decompress(chunk)
+                except (zlib.error, EOFError):
+                    # the end of a segment which is still being written to
+                    break
+                lines = pending.split(b'\n')
+                pending = lines.pop()
+                yield from lines
@@ -0,0 +1,24 @@
+import os
+import weakref
+
+__author__ = 'neil@everymundo.com'
+
+_AFTER_FORK_IN_CHILD = weakref.WeakSet()
+
+
+def register_after_fork_in_child(obj):
+    """
+    Calls obj._after_fork_in_child() in the child process after a fork, as long as obj is still alive.
+    Used by handlers which own threads, sockets or memory maps that can't be shared with the parent process
+    """
+    _AFTER_FORK_IN_CHILD.add(obj)
+
+
+def _after_fork_in_child():
+    for obj in list(_AFTER_FORK_IN_CHILD):
+        # noinspection PyProtectedMember
+        obj._after_fork_in_child()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
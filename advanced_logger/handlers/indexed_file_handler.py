@@ -0,0 +1,80 @@
+import logging
+import os
+from typing import Optional
+
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+from advanced_logger.log_index import DEFAULT_BUCKET_SECONDS, LogIndexWriter, index_filename, line_time_ns, \
+    rebuild_index
+
+__author__ = 'neil@everymundo.com'
+
+
+class IndexedFileHandler(logging.FileHandler):
+    """
+    Appends records to a file as JSON lines, like logging.FileHandler, while keeping a sparse index of the file
+    in {filename}.idx, which maps time buckets (and the levels logged in them) to where they start in the file.
+    Read a time range with advanced_logger.log_index.iter_time_range.
+
+    The index uses the records' meta.time, the same as rebuild_index, and it's updated with a write only when
+    a bucket starts or gets a level it didn't have yet.
+    Appending to an existing log which doesn't have an index builds one first.
+    A process forked from the one which created the handler writes its own log and index, {filename}.{pid}
+    """
+
+    def __init__(self, filename: str, bucket_seconds: float = DEFAULT_BUCKET_SECONDS, delay: bool = False):
+        self.bucket_seconds = bucket_seconds
+        self._index = None  # type: Optional[LogIndexWriter]
+        self._offset = 0
+        super(IndexedFileHandler, self).__init__(filename, 'ab', delay=delay)
+        register_after_fork_in_child(self)
+
+    def _after_fork_in_child(self):
+        # the offsets of the parent's file are only known to the parent
+        self.acquire()
+        try:
+            self._close_index()
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
+            self.baseFilename = '{}.{}'.format(self.baseFilename, os.getpid())
+            self.stream = self._open()
+        finally:
+            self.release()
+
+    def _open(self):
+        if not os.path.exists(index_filename(self.baseFilename)) and os.path.exists(self.baseFilename) \
+                and os.path.getsize(self.baseFilename):
+            rebuild_index(self.baseFilename, self.bucket_seconds)
+        stream = super(IndexedFileHandler, self)._open()
+        self._offset = stream.seek(0, os.SEEK_END)
+        self._index = LogIndexWriter(
+            index_filename(self.baseFilename), bucket_ns=int(self.bucket_seconds * 1000000000)
+        )
+        return stream
+
+    def _close_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            if self.stream is None:
+                self.stream = self._open()
+            data = (self.format(record) + '\n').encode('utf-8')
+            self._index.add(line_time_ns(data), self._offset, record.levelno)
+            self.stream.write(data)
+            self._offset += len(data)
+            self.flush()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_index()
+        finally:
+            self.release()
+        super(IndexedFileHandler, self).close()
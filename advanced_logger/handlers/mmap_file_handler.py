@@ -0,0 +1,190 @@
+import logging
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional
+
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+from advanced_logger.handlers.segment_index import read_index, segment_filename, write_index
+
+__author__ = 'neil@everymundo.com'
+
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+
+class MmapSegmentFileHandler(logging.Handler):
+    """
+    Writes records as JSON lines into pre-allocated, fixed size segment files through a shared memory map,
+    so a write is a memory copy rather than a write() syscall. Pages are written back by the OS,
+    so records survive the process crashing.
+
+    When a segment is full it's truncated to the bytes used and writing moves on to the next segment,
+    named {filename}.000000, {filename}.000001, etc.
+    An index of the segments, with their offset in the overall log, record counts and first/last record times,
+    is published to {filename}.index.json whenever a segment is started or finished and when the handler is closed.
+    A process forked from the one which created the handler writes its own set of segments, {filename}.{pid}.000000
+    """
+
+    def __init__(self, filename: str, segment_size: int = DEFAULT_SEGMENT_SIZE, encoding: str = 'utf-8'):
+        super(MmapSegmentFileHandler, self).__init__()
+        self.base_filename = os.path.abspath(filename)
+        self.segment_size = segment_size
+        self.encoding = encoding
+
+        self._segments = read_index(self.base_filename)['segments']  # type: List[Dict]
+        self._current = None  # type: Optional[Dict]
+        self._fd = None  # type: Optional[int]
+        self._mmap = None  # type: Optional[mmap.mmap]
+        self._size = 0
+        self._offset = 0
+
+        if self._segments:
+            self._recover_last_segment()
+        self._open_segment()
+        register_after_fork_in_child(self)
+
+    def _after_fork_in_child(self):
+        # the segment belongs to the parent, so drop our copy of the mapping without truncating the file
+        if self._mmap is None:
+            return
+        self._mmap.close()
+        os.close(self._fd)
+        self._mmap = None
+        self._fd = None
+        self.base_filename = '{}.{}'.format(self.base_filename, os.getpid())
+        self._segments = read_index(self.base_filename)['segments']
+        self._open_segment()
+
+    def _recover_last_segment(self):
+        """
+        After a crash the last segment is still padded out to its full size, and its index entry is out of date
+        """
+        last = self._segments[-1]
+        filename = segment_filename(self.base_filename, last['segment'])
+        try:
+            with open(filename, 'r+b') as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    return
+                with mmap.mmap(f.fileno(), size) as m:
+                    used = m.find(b'\0', last['bytes'])
+                if used != -1:
+                    f.truncate(used)
+                    size = used
+        except FileNotFoundError:
+            size = 0
+        last['bytes'] = size
+
+    def _open_segment(self, min_size: int = 0):
+        segment_number = self._segments[-1]['segment'] + 1 if self._segments else 0
+        offset = self._segments[-1]['offset'] + self._segments[-1]['bytes'] if self._segments else 0
+        filename = segment_filename(self.base_filename, segment_number)
+
+        self._size = max(self.segment_size, min_size)
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        if hasattr(os, 'posix_fallocate'):
+            # actually reserve the disk blocks, rather than leaving a sparse file which can fail to write later
+            os.posix_fallocate(self._fd, 0, self._size)
+        else:
+            os.ftruncate(self._fd, self._size)
+        self._mmap = mmap.mmap(self._fd, self._size)
+        self._offset = 0
+
+        self._current = {
+            'segment': segment_number,
+            'file': os.path.basename(filename),
+            'offset': offset,
+            'bytes': 0,
+            'records': 0,
+            'first_time': None,
+            'last_time': None,
+        }
+        self._segments.append(self._current)
+        self._publish_index()
+
+    def _close_segment(self):
+        if self._mmap is None:
+            return
+        self._mmap.flush()
+        self._mmap.close()
+        os.ftruncate(self._fd, self._offset)
+        os.close(self._fd)
+        self._mmap = None
+        self._fd = None
+        self._publish_index()
+
+    def _publish_index(self):
+        write_index(self.base_filename, self.segment_size, self._segments)
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + '\n').encode(self.encoding)
+            if self._mmap is None:
+                return
+            if self._offset + len(data) > self._size:
+                self._close_segment()
+                self._open_segment(min_size=len(data))
+
+            self._mmap[self._offset:self._offset + len(data)] = data
+            self._offset += len(data)
+
+            current = self._current
+            current['bytes'] = self._offset
+            current['records'] += 1
+            if current['first_time'] is None:
+                current['first_time'] = record.created
+            current['last_time'] = record.created
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        # the mapping is shared, so everything written is already visible to readers of the file,
+        # use sync() to also force it to disk
+        pass
+
+    def sync(self):
+        self.acquire()
+        try:
+            if self._mmap is not None:
+                self._mmap.flush()
+            self._publish_index()
+        finally:
+            self.release()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_segment()
+        finally:
+            self.release()
+        super(MmapSegmentFileHandler, self).close()
+
+
+def iter_segment_lines(filename: str) -> Iterator[bytes]:
+    """
+    Yields every line written by a MmapSegmentFileHandler to filename, in order, without the trailing newline.
+    Safe to use while the handler is still writing, the unused part of the live segment is skipped
+    """
+    base_filename = os.path.abspath(filename)
+    for segment in read_index(base_filename)['segments']:
+        try:
+            f = open(os.path.join(os.path.dirname(base_filename), segment['file']), 'rb')
+        except FileNotFoundError:
+            continue
+        with f:
+            if not os.fstat(f.fileno()).st_size:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                # a segment which is still being written to is padded with NUL bytes
+                end = m.find(b'\0')
+                if end == -1:
+                    end = len(m)
+                start = 0
+                while start < end:
+                    newline = m.find(b'\n', start, end)
+                    if newline == -1:
+                        # a record in the middle of being written
+                        break
+                    yield m[start:newline]
+                    start = newline + 1
@@ -0,0 +1,174 @@
+"""
+Multi-process logging for pre-fork servers (gunicorn, uwsgi, ...)
+
+The master process starts a MultiprocessLogServer, a separate writer process which owns the log file or stream.
+Every process (master and forked workers) logs through a MultiprocessClientHandler, which sends already formatted
+records over its own unix socket connection to the writer process, so workers never contend on a file lock
+and lines from different workers never interleave.
+A record is safe once it's been sent, the writer process keeps reading a connection until the worker closes it,
+so recycled workers don't lose records.
+"""
+import atexit
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional, TextIO
+
+from advanced_logger.handlers.fork_safety import register_after_fork_in_child
+from advanced_logger.handlers import multiprocess_writer
+from advanced_logger.handlers.multiprocess_writer import FRAME_HEADER
+
+__author__ = 'neil@everymundo.com'
+
+
+def _default_socket_path() -> str:
+    return os.path.join(tempfile.gettempdir(), 'advanced_logger_{}.sock'.format(os.getpid()))
+
+
+class MultiprocessLogServer(object):
+    """
+    Runs the writer process, which owns filename if it's given, or else the stream (which must be stdout or stderr)
+    """
+
+    def __init__(self, socket_path: str = None, filename: str = None, stream: TextIO = None):
+        if not filename:
+            if stream is None:
+                stream = sys.stdout
+            try:
+                stream_fd = stream.fileno()
+            except (AttributeError, OSError, ValueError):
+                stream_fd = None
+            if stream_fd not in (1, 2):
+                raise ValueError("multiprocess logging to a stream only supports stdout and stderr")
+        else:
+            stream_fd = None
+
+        self.socket_path = socket_path or _default_socket_path()
+        self.filename = os.path.abspath(filename) if filename else None
+        self.stream_fd = stream_fd
+        self.owner_pid = os.getpid()
+        self._process = None  # type: Optional[subprocess.Popen]
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def start(self, timeout: float = 10):
+        if self.is_running:
+            return
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+        # a fresh interpreter rather than a fork, so the writer doesn't inherit any threads or locks,
+        # and not a multiprocessing.Process, which forked workers would try to terminate when they exit
+        args = [
+            sys.executable, '-m', multiprocess_writer.__name__,
+            '--socket-path', self.socket_path,
+            '--parent-pid', str(self.owner_pid),
+        ]
+        if self.filename:
+            args += ['--filename', self.filename]
+        else:
+            args += ['--stream-fd', str(self.stream_fd)]
+        self._process = subprocess.Popen(args)
+
+        deadline = time.monotonic() + timeout
+        while not self._can_connect():
+            if self._process.poll() is not None or time.monotonic() > deadline:
+                self._process.kill()
+                raise RuntimeError("advanced_logger writer process failed to start")
+            time.sleep(0.01)
+        atexit.register(self.stop)
+
+    def _can_connect(self) -> bool:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def stop(self, timeout: float = 10):
+        """
+        Stops the writer process once it has written everything it was sent. Only the process which started it can
+        """
+        if os.getpid() != self.owner_pid or self._process is None:
+            return
+        atexit.unregister(self.stop)
+        # make sure our own records are sent before the writer process drains its connections
+        for handler in logging.getLogger().handlers:
+            handler.flush()
+        self._process.terminate()
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._process = None
+
+
+class MultiprocessClientHandler(logging.Handler):
+    """
+    Sends formatted records to a MultiprocessLogServer's writer process.
+    Each process opens its own connection, a process forked after the handler was created connects on its first record.
+    If the writer process can't be reached the record is written to stderr rather than lost
+    """
+    terminator = '\n'
+
+    def __init__(self, socket_path: str):
+        super(MultiprocessClientHandler, self).__init__()
+        self.socket_path = socket_path
+        self._sock = None  # type: Optional[socket.socket]
+        register_after_fork_in_child(self)
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+
+    def _close_socket(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            data = (self.format(record) + self.terminator).encode('utf-8')
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(FRAME_HEADER.pack(len(data)) + data)
+            except OSError:
+                self._close_socket()
+                sys.stderr.write(data.decode('utf-8'))
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def _after_fork_in_child(self):
+        # the connection belongs to the parent, closing our copy of it doesn't affect the parent's
+        self._close_socket()
+
+    def close(self):
+        self.acquire()
+        try:
+            self._close_socket()
+        finally:
+            self.release()
+        super(MultiprocessClientHandler, self).close()
+
@@ -0,0 +1,110 @@
+"""
+The writer process started by MultiprocessLogServer, run as `python -m advanced_logger.handlers.multiprocess_writer`
+"""
+import argparse
+import os
+import selectors
+import signal
+import socket
+import struct
+from typing import Optional
+
+__author__ = 'neil@everymundo.com'
+
+# every record is sent as its length followed by the utf-8 encoded, formatted record (including the newline)
+FRAME_HEADER = struct.Struct('>I')
+_RECV_SIZE = 256 * 1024
+
+
+def _run_log_server(socket_path: str, filename: Optional[str], stream_fd: Optional[int], parent_pid: int):
+    stopping = []
+    # stop on SIGTERM once everything already sent has been written,
+    # a ctrl-c in the terminal goes to the whole process group so that's left to the parent
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    if filename:
+        out = open(filename, 'ab')
+    else:
+        out = os.fdopen(stream_fd, 'wb', closefd=False)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(socket.SOMAXCONN)
+    listener.setblocking(False)
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    buffers = {}
+
+    try:
+        while True:
+            is_stopping = stopping or os.getppid() != parent_pid
+            events = selector.select(timeout=0 if is_stopping else 0.1)
+            if is_stopping and not events:
+                # everything that had already been sent has been written
+                break
+
+            chunks = []
+            for key, _ in events:
+                if key.fileobj is listener:
+                    conn, _ = listener.accept()
+                    conn.setblocking(False)
+                    selector.register(conn, selectors.EVENT_READ)
+                    buffers[conn] = bytearray()
+                    continue
+
+                conn = key.fileobj
+                try:
+                    data = conn.recv(_RECV_SIZE)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    data = b''
+                if not data:
+                    selector.unregister(conn)
+                    conn.close()
+                    del buffers[conn]
+                    continue
+
+                buffer = buffers[conn]
+                buffer += data
+                position = 0
+                while len(buffer) - position >= FRAME_HEADER.size:
+                    length, = FRAME_HEADER.unpack_from(buffer, position)
+                    end = position + FRAME_HEADER.size + length
+                    if end > len(buffer):
+                        break
+                    chunks.append(bytes(buffer[position + FRAME_HEADER.size:end]))
+                    position = end
+                del buffer[:position]
+
+            if chunks:
+                # one write for everything received from every worker in this round
+                out.write(b''.join(chunks))
+                out.flush()
+    finally:
+        for conn in buffers:
+            conn.close()
+        listener.close()
+        try:
+            os.unlink(socket_path)
+        except FileNotFoundError:
+            pass
+        out.flush()
+        if filename:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="advanced_logger multiprocess writer, see MultiprocessLogServer")
+    parser.add_argument('--socket-path', required=True)
+    parser.add_argument('--parent-pid', required=True, type=int)
+    parser.add_argument('--filename')
+    parser.add_argument('--stream-fd', type=int)
+    args = parser.parse_args()
+    _run_log_server(args.socket_path, args.filename, args.stream_fd, args.parent_pid)
+
+
+if __name__ == '__main__':
+    main()
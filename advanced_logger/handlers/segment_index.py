@@ -0,0 +1,33 @@
+"""
+The segment files and {filename}.index.json index shared by MmapSegmentFileHandler and CompressedSegmentFileHandler
+"""
+import json
+import os
+from typing import Dict, List
+
+__author__ = 'neil@everymundo.com'
+
+
+def segment_filename(base_filename: str, segment_number: int) -> str:
+    return '{}.{:06d}'.format(base_filename, segment_number)
+
+
+def index_filename(base_filename: str) -> str:
+    return base_filename + '.index.json'
+
+
+def read_index(base_filename: str) -> Dict:
+    try:
+        with open(index_filename(base_filename)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'segments': []}
+
+
+def write_index(base_filename: str, segment_size: int, segments: List[Dict]):
+    filename = index_filename(base_filename)
+    tmp_filename = filename + '.tmp'
+    with open(tmp_filename, 'w') as f:
+        json.dump({'segment_size': segment_size, 'segments': segments}, f)
+    # atomic, so readers never see a partially written index
+    os.replace(tmp_filename, filename)
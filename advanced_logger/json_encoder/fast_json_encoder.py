@@ -0,0 +1,121 @@
+import datetime
+import decimal
+import uuid
+from functools import lru_cache
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .advanced_json_encoder import RE_TYPE, AdvancedJSONEncoder
+from .django_json_encoder_copy import is_aware, duration_iso_string
+
+_TYPE_ENCODERS_TYPE = Optional[Dict[type, Callable[[Any], Any]]]
+# the configurations are keyed by the type encoder functions, so callers passing a new lambda each time
+# only rebuild the encoder rather than keeping every one they made
+_MAX_CACHED_ENCODERS = 32
+
+
+def _encode_time(o: datetime.time) -> str:
+    # same output as DjangoJSONEncoder
+    if is_aware(o):
+        raise ValueError("JSON can't represent timezone-aware times.")
+    r = o.isoformat()
+    if o.microsecond:
+        r = r[:12]
+    return r
+
+
+def _default_type_encoders(re_types: Tuple[type, ...]) -> Dict[type, Callable[[Any], Any]]:
+    """
+    The dispatch table equivalent of the isinstance chains in AdvancedJSONEncoder.default and DjangoJSONEncoder.default
+    """
+    type_encoders = {
+        datetime.datetime: datetime.datetime.isoformat,
+        datetime.date: datetime.date.isoformat,
+        datetime.time: _encode_time,
+        datetime.timedelta: duration_iso_string,
+        decimal.Decimal: str,
+        uuid.UUID: str,
+        frozenset: str,
+    }
+    for re_type in re_types:
+        type_encoders[re_type] = str
+    return type_encoders
+
+
+class TypeDispatchTable(object):
+    """
+    functools.singledispatch style lookup of an encoding function by the type of the object.
+    Exact types are a single dict lookup, subclasses walk the MRO once and the result is cached.
+    Anything without a registered encoder is passed to the fallback.
+    """
+
+    def __init__(self, type_encoders: Dict[type, Callable[[Any], Any]], fallback: Callable[[Any], Any]):
+        self._registry = dict(type_encoders)
+        self._cache = dict(type_encoders)  # type: Dict[type, Optional[Callable[[Any], Any]]]
+        self._fallback = fallback
+
+    def lookup(self, cls: type) -> Optional[Callable[[Any], Any]]:
+        try:
+            return self._cache[cls]
+        except KeyError:
+            pass
+
+        fn = None
+        for base in cls.__mro__:
+            if base in self._registry:
+                fn = self._registry[base]
+                break
+        self._cache[cls] = fn
+        return fn
+
+    def __call__(self, o: Any) -> Any:
+        fn = self.lookup(type(o))
+        if fn is None:
+            return self._fallback(o)
+        return fn(o)
+
+
+class FastJSONEncoder(AdvancedJSONEncoder):
+    """
+    AdvancedJSONEncoder which resolves non-native types through a TypeDispatchTable instead of isinstance chains.
+    Meant to be built once with get_fast_encoder and reused, rather than instantiated on every json.dumps call.
+    """
+
+    def __init__(self, *, dispatch_table: TypeDispatchTable, **kwargs):
+        # JSONEncoder uses `default` in place of the default method when it's passed in
+        super(FastJSONEncoder, self).__init__(default=dispatch_table, **kwargs)
+
+
+@lru_cache(maxsize=_MAX_CACHED_ENCODERS)
+def _get_dispatch_table(re_types: Tuple[type, ...], type_encoders: Tuple[Tuple[type, Callable], ...]):
+    all_type_encoders = _default_type_encoders(re_types)
+    all_type_encoders.update(type_encoders)
+    # anything the table doesn't know about still gets the full AdvancedJSONEncoder treatment,
+    # e.g. extra types handled by the real DjangoJSONEncoder when django is installed
+    return TypeDispatchTable(all_type_encoders, fallback=AdvancedJSONEncoder().default)
+
+
+@lru_cache(maxsize=_MAX_CACHED_ENCODERS)
+def _get_fast_encoder(re_types: Tuple[type, ...], type_encoders: Tuple[Tuple[type, Callable], ...], indent):
+    return FastJSONEncoder(dispatch_table=_get_dispatch_table(re_types, type_encoders), indent=indent)
+
+
+def get_dispatch_table(re_types: Tuple[type, ...] = RE_TYPE, type_encoders: _TYPE_ENCODERS_TYPE = None):
+    """
+    Returns the cached TypeDispatchTable for the given regex types and user defined type encoders
+    """
+    return _get_dispatch_table(tuple(re_types), tuple((type_encoders or {}).items()))
+
+
+def get_fast_encoder(
+        re_types: Tuple[type, ...] = RE_TYPE,
+        type_encoders: _TYPE_ENCODERS_TYPE = None,
+        indent: Optional[int] = None,
+) -> FastJSONEncoder:
+    """
+    Returns a FastJSONEncoder which is only built once per configuration, use its encode method in place of json.dumps
+    :param re_types: types to treat as regexes (serialized with str)
+    :param type_encoders: mapping of additional types to a function returning a JSON serializable value,
+        these take priority over the built in encoders
+    :param indent: passed through to json.JSONEncoder
+    """
+    return _get_fast_encoder(tuple(re_types), tuple((type_encoders or {}).items()), indent)
@@ -0,0 +1,167 @@
+"""
+Swappable JSON serialization backends.
+
+Every backend produces JSON which decodes to the same value as the stdlib backend (AdvancedJSONEncoder's output),
+the raw text may differ in whitespace and escaping. Known differences:
+  * orjson encodes NaN and Infinity as null, and Enum members by value
+ujson would encode decimal.Decimal natively as a JSON number, losing e.g. the trailing zero of 1.10, so Decimals
+are converted with the same encoders as the stdlib backend before the object is passed to it. Objects are only walked
+for them when they have something other than built-in types in them, so plain records cost a marshal.dumps on top of
+ujson's own encoding. 'auto' doesn't pick it, orjson is faster and hands Decimals to its default, so needs no walk.
+"""
+import decimal
+import marshal
+from typing import Any, Callable, Dict, Optional
+
+from .fast_json_encoder import get_fast_encoder, get_dispatch_table
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+_TYPE_ENCODERS_TYPE = Optional[Dict[type, Callable[[Any], Any]]]
+# types which can't have a Decimal in them
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+class JSONBackend(object):
+    name = None  # type: str
+
+    def __init__(self, type_encoders: _TYPE_ENCODERS_TYPE = None):
+        self.type_encoders = type_encoders
+        # the stdlib encoder is the reference implementation, and the fallback for anything a backend can't handle
+        self._stdlib_encoder = get_fast_encoder(type_encoders=type_encoders)
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        raise NotImplementedError()
+
+    def _stdlib_dumps(self, obj: Any, indent: int = None) -> str:
+        if indent is None:
+            return self._stdlib_encoder.encode(obj)
+        return get_fast_encoder(type_encoders=self.type_encoders, indent=indent).encode(obj)
+
+
+class StdlibJSONBackend(JSONBackend):
+    name = 'stdlib'
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        return self._stdlib_dumps(obj, indent=indent)
+
+
+class OrjsonJSONBackend(JSONBackend):
+    name = 'orjson'
+
+    def __init__(self, type_encoders: _TYPE_ENCODERS_TYPE = None):
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+        super(OrjsonJSONBackend, self).__init__(type_encoders=type_encoders)
+        self._default = get_dispatch_table(type_encoders=type_encoders)
+        # datetimes and dataclasses are routed through the dispatch table so they serialize like the stdlib backend
+        self._option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        if indent is not None:
+            return self._stdlib_dumps(obj, indent=indent)
+        try:
+            return orjson.dumps(obj, default=self._default, option=self._option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # orjson is stricter than the stdlib, e.g. integers over 64 bits, so let the stdlib have a go at it
+            return self._stdlib_dumps(obj)
+
+
+class UjsonJSONBackend(JSONBackend):
+    name = 'ujson'
+
+    def __init__(self, type_encoders: _TYPE_ENCODERS_TYPE = None):
+        if ujson is None:
+            raise ImportError("ujson is not installed")
+        super(UjsonJSONBackend, self).__init__(type_encoders=type_encoders)
+        self._dispatch_table = get_dispatch_table(type_encoders=type_encoders)
+
+    def _default(self, o: Any) -> Any:
+        # a type encoder can return a Decimal too
+        return self._convert_decimals(self._dispatch_table(o))
+
+    def _convert_decimals(self, obj: Any) -> Any:
+        """
+        obj with every Decimal in it encoded by the dispatch table, only the containers which have one are copied
+        """
+        obj_type = type(obj)
+        if obj_type in _PLAIN_TYPES:
+            return obj
+        if isinstance(obj, dict):
+            if _PLAIN_TYPES.issuperset(map(type, obj.values())):
+                # nothing to convert, checked without a loop in Python
+                return obj
+            converted = None
+            for key, value in obj.items():
+                converted_value = self._convert_decimals(value)
+                if converted_value is not value:
+                    if converted is None:
+                        converted = dict(obj)
+                    converted[key] = converted_value
+            return obj if converted is None else converted
+        if isinstance(obj, (list, tuple)):
+            if _PLAIN_TYPES.issuperset(map(type, obj)):
+                return obj
+            converted = None
+            for i, value in enumerate(obj):
+                converted_value = self._convert_decimals(value)
+                if converted_value is not value:
+                    if converted is None:
+                        converted = list(obj)
+                    converted[i] = converted_value
+            return obj if converted is None else converted
+        if isinstance(obj, decimal.Decimal):
+            return self._dispatch_table(obj)
+        return obj
+
+    def dumps(self, obj: Any, indent: int = None) -> str:
+        if indent is not None:
+            return self._stdlib_dumps(obj, indent=indent)
+        try:
+            # marshal only takes built-in types, so it fails fast at C speed when obj might have a Decimal in it
+            marshal.dumps(obj)
+        except ValueError:
+            obj = self._convert_decimals(obj)
+        try:
+            return ujson.dumps(obj, default=self._default, escape_forward_slashes=False)
+        except OverflowError:
+            return self._stdlib_dumps(obj)
+
+
+JSON_BACKENDS = {
+    StdlibJSONBackend.name: StdlibJSONBackend,
+    OrjsonJSONBackend.name: OrjsonJSONBackend,
+    UjsonJSONBackend.name: UjsonJSONBackend,
+}
+
+
+def available_json_backends() -> Dict[str, type]:
+    available = {StdlibJSONBackend.name: StdlibJSONBackend}
+    if orjson is not None:
+        available[OrjsonJSONBackend.name] = OrjsonJSONBackend
+    if ujson is not None:
+        available[UjsonJSONBackend.name] = UjsonJSONBackend
+    return available
+
+
+def get_json_backend(name: str = 'stdlib', type_encoders: _TYPE_ENCODERS_TYPE = None) -> JSONBackend:
+    """
+    :param name: one of 'stdlib', 'orjson', 'ujson', or 'auto' to use orjson when it's installed and stdlib if not
+    :param type_encoders: see get_fast_encoder
+    """
+    if name == 'auto':
+        available = available_json_backends()
+        for preferred in (OrjsonJSONBackend.name, StdlibJSONBackend.name):
+            if preferred in available:
+                return available[preferred](type_encoders=type_encoders)
+    if name not in JSON_BACKENDS:
+        raise ValueError("Unknown json backend {}, must be one of {}".format(name, ['auto'] + list(JSON_BACKENDS)))
+    return JSON_BACKENDS[name](type_encoders=type_encoders)
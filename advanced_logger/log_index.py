@@ -0,0 +1,303 @@
+"""
+A sparse index of a JSON lines log file, so the records in a time range can be read without scanning the whole file.
+
+The index is a sidecar file, {filename}.idx, written by IndexedFileHandler as records are written, or built from an
+existing log with rebuild_index. It starts with MAGIC and the bucket width in nanoseconds, followed by an entry
+for each time bucket, in the order they were written:
+  * the start of the bucket, in nanoseconds since the epoch
+  * the offset in the log file of the bucket's first record
+  * a mask of the levels of the bucket's records, see level_bit
+Records are indexed by their meta.time, read from the line that's written (see line_time_ns), both by the handler
+and by rebuild_index, so they always build the same index.
+An entry is only started when a record's time is in a later bucket than the current one. Records from threads which
+took their time slightly earlier but were written later go in the current entry, so every record of an entry is
+before the end of its bucket.
+"""
+import calendar
+import logging
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Dict, Iterator, Optional, Union
+
+from advanced_logger.log_reader import LogQuery, _filter_lines, _loads, _get_level_number, _parse_time
+
+__author__ = 'neil@everymundo.com'
+
+MAGIC = b'ALOGIDX1'
+HEADER = struct.Struct('<8sq')
+ENTRY = struct.Struct('<qQI')
+DEFAULT_BUCKET_SECONDS = 1.0
+_NS_PER_SECOND = 1000000000
+_MAX_LEVEL_BIT = 31
+_META_KEY = b'"meta":'
+# the JSON backends don't all put a space after the colon
+_META_OBJECT_RE = re.compile(rb'\s*\{')
+# meta.time as an 'iso' or 'epoch_ns' timestamp_format
+_META_TIME_RE = re.compile(rb'"time":\s*(?:"([^"]*)"|(-?[0-9]+)[,}])')
+_ISO_SECOND_LENGTH = len('YYYY-MM-DDTHH:MM:SS')
+
+
+def index_filename(filename: str) -> str:
+    return filename + '.idx'
+
+
+def level_bit(levelno: int) -> int:
+    """
+    The bit of a level in an entry's level mask, one per 10 levels (DEBUG, INFO, etc.), custom levels share them
+    """
+    return 1 << min(max(levelno, 0) // 10, _MAX_LEVEL_BIT)
+
+
+def _min_level_mask(min_level: int) -> int:
+    # the bits of every level from min_level's up, a custom level between two standard levels shares the lower one's
+    return ~(level_bit(min_level) - 1) & 0xFFFFFFFF
+
+
+class _IsoSecondCache(object):
+    """
+    Converts the YYYY-MM-DDTHH:MM:SS part of ISO timestamps to epoch seconds, once per second
+    """
+    __slots__ = ('cached',)
+
+    def __init__(self):
+        self.cached = (None, None)
+
+    def to_ns(self, timestamp: str) -> int:
+        prefix, fraction = timestamp[:_ISO_SECOND_LENGTH], timestamp[_ISO_SECOND_LENGTH:]
+        if fraction and (fraction[0] != '.' or not fraction[1:].isdigit() or len(fraction) > 10):
+            # an offset or another format, not one advanced_logger writes
+            return _parse_time(timestamp)[1]
+        cached_prefix, seconds = self.cached
+        if cached_prefix != prefix:
+            seconds = calendar.timegm(time.strptime(prefix, '%Y-%m-%dT%H:%M:%S'))
+            self.cached = (prefix, seconds)
+        return seconds * _NS_PER_SECOND + (int(fraction[1:].ljust(9, '0')) if fraction else 0)
+
+
+_ISO_SECONDS = _IsoSecondCache()
+
+
+def line_time_ns(line: bytes) -> Optional[int]:
+    """
+    meta.time of a record's JSON line in nanoseconds since the epoch, found without decoding the whole line.
+    meta comes after msg in records, so it's the last "meta" key. None for a record without a time,
+    like logger.exception() records
+    """
+    meta = line.rfind(_META_KEY)
+    if meta == -1:
+        return None
+    meta_object = _META_OBJECT_RE.match(line, meta + len(_META_KEY))
+    if meta_object is None:
+        return None
+    match = _META_TIME_RE.search(line, meta_object.end())
+    if match is None:
+        return None
+    iso, epoch_ns = match.groups()
+    if epoch_ns is not None:
+        return int(epoch_ns)
+    try:
+        return _ISO_SECONDS.to_ns(iso.decode('utf-8'))
+    except ValueError:
+        return None
+
+
+class LogIndexWriter(object):
+    """
+    Appends entries to an index file, the level mask of the current entry is updated in place
+    when a record adds a level to it
+    """
+
+    def __init__(self, filename: str, bucket_ns: int = int(DEFAULT_BUCKET_SECONDS * _NS_PER_SECOND)):
+        self.filename = filename
+        self._fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(self._fd).st_size
+        if size >= HEADER.size:
+            magic, self.bucket_ns = HEADER.unpack(os.pread(self._fd, HEADER.size, 0))
+            if magic != MAGIC:
+                os.close(self._fd)
+                raise ValueError("{} is not an advanced_logger log index".format(filename))
+        else:
+            self.bucket_ns = bucket_ns
+            os.pwrite(self._fd, HEADER.pack(MAGIC, bucket_ns), 0)
+            size = HEADER.size
+        # an entry which was only partly written is overwritten
+        self.entries = (size - HEADER.size) // ENTRY.size
+        # the start of the current entry's bucket
+        self.bucket = None  # type: Optional[int]
+        self._mask = 0
+        # records without a time before the first entry, which starts at the first of them
+        self._pending_offset = None  # type: Optional[int]
+        self._pending_mask = 0
+        if self.entries:
+            self.bucket, _, self._mask = ENTRY.unpack(os.pread(self._fd, ENTRY.size, self._entry_position(-1)))
+
+    def _entry_position(self, entry: int) -> int:
+        if entry < 0:
+            entry += self.entries
+        return HEADER.size + entry * ENTRY.size
+
+    def add(self, time_ns: Optional[int], offset: int, levelno: int):
+        """
+        Called for each record, before it's written at offset.
+        Records without a time (time_ns None) go in the current entry, or the first one if there isn't one yet
+        """
+        bit = level_bit(levelno)
+        if time_ns is None:
+            if self.bucket is None:
+                if self._pending_offset is None:
+                    self._pending_offset = offset
+                self._pending_mask |= bit
+                return
+            time_ns = self.bucket
+        bucket = time_ns - time_ns % self.bucket_ns
+        if self.bucket is None or bucket > self.bucket:
+            if self._pending_offset is not None:
+                offset = self._pending_offset
+                bit |= self._pending_mask
+                self._pending_offset = None
+                self._pending_mask = 0
+            self.bucket = bucket
+            self._mask = bit
+            os.pwrite(self._fd, ENTRY.pack(bucket, offset, bit), self._entry_position(self.entries))
+            self.entries += 1
+        elif not self._mask & bit:
+            self._mask |= bit
+            # only the mask, at the end of the entry
+            os.pwrite(self._fd, struct.pack('<I', self._mask), self._entry_position(-1) + ENTRY.size - 4)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _get_record_level(record: Dict) -> int:
+    meta = record.get('meta')
+    if not isinstance(meta, dict) or 'level' not in meta:
+        # logger.exception() records don't have a level, they're always ERROR
+        return logging.ERROR
+    level = _get_level_number(str(meta['level']))
+    return level if level is not None else logging.NOTSET
+
+
+def rebuild_index(filename: str, bucket_seconds: float = DEFAULT_BUCKET_SECONDS) -> int:
+    """
+    Builds the index of an existing log file from scratch, e.g. one written without an index, or after changing
+    the bucket width
+    :return: the number of entries in the index
+    """
+    tmp_filename = index_filename(filename) + '.tmp'
+    if os.path.exists(tmp_filename):
+        os.remove(tmp_filename)
+    writer = LogIndexWriter(tmp_filename, bucket_ns=int(bucket_seconds * _NS_PER_SECOND))
+    try:
+        offset = 0
+        with open(filename, 'rb') as f:
+            for line in f:
+                try:
+                    record = _loads(line)
+                except ValueError:
+                    record = None
+                if isinstance(record, dict):
+                    writer.add(line_time_ns(line), offset, _get_record_level(record))
+                offset += len(line)
+        entries = writer.entries
+    finally:
+        writer.close()
+    os.replace(tmp_filename, index_filename(filename))
+    return entries
+
+
+class _IndexView(object):
+    def __init__(self, filename: str):
+        with open(filename, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.bucket_ns = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{} is not an advanced_logger log index".format(filename))
+        self.entries = (len(self._mmap) - HEADER.size) // ENTRY.size
+
+    def __getitem__(self, entry: int) -> tuple:
+        return ENTRY.unpack_from(self._mmap, HEADER.size + entry * ENTRY.size)
+
+    def bisect_left(self, bucket: int) -> int:
+        """
+        The first entry with its bucket at or after bucket
+        """
+        low, high = 0, self.entries
+        while low < high:
+            middle = (low + high) // 2
+            if self[middle][0] < bucket:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def close(self):
+        self._mmap.close()
+
+
+def iter_time_range(
+        filename: str,
+        since=None,
+        until=None,
+        min_level: Union[int, str] = None,
+        name_prefix: str = None,
+        raw: bool = False,
+) -> Iterator[Union[bytes, Dict]]:
+    """
+    The records of a log file in [since, until), using its index to only read the parts of the file with records
+    in that range (and at min_level or above), rather than scanning it from the start.
+    The arguments are the same as LogQuery's, the records are filtered the same way as log_reader.iter_records
+    """
+    query = LogQuery(min_level=min_level, name_prefix=name_prefix, since=since, until=until)
+    index = _IndexView(index_filename(filename))
+    try:
+        since_bucket = query.since[1] - query.since[1] % index.bucket_ns if query.since is not None else None
+        until_bucket = query.until[1] - query.until[1] % index.bucket_ns if query.until is not None else None
+        level_mask = _min_level_mask(query.min_level) if query.min_level is not None else None
+
+        # every record of an entry is before the end of its bucket, so the entries before the first one
+        # for since's bucket or later only have records earlier than since
+        entry = index.bisect_left(since_bucket) if since_bucket is not None else 0
+        with open(filename, 'rb') as f:
+            end_of_file = os.fstat(f.fileno()).st_size
+            while entry < index.entries:
+                bucket, offset, mask = index[entry]
+                # a bucket after until's can still have a late record from until's bucket, but not the one after
+                if until_bucket is not None and bucket > until_bucket + index.bucket_ns:
+                    break
+                end = index[entry + 1][1] if entry + 1 < index.entries else end_of_file
+                entry += 1
+                if level_mask is not None and not mask & level_mask:
+                    continue
+                f.seek(offset)
+                yield from _filter_lines(_iter_lines_until(f, end), query, raw)
+    finally:
+        index.close()
+
+
+def _iter_lines_until(f, end: int) -> Iterator[bytes]:
+    position = f.tell()
+    while position < end:
+        line = f.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+
+def iter_index_entries(filename: str) -> Iterator[tuple]:
+    """
+    (bucket start in nanoseconds, offset, level mask) of each entry in the index of the log file filename
+    """
+    index = _IndexView(index_filename(filename))
+    try:
+        for entry in range(index.entries):
+            yield index[entry]
+    finally:
+        index.close()
@@ -0,0 +1,357 @@
+"""
+Reads the JSON lines written by advanced_logger back, for digging through large log files.
+
+    for record in iter_records('service.log', LogQuery(min_level=logging.ERROR, name_prefix='billing.')):
+        print(format_traceback(record['traceback']) if 'traceback' in record else record['msg'])
+
+Files are streamed, so memory use doesn't grow with the file. A plain (not gzipped) file can be scanned by several
+processes at once, each one reading its own byte range of the file, with the matching records still coming out
+in file order.
+Lines which can't match are skipped before they're decoded, by looking for the level names and name prefix in the
+raw bytes.
+
+Records logged with logger.exception() don't have a "meta" object (apart from meta.truncated when they were cut by
+payload_limits). They're always logged at ERROR, so they're treated as ERROR records, but they're left out by
+name_prefix, since, and until, which they have nothing to match against.
+
+Also a command line tool, see `python -m advanced_logger --help`
+"""
+import argparse
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+__author__ = 'neil@everymundo.com'
+
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+
+_loads = orjson.loads if orjson is not None else json.loads
+# the level name logging.getLevelName gives a level number which was never named
+_UNNAMED_LEVEL_PREFIX = 'Level '
+# records logged with logger.exception() don't have a level, they have a traceback, or a fingerprint when they're
+# a repeat of an exception which was aggregated
+_EXCEPTION_KEYS = ('traceback', 'fingerprint')
+
+
+def _parse_time(value: Union[str, int, float, datetime]) -> tuple:
+    """
+    :return: the time in both of the forms meta.time can have, (the 'iso' timestamp_format, nanoseconds since the epoch)
+    :param value: a datetime (naive ones are UTC, like meta.time), an ISO 8601 str or seconds since the epoch
+    """
+    if isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value, timezone.utc)
+    elif isinstance(value, str):
+        try:
+            value = datetime.fromtimestamp(float(value), timezone.utc)
+        except ValueError:
+            value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    value = value.astimezone(timezone.utc)
+    epoch_ns = (value - datetime(1970, 1, 1, tzinfo=timezone.utc)) // datetime.resolution * 1000
+    return value.replace(tzinfo=None).isoformat(), epoch_ns
+
+
+def _get_level_number(level_name: str) -> Optional[int]:
+    level = logging.getLevelName(level_name)
+    if isinstance(level, int):
+        return level
+    if level_name.startswith(_UNNAMED_LEVEL_PREFIX):
+        try:
+            return int(level_name[len(_UNNAMED_LEVEL_PREFIX):])
+        except ValueError:
+            pass
+    return None
+
+
+class LogQuery(object):
+    """
+    Which records to keep, every condition which is given has to match
+    :param min_level: only records at this level (number or name) or above
+    :param name_prefix: only records from loggers whose name starts with this
+    :param since: only records at this time or later, a datetime (naive ones are UTC), ISO 8601 str
+        or seconds since the epoch
+    :param until: only records before this time
+    """
+
+    def __init__(
+            self,
+            min_level: Union[int, str] = None,
+            name_prefix: str = None,
+            since: Union[str, int, float, datetime] = None,
+            until: Union[str, int, float, datetime] = None,
+    ):
+        if isinstance(min_level, str):
+            level = _get_level_number(min_level.upper())
+            if level is None:
+                raise ValueError("unknown level {}".format(min_level))
+            min_level = level
+        self.min_level = min_level
+        self.name_prefix = name_prefix
+        self.since = _parse_time(since) if since is not None else None
+        self.until = _parse_time(until) if until is not None else None
+
+        # bytes one of which has to be in a line for it to possibly match, None when that can't be narrowed down
+        self._level_markers = None  # type: Optional[List[bytes]]
+        names = [name for level, name in _get_level_names().items() if min_level is not None and level >= min_level]
+        if names and all(_is_plain_json_str(name) for name in names):
+            self._level_markers = [json.dumps(name).encode() for name in names]
+            self._level_markers.append(b'"' + _UNNAMED_LEVEL_PREFIX.encode())
+            if min_level <= logging.ERROR:
+                self._level_markers += [json.dumps(key).encode() for key in _EXCEPTION_KEYS]
+        self._name_marker = None  # type: Optional[bytes]
+        if name_prefix and _is_plain_json_str(name_prefix):
+            self._name_marker = b'"' + name_prefix.encode()
+
+    def could_match(self, line: bytes) -> bool:
+        """
+        A quick check of the raw line, False when it certainly doesn't match
+        """
+        if self._level_markers is not None and not any(marker in line for marker in self._level_markers):
+            return False
+        if self._name_marker is not None and self._name_marker not in line:
+            return False
+        return True
+
+    def matches(self, record: Dict) -> bool:
+        meta = record.get('meta')
+        if not isinstance(meta, dict):
+            meta = {}
+        if 'level' not in meta and any(key in record for key in _EXCEPTION_KEYS):
+            meta = dict(meta, level=logging.getLevelName(logging.ERROR))
+
+        if self.min_level is not None:
+            level = _get_level_number(meta.get('level') or '')
+            if level is None or level < self.min_level:
+                return False
+        if self.name_prefix is not None:
+            name = meta.get('name')
+            if not isinstance(name, str) or not name.startswith(self.name_prefix):
+                return False
+        if self.since is not None or self.until is not None:
+            time = meta.get('time')
+            if time is None:
+                return False
+            # compared in the same form, ISO timestamps in the same format sort the same as the times
+            form = 0 if isinstance(time, str) else 1
+            if self.since is not None and time < self.since[form]:
+                return False
+            if self.until is not None and time >= self.until[form]:
+                return False
+        return True
+
+
+def _is_plain_json_str(value: str) -> bool:
+    """
+    Whether value appears as is inside a JSON string, whichever backend encoded it,
+    the backends escape other characters differently
+    """
+    return value.isascii() and json.dumps(value)[1:-1] == value
+
+
+def _get_level_names() -> Dict[int, str]:
+    # includes custom levels named with logging.addLevelName
+    names = {level: logging.getLevelName(level) for level in range(logging.NOTSET, logging.CRITICAL + 1, 10)}
+    names.update(getattr(logging, '_levelToName', {}))
+    return names
+
+
+def _filter_lines(lines, query: Optional[LogQuery], raw: bool) -> Iterator[Union[bytes, Dict]]:
+    for line in lines:
+        line = line.rstrip(b'\r\n')
+        if not line or query is not None and not query.could_match(line):
+            continue
+        try:
+            record = _loads(line)
+        except ValueError:
+            # not a record, e.g. something else printed to the same stream
+            continue
+        if not isinstance(record, dict) or query is not None and not query.matches(record):
+            continue
+        yield line if raw else record
+
+
+def _open(filename: str):
+    with open(filename, 'rb') as f:
+        is_gzip = f.read(2) == b'\x1f\x8b'
+    return gzip.open(filename, 'rb') if is_gzip else open(filename, 'rb')
+
+
+def _iter_chunk_lines(f, start: int, end: int) -> Iterator[bytes]:
+    """
+    The lines which start in [start, end) of the file
+    """
+    position = start
+    if start:
+        # the line which starts right at the chunk's start is ours, anything before it belongs to the previous chunk
+        f.seek(start - 1)
+        position += len(f.readline()) - 1
+    while position < end:
+        line = f.readline()
+        if not line:
+            break
+        position += len(line)
+        yield line
+
+
+def _scan_chunk(args: tuple) -> List[Union[bytes, Dict]]:
+    filename, start, end, query, raw = args
+    with open(filename, 'rb') as f:
+        return list(_filter_lines(_iter_chunk_lines(f, start, end), query, raw))
+
+
+def _iter_parallel(
+        filename: str, query: Optional[LogQuery], raw: bool, processes: int, chunk_size: int
+) -> Iterator[Union[bytes, Dict]]:
+    size = os.path.getsize(filename)
+    chunks = [(filename, start, min(start + chunk_size, size), query, raw) for start in range(0, size, chunk_size)]
+    with multiprocessing.Pool(processes) as pool:
+        # only a chunk per process is in flight, so memory use is bounded by the chunk size rather than the file's
+        pending = []
+        next_chunk = 0
+        while pending or next_chunk < len(chunks):
+            while next_chunk < len(chunks) and len(pending) < processes:
+                pending.append(pool.apply_async(_scan_chunk, (chunks[next_chunk],)))
+                next_chunk += 1
+            yield from pending.pop(0).get()
+
+
+def iter_records(
+        filename: str,
+        query: LogQuery = None,
+        processes: int = 1,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        raw: bool = False,
+) -> Iterator[Union[bytes, Dict]]:
+    """
+    The records in a file of JSON lines written by advanced_logger (which may be gzipped) which match query,
+    in file order. Lines which aren't JSON objects are skipped
+    :param processes: scan a plain file with this many processes, in chunks of chunk_size bytes,
+        0 for one per CPU. A gzipped file is always read by this process
+    :param raw: yield the lines (bytes, without the newline) rather than the decoded records
+    """
+    if processes == 0:
+        processes = os.cpu_count() or 1
+    f = _open(filename)
+    if processes > 1 and not isinstance(f, gzip.GzipFile) and os.path.getsize(filename) > chunk_size:
+        f.close()
+        yield from _iter_parallel(filename, query, raw, processes, chunk_size)
+        return
+    with f:
+        yield from _filter_lines(f, query, raw)
+
+
+def _format_traceback_lines(formatted_tb: List[Any], out: List[str]):
+    for item in formatted_tb:
+        if isinstance(item, str):
+            if item.endswith('exception:') or item.endswith('another exception occurred:'):
+                # chained exceptions are surrounded by blank lines, like the traceback module does
+                out.extend(('', item, ''))
+            else:
+                out.append(item)
+        elif item and isinstance(item[0], list):
+            # a frame, [[File "path, line N, function name], code line]
+            location = item[0]
+            if len(location) == 3:
+                out.append('{}", {}, in {}'.format(*location))
+            else:
+                out.append(', '.join(str(part) for part in location))
+            out.extend(str(code_line) for code_line in item[1:])
+        else:
+            # an exception which was raised while handling the previous one
+            _format_traceback_lines(item, out)
+
+
+def format_traceback(formatted_tb: Union[List[Any], str]) -> str:
+    """
+    Turns the "traceback" of a record logged with logger.exception() back into the text the traceback module prints.
+    Paths have their separators replaced by '.' in the records, so they're printed that way
+    """
+    if isinstance(formatted_tb, str):
+        return formatted_tb
+    out = []  # type: List[str]
+    _format_traceback_lines(formatted_tb, out)
+    return '\n'.join(out)
+
+
+def _format_record(record: Dict) -> str:
+    meta = record.get('meta') if isinstance(record.get('meta'), dict) else {}
+    if 'traceback' not in record:
+        return json.dumps(record)
+    header = ' '.join(str(part) for part in (meta.get('time'), meta.get('level', 'ERROR'), meta.get('name')) if part)
+    text = '{} {}'.format(header, record.get('msg')) if header else str(record.get('msg'))
+    if record.get('count'):
+        text += ' (seen {} times, {} to {})'.format(record['count'], record.get('first_seen'), record.get('last_seen'))
+    return text + '\n' + format_traceback(record['traceback'])
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='advanced-logger-query', description='filter the JSON lines written by advanced_logger',
+    )
+    parser.add_argument('files', nargs='+', help='log files, which may be gzipped')
+    parser.add_argument('--level', help='only records at this level or above, e.g. ERROR')
+    parser.add_argument('--name', help='only records from loggers whose name starts with this')
+    parser.add_argument(
+        '--since', help='only records at this time or later, ISO 8601 (UTC without an offset) or epoch seconds',
+    )
+    parser.add_argument('--until', help='only records before this time')
+    parser.add_argument(
+        '--tracebacks', action='store_true', help='print exception records as readable tracebacks rather than JSON',
+    )
+    parser.add_argument('--count', action='store_true', help='only print the number of matching records')
+    parser.add_argument(
+        '--processes', type=int, default=1, help='scan large plain files with this many processes, 0 for one per CPU',
+    )
+    parser.add_argument(
+        '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // (1024 * 1024),
+        help='MiB scanned by each process at a time',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    try:
+        query = LogQuery(min_level=args.level, name_prefix=args.name, since=args.since, until=args.until)
+    except ValueError as e:
+        print('error: {}'.format(e), file=sys.stderr)
+        return 2
+
+    out = sys.stdout.buffer
+    count = 0
+    try:
+        for filename in args.files:
+            records = iter_records(
+                filename, query, processes=args.processes, chunk_size=args.chunk_size * 1024 * 1024,
+                raw=not args.tracebacks,
+            )
+            for record in records:
+                count += 1
+                if args.count:
+                    continue
+                if args.tracebacks:
+                    out.write(_format_record(record).encode('utf-8') + b'\n')
+                else:
+                    out.write(record + b'\n')
+        if args.count:
+            out.write('{}\n'.format(count).encode())
+        out.flush()
+    except BrokenPipeError:
+        # e.g. piped into head, stop quietly
+        sys.stderr.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
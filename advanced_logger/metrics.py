@@ -0,0 +1,117 @@
+"""
+Counters and histograms of the logging pipeline itself, to see how much logging costs a service:
+records emitted per level, records dropped by sampling, rate limiting, the loggers' filters or a full writer queue,
+how long encoding records and formatting tracebacks takes, records whose msg had to fall back to str()
+and how much was written.
+They're kept without locks, every update is an attribute increment or a list index, so with several threads
+logging they may undercount slightly.
+"""
+import logging
+import time
+from typing import Callable, Dict, List
+
+__author__ = 'neil@everymundo.com'
+
+# enough for any duration in nanoseconds which fits in 64 bits
+_BUCKETS = 65
+
+
+class Histogram(object):
+    """
+    Counts values (nanoseconds) in power of two buckets, bucket i has the values with i bits, i.e. [2**(i-1), 2**i).
+    Recording a value is a single increment, the count and percentiles are worked out from the buckets
+    when they're read. The percentiles and max are the upper bound of their bucket, so they're within a factor of 2
+    """
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS  # type: List[int]
+        self.total = 0
+
+    def record(self, value: int):
+        self.counts[value.bit_length()] += 1
+        self.total += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, percentile: float) -> int:
+        counts = list(self.counts)
+        rank = sum(counts) * percentile / 100
+        seen = 0
+        for bucket, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if bucket_count and seen >= rank:
+                return (1 << bucket) - 1
+        return 0
+
+    def snapshot(self) -> Dict:
+        count = self.count
+        return {
+            'count': count,
+            'total_ns': self.total,
+            'mean_ns': self.total // count if count else 0,
+            'p50_ns': self.percentile(50),
+            'p99_ns': self.percentile(99),
+            'max_ns': self.percentile(100),
+        }
+
+
+class PipelineMetrics(object):
+    """
+    bytes_written counts the characters of the records which were serialized, which is the number of bytes written
+    for ASCII records (multi-byte characters are counted once), records dropped before they're formatted
+    (e.g. by a handler's level) are never serialized so they're not counted
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self.reset()
+
+    def reset(self):
+        # level number -> records, a plain dict is faster to increment than a Counter,
+        # records at custom levels add their level when it's missing
+        self.emitted = dict.fromkeys(
+            (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL), 0
+        )  # type: Dict[int, int]
+        self.dropped_sampled = 0
+        self.dropped_rate_limited = 0
+        self.dropped_filtered = 0
+        self.dropped_queue_overflow = 0
+        self.encode_fallbacks = 0
+        self.bytes_written = 0
+        self.encode_time = Histogram()
+        self.traceback_time = Histogram()
+        self.started = self._clock()
+        self.next_report = None
+
+    def is_report_due(self, interval: float) -> bool:
+        """
+        True once every interval seconds, the first time is one interval after it's first asked
+        """
+        now = self._clock()
+        if self.next_report is None:
+            self.next_report = now + interval
+        elif now >= self.next_report:
+            self.next_report = now + interval
+            return True
+        return False
+
+    def snapshot(self) -> Dict:
+        return {
+            'uptime_seconds': round(self._clock() - self.started, 3),
+            'emitted': {
+                logging.getLevelName(level): count for level, count in sorted(self.emitted.items()) if count
+            },
+            'dropped': {
+                'sampled': self.dropped_sampled,
+                'rate_limited': self.dropped_rate_limited,
+                'filtered': self.dropped_filtered,
+                'queue_overflow': self.dropped_queue_overflow,
+            },
+            'encode_fallbacks': self.encode_fallbacks,
+            'bytes_written': self.bytes_written,
+            'encode_time': self.encode_time.snapshot(),
+            'traceback_time': self.traceback_time.snapshot(),
+        }
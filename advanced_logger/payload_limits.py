@@ -0,0 +1,182 @@
+"""
+Limits on the size of what's logged as a record's msg, so logging a huge dict or list by mistake doesn't block the
+thread encoding it, use a lot of memory for the JSON, or break line size limits further down the pipeline.
+
+The msg is bounded before it's encoded, by walking it and stopping at the limits, so the parts which are cut
+are never visited (apart from counting them):
+  * max_depth: containers nested deeper than this are replaced by a summary string, e.g. '<dict of 12 items>'
+  * max_items: containers keep their first max_items items, and a marker of how many more there were
+  * max_string_length: longer strings are cut, with a marker of how many more characters there were
+  * max_bytes: the size of the whole record, the walk keeps an estimate of the encoded size and stops adding items
+    once it's reached, and if the encoded msg is still too large (e.g. a type encoder made a large value)
+    it's replaced by a cut string of its JSON
+Only strs, dicts, lists and tuples are walked (including subclasses of str, dict and list, which become a plain str,
+dict or list when they're cut), other objects are passed to the encoder as they are.
+When the msg can't be encoded, the fallback to str(msg) bounds it the same way before formatting it.
+Records which were cut have "truncated": true in their meta.
+"""
+from typing import Any, Callable, Optional, Tuple
+
+__author__ = 'neil@everymundo.com'
+
+# the estimated encoded size of values the walk doesn't look into
+_OTHER_SIZE = 16
+_ELLIPSIS = '...'
+# containers nested deeper than this are summarized even without max_depth, which also stops at circular references
+_MAX_WALK_DEPTH = 100
+
+
+def _more_marker(count: int, what: str) -> str:
+    return '...<{} more {}>'.format(count, what)
+
+
+def _get_max_string_length(value: str, max_string_length: Optional[int], budget: Optional[int]) -> Optional[int]:
+    if budget is not None and (max_string_length is None or budget < max_string_length):
+        # the quotes, and at least the start of the string and its marker
+        return max(budget - 2, len(_more_marker(len(value), 'characters')))
+    return max_string_length
+
+
+def _cut_string(value: str, max_length: int) -> str:
+    return value[:max_length] + _more_marker(len(value) - max_length, 'characters')
+
+
+class _BoundingWalk(object):
+    __slots__ = ('limits', 'remaining', 'truncated')
+
+    def __init__(self, limits: 'PayloadLimits', budget: int = None):
+        self.limits = limits
+        # the estimated number of characters left, None without max_bytes
+        self.remaining = budget
+        self.truncated = False
+
+    def walk(self, obj, depth: int):
+        obj_type = type(obj)
+        if obj_type is str or isinstance(obj, str):
+            return self._walk_str(obj)
+        if obj_type is dict or obj_type is list or obj_type is tuple or isinstance(obj, (dict, list)):
+            max_depth = self.limits.max_depth
+            if depth >= (max_depth if max_depth is not None else _MAX_WALK_DEPTH):
+                self.truncated = True
+                summary = '<{} of {} items>'.format(obj_type.__name__, len(obj))
+                if self.remaining is not None:
+                    self.remaining -= len(summary) + 2
+                return summary
+            if isinstance(obj, dict):
+                return self._walk_dict(obj, depth)
+            return self._walk_sequence(obj, depth)
+        if self.remaining is not None:
+            self.remaining -= len(str(obj)) if obj_type is int or obj_type is float else _OTHER_SIZE
+        return obj
+
+    def _walk_str(self, value: str) -> str:
+        max_length = _get_max_string_length(value, self.limits.max_string_length, self.remaining)
+        if max_length is not None and len(value) > max_length:
+            self.truncated = True
+            value = _cut_string(value, max_length)
+        if self.remaining is not None:
+            self.remaining -= len(value) + 2
+        return value
+
+    def _is_full(self, items: int) -> bool:
+        max_items = self.limits.max_items
+        return max_items is not None and items >= max_items or self.remaining is not None and self.remaining <= 0
+
+    def _walk_dict(self, obj: dict, depth: int) -> dict:
+        bounded = {}
+        changed = False
+        for key, value in obj.items():
+            if self._is_full(len(bounded)):
+                self.truncated = changed = True
+                bounded[_ELLIPSIS] = _more_marker(len(obj) - len(bounded), 'items')
+                break
+            if self.remaining is not None:
+                # the key, quotes, colon, comma and spaces
+                self.remaining -= len(key) + 6 if type(key) is str else _OTHER_SIZE
+            bounded_value = self.walk(value, depth + 1)
+            changed = changed or bounded_value is not value
+            bounded[key] = bounded_value
+        return bounded if changed else obj
+
+    def _walk_sequence(self, obj, depth: int):
+        bounded = []
+        changed = False
+        for value in obj:
+            if self._is_full(len(bounded)):
+                self.truncated = changed = True
+                bounded.append(_more_marker(len(obj) - len(bounded), 'items'))
+                break
+            if self.remaining is not None:
+                self.remaining -= 2
+            bounded_value = self.walk(value, depth + 1)
+            changed = changed or bounded_value is not value
+            bounded.append(bounded_value)
+        return bounded if changed else obj
+
+
+class PayloadLimits(object):
+    """
+    Every limit is optional, see the module docstring. Use with initialize_logger_settings(payload_limits=...)
+    """
+
+    def __init__(
+            self,
+            max_depth: int = None,
+            max_items: int = None,
+            max_string_length: int = None,
+            max_bytes: int = None,
+    ):
+        for name, value in (
+                ('max_depth', max_depth), ('max_items', max_items),
+                ('max_string_length', max_string_length), ('max_bytes', max_bytes),
+        ):
+            if value is not None and value < 1:
+                raise ValueError("{} must be at least 1".format(name))
+        self.max_depth = max_depth
+        self.max_items = max_items
+        self.max_string_length = max_string_length
+        self.max_bytes = max_bytes
+
+    def bound(self, obj, budget: int = None) -> Tuple[Any, bool]:
+        """
+        :param budget: the characters available for obj's JSON, defaults to max_bytes
+        :return: obj within the limits (obj itself if it already was), and whether anything was cut
+        """
+        if budget is None:
+            budget = self.max_bytes
+        walk = _BoundingWalk(self, budget)
+        bounded = walk.walk(obj, 0)
+        return bounded, walk.truncated
+
+    def bound_string(self, value: str, budget: int = None) -> Tuple[str, bool]:
+        """
+        :param budget: the characters available for value's JSON, defaults to max_bytes
+        :return: value cut to max_string_length and the budget, and whether it was cut
+        """
+        if budget is None:
+            budget = self.max_bytes
+        max_length = _get_max_string_length(value, self.max_string_length, budget)
+        if max_length is not None and len(value) > max_length:
+            return _cut_string(value, max_length), True
+        return value, False
+
+    def bound_str(self, obj, budget: int = None) -> Tuple[str, bool]:
+        """
+        The replacement for str(obj) when obj can't be encoded. Containers are bounded first, so only the parts
+        within the limits are formatted, and the string is then cut with bound_string
+        """
+        bounded, truncated = self.bound(obj, budget)
+        text, text_truncated = self.bound_string(str(bounded), budget)
+        return text, truncated or text_truncated
+
+    def fit_json(self, json_str: str, budget: int, encode_fn: Callable[[str], str]) -> str:
+        """
+        :return: the JSON of a str with the start of json_str, which is at most budget characters long
+        """
+        length = max(budget - 2 - len(_ELLIPSIS), 0)
+        while True:
+            fitted = encode_fn(json_str[:length] + _ELLIPSIS)
+            if len(fitted) <= budget or not length:
+                return fitted
+            # escaped characters take more than one character, try again with a proportionally shorter start
+            length = max(min(length - 1, length * budget // len(fitted)), 0)
@@ -0,0 +1,112 @@
+"""
+Token bucket rate limiting, to stop a log storm (e.g. logger.exception(e) in a tight loop during an incident)
+from saturating the logging pipeline.
+Records are limited per key, which is the logger name plus the call site (the file and line of the logging call),
+or the exception type for logger.exception().
+Suppressed records aren't silently lost, they're counted and reported in a summary record for their key,
+which is logged when the key is next allowed through, or at the latest every summary_interval seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Tuple
+
+__author__ = 'neil@everymundo.com'
+
+# (key, number of suppressed records, highest level among them)
+SuppressedSummary = Tuple[Hashable, int, int]
+
+
+class _Bucket(object):
+    __slots__ = ('tokens', 'updated', 'suppressed', 'suppressed_level')
+
+    def __init__(self, tokens: float, updated: float):
+        self.tokens = tokens
+        self.updated = updated
+        self.suppressed = 0
+        self.suppressed_level = 0
+
+
+class RateLimiter(object):
+    """
+    Allows a burst of up to burst records per key, refilled at rate records per second.
+    At most max_keys keys are tracked, the least recently used key is evicted when a new one comes in
+    (and its summary reported, if it has one)
+    """
+
+    def __init__(
+            self,
+            rate: float = 10,
+            burst: int = None,
+            summary_interval: float = 10,
+            max_keys: int = 10000,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if max_keys < 1:
+            raise ValueError("max_keys must be at least 1")
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self.summary_interval = summary_interval
+        self.max_keys = max_keys
+        self.suppressed_count = 0
+        self._clock = clock
+        self._buckets = OrderedDict()  # type: OrderedDict[Hashable, _Bucket]
+        self._lock = threading.Lock()
+        self._next_sweep = clock() + summary_interval
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def check(self, key: Hashable, level: int = 0) -> Tuple[bool, List[SuppressedSummary]]:
+        """
+        Takes a token for key if one is available.
+        :return: whether the record is allowed, and any summaries which are due to be logged
+        """
+        summaries = []  # type: List[SuppressedSummary]
+        with self._lock:
+            now = self._clock()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(self.burst, now)
+                if len(self._buckets) > self.max_keys:
+                    evicted_key, evicted = self._buckets.popitem(last=False)
+                    if evicted.suppressed:
+                        summaries.append((evicted_key, evicted.suppressed, evicted.suppressed_level))
+            else:
+                self._buckets.move_to_end(key)
+                bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+                bucket.updated = now
+
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                allowed = True
+                if bucket.suppressed:
+                    summaries.append((key, bucket.suppressed, bucket.suppressed_level))
+                    bucket.suppressed = bucket.suppressed_level = 0
+            else:
+                allowed = False
+                bucket.suppressed += 1
+                bucket.suppressed_level = max(bucket.suppressed_level, level)
+                self.suppressed_count += 1
+
+            if now >= self._next_sweep:
+                self._next_sweep = now + self.summary_interval
+                summaries += self._take_summaries()
+        return allowed, summaries
+
+    def _take_summaries(self) -> List[SuppressedSummary]:
+        summaries = []
+        for key, bucket in self._buckets.items():
+            if bucket.suppressed:
+                summaries.append((key, bucket.suppressed, bucket.suppressed_level))
+                bucket.suppressed = bucket.suppressed_level = 0
+        return summaries
+
+    def take_summaries(self) -> List[SuppressedSummary]:
+        """
+        Returns and resets the summaries of every key with suppressed records, e.g. to report them before exiting
+        """
+        with self._lock:
+            return self._take_summaries()
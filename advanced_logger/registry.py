@@ -0,0 +1,246 @@
+"""
+The registry of loggers made by register_logger. Looking a logger up by name is a dict lookup, and loggers under
+a prefix (e.g. everything under 'tenant.' in the logger hierarchy) are found with a binary search of the sorted names,
+so neither goes through every registered logger.
+
+For services which make loggers with dynamic names (e.g. one per job), the registry can release loggers instead of
+holding them forever, with one of the modes:
+  * 'strong': loggers are kept until they're deregistered, the default
+  * 'weak': loggers are only referenced weakly, so they're released once nothing else uses them
+  * 'lru': at most max_loggers are kept, and/or loggers not looked up for idle_timeout seconds are released,
+    the least recently registered/looked up first
+Released loggers aren't disabled, whatever still holds one can keep logging with it,
+but registering the same name again makes a new logger.
+"""
+import time
+import weakref
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional
+
+__author__ = 'neil@everymundo.com'
+
+REGISTRY_MODES = ('strong', 'weak', 'lru')
+
+
+class RegistryStats(NamedTuple):
+    mode: str
+    # loggers currently registered
+    live: int
+    # released by the lru mode's max_loggers
+    evicted: int
+    # released by the lru mode's idle_timeout
+    expired: int
+    # released by the garbage collector in the weak mode
+    collected: int
+    # loggers in the stdlib logging manager, which includes loggers not made by register_logger
+    manager_loggers: Optional[int] = None
+
+
+class _StrongRef(object):
+    """
+    Has the same interface as a weakref.ref, so every mode stores its loggers the same way
+    """
+    __slots__ = ('_obj',)
+
+    def __init__(self, obj):
+        self._obj = obj
+
+    def __call__(self):
+        return self._obj
+
+
+def _make_collected_callback(collected: deque, name: str) -> Callable:
+    # doesn't reference the registry, so the weakref callbacks don't keep it alive
+    def on_collected(ref):
+        collected.append((name, ref))
+
+    return on_collected
+
+
+class LoggerRegistry(object):
+    """
+    The registered loggers, keyed by name. It can be used like a set of loggers (len, iteration, in, add, remove).
+    The sorted names are only built on the first prefix query, and kept up to date after that.
+    on_release is called with each logger released by the 'lru' mode, loggers released in the 'weak' mode have
+    already been collected so it's not called for them.
+    Not thread safe on its own, advanced_logger makes its changes under the registry lock
+    """
+
+    def __init__(
+            self,
+            mode: str = 'strong',
+            max_loggers: int = None,
+            idle_timeout: float = None,
+            on_release: Callable = None,
+            clock: Callable[[], float] = time.monotonic,
+    ):
+        self._loggers = OrderedDict()  # type: OrderedDict[str, Callable]
+        self._sorted_names = None  # type: Optional[List[str]]
+        # lru mode, when each logger was last registered or looked up
+        self._last_used = {}  # type: Dict[str, float]
+        # weak mode, (name, ref) of collected loggers, appended to by the weakref callbacks
+        # and removed from the registry the next time it's used
+        self._collected = deque()
+        self._on_release = on_release
+        self._clock = clock
+        self.evicted_count = 0
+        self.expired_count = 0
+        self.collected_count = 0
+        self.mode = 'strong'
+        self.max_loggers = None  # type: Optional[int]
+        self.idle_timeout = None  # type: Optional[float]
+        self.configure(mode, max_loggers, idle_timeout)
+
+    def configure(self, mode: str = 'strong', max_loggers: int = None, idle_timeout: float = None):
+        """
+        Changes the mode, keeping every logger which is currently registered (apart from the ones over max_loggers)
+        """
+        if mode not in REGISTRY_MODES:
+            raise ValueError("registry mode must be one of {}".format(REGISTRY_MODES))
+        if mode != 'lru' and (max_loggers is not None or idle_timeout is not None):
+            raise ValueError("max_loggers and idle_timeout are only for the 'lru' registry mode")
+        if max_loggers is not None and max_loggers < 1:
+            raise ValueError("max_loggers must be at least 1")
+        if idle_timeout is not None and idle_timeout <= 0:
+            raise ValueError("idle_timeout must be positive")
+
+        loggers = list(self)
+        self.mode = mode
+        self.max_loggers = max_loggers
+        self.idle_timeout = idle_timeout
+        self._loggers.clear()
+        self._last_used.clear()
+        self._collected.clear()
+        self._sorted_names = None
+        now = self._clock()
+        for logger in loggers:
+            self._loggers[logger.name] = self._make_ref(logger)
+            if mode == 'lru':
+                self._last_used[logger.name] = now
+        self._release_over_limits()
+
+    def _make_ref(self, logger) -> Callable:
+        if self.mode == 'weak':
+            return weakref.ref(logger, _make_collected_callback(self._collected, logger.name))
+        return _StrongRef(logger)
+
+    def _remove_name(self, name: str):
+        del self._loggers[name]
+        self._last_used.pop(name, None)
+        if self._sorted_names is not None:
+            del self._sorted_names[bisect_left(self._sorted_names, name)]
+
+    def _remove_collected(self):
+        while self._collected:
+            name, ref = self._collected.popleft()
+            # the name may have been registered again since
+            if self._loggers.get(name) is ref:
+                self._remove_name(name)
+                self.collected_count += 1
+
+    def _release_over_limits(self):
+        if self.mode != 'lru':
+            return
+        # the least recently used loggers come first
+        if self.idle_timeout is not None:
+            oldest_allowed = self._clock() - self.idle_timeout
+            while self._loggers:
+                name = next(iter(self._loggers))
+                if self._last_used[name] > oldest_allowed:
+                    break
+                self._release(name)
+                self.expired_count += 1
+        if self.max_loggers is not None:
+            while len(self._loggers) > self.max_loggers:
+                self._release(next(iter(self._loggers)))
+                self.evicted_count += 1
+
+    def _release(self, name: str):
+        logger = self._loggers[name]()
+        self._remove_name(name)
+        if self._on_release is not None:
+            self._on_release(logger)
+
+    def _touch(self, name: str):
+        self._loggers.move_to_end(name)
+        self._last_used[name] = self._clock()
+
+    def expire(self):
+        """
+        Releases idle loggers now, rather than waiting for the next time the registry is used
+        """
+        self._remove_collected()
+        self._release_over_limits()
+
+    def __len__(self) -> int:
+        self._remove_collected()
+        return len(self._loggers)
+
+    def __iter__(self) -> Iterator['AdvancedLogger']:
+        # a snapshot, so loggers can be registered or removed while iterating
+        loggers = [ref() for ref in self._loggers.values()]
+        return iter([logger for logger in loggers if logger is not None])
+
+    def __contains__(self, logger) -> bool:
+        ref = self._loggers.get(getattr(logger, 'name', None))
+        return ref is not None and ref() is logger
+
+    def get(self, name: str) -> Optional['AdvancedLogger']:
+        """
+        In the 'lru' mode, this counts as using the logger
+        """
+        self.expire()
+        ref = self._loggers.get(name)
+        if ref is None:
+            return None
+        if self.mode == 'lru':
+            self._touch(name)
+        return ref()
+
+    def add(self, logger: 'AdvancedLogger'):
+        self._remove_collected()
+        if logger.name not in self._loggers and self._sorted_names is not None:
+            insort(self._sorted_names, logger.name)
+        self._loggers[logger.name] = self._make_ref(logger)
+        if self.mode == 'lru':
+            self._touch(logger.name)
+        self._release_over_limits()
+
+    def remove(self, logger: 'AdvancedLogger'):
+        self._remove_collected()
+        if logger not in self:
+            raise KeyError(logger)
+        self._remove_name(logger.name)
+
+    def discard(self, logger: 'AdvancedLogger'):
+        if logger in self:
+            self.remove(logger)
+
+    def clear(self):
+        self._loggers.clear()
+        self._last_used.clear()
+        self._collected.clear()
+        self._sorted_names = None
+
+    def names_with_prefix(self, prefix: str) -> List[str]:
+        """
+        e.g. names_with_prefix('tenant.') for every logger under tenant in the logger hierarchy
+        """
+        self._remove_collected()
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self._loggers)
+        names = []
+        for i in range(bisect_left(self._sorted_names, prefix), len(self._sorted_names)):
+            name = self._sorted_names[i]
+            if not name.startswith(prefix):
+                break
+            names.append(name)
+        return names
+
+    def with_prefix(self, prefix: str) -> List['AdvancedLogger']:
+        loggers = [self._loggers[name]() for name in self.names_with_prefix(prefix)]
+        return [logger for logger in loggers if logger is not None]
+
+    def stats(self) -> RegistryStats:
+        return RegistryStats(self.mode, len(self), self.evicted_count, self.expired_count, self.collected_count)
@@ -0,0 +1,131 @@
+"""
+Samplers decide whether a record is logged, for high frequency call sites which only need a fraction of their records.
+A sampler can be attached to a logger (register_logger(..., sampler=...)),
+or passed per call (logger.info(..., sampler=...)).
+The legacy likelihood/out_of kwargs use a RandomSampler, which is built once per ratio.
+"""
+import itertools
+import os
+import random
+import threading
+import zlib
+from functools import lru_cache
+
+__author__ = 'neil@everymundo.com'
+
+# bumped in the child after a fork, so forked processes don't make the same random choices as their parent
+_FORK_GENERATION = 0
+
+
+def _after_fork_in_child():
+    global _FORK_GENERATION
+    _FORK_GENERATION += 1
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class Sampler(object):
+    """
+    Keeps likelihood out of every out_of records. kept_count and dropped_count say how many records it has decided on,
+    they're not locked, so with several threads logging they may undercount slightly
+    """
+
+    def __init__(self, likelihood: int = 1, out_of: int = 1000):
+        if out_of < 1:
+            raise ValueError("out_of must be at least 1")
+        if likelihood < 0:
+            raise ValueError("likelihood can't be negative")
+        self.likelihood = likelihood
+        self.out_of = out_of
+        self.kept_count = 0
+        self.dropped_count = 0
+
+    @property
+    def ratio(self) -> float:
+        return min(self.likelihood / self.out_of, 1.0)
+
+    def should_log(self, trace_id=None) -> bool:
+        if self._sample(trace_id):
+            self.kept_count += 1
+            return True
+        self.dropped_count += 1
+        return False
+
+    def _sample(self, trace_id) -> bool:
+        raise NotImplementedError()
+
+    def reset_counts(self):
+        self.kept_count = 0
+        self.dropped_count = 0
+
+    def __repr__(self) -> str:
+        return '<{} {}/{} kept={} dropped={}>'.format(
+            self.__class__.__name__, self.likelihood, self.out_of, self.kept_count, self.dropped_count
+        )
+
+
+class RandomSampler(Sampler):
+    """
+    Keeps each record independently with a probability of likelihood/out_of.
+    Each thread draws from its own generator, so threads don't share (and contend on) the global random state
+    """
+
+    def __init__(self, likelihood: int = 1, out_of: int = 1000):
+        super(RandomSampler, self).__init__(likelihood, out_of)
+        self._threshold = self.ratio
+        self._local = threading.local()
+
+    def _get_random_fn(self):
+        local = self._local
+        if getattr(local, 'generation', None) != _FORK_GENERATION:
+            local.random_fn = random.Random().random
+            local.generation = _FORK_GENERATION
+        return local.random_fn
+
+    def _sample(self, trace_id) -> bool:
+        return self._get_random_fn()() < self._threshold
+
+
+class EveryNthSampler(Sampler):
+    """
+    Deterministically keeps the first likelihood records of every out_of, e.g. EveryNthSampler(1, 100) keeps
+    records 0, 100, 200, ...
+    """
+
+    def __init__(self, likelihood: int = 1, out_of: int = 1000):
+        super(EveryNthSampler, self).__init__(likelihood, out_of)
+        # next() on a count is atomic, so threads can share it without a lock
+        self._counter = itertools.count()
+
+    def _sample(self, trace_id) -> bool:
+        return next(self._counter) % self.out_of < self.likelihood
+
+
+class HashSampler(Sampler):
+    """
+    Keeps or drops records based on a hash of their trace_id, so every record of a request (or of whatever the
+    trace_id identifies) is either kept or dropped together, in every process.
+    Records without a trace_id are sampled randomly
+    """
+
+    def __init__(self, likelihood: int = 1, out_of: int = 1000):
+        super(HashSampler, self).__init__(likelihood, out_of)
+        self._random_sampler = RandomSampler(likelihood, out_of)
+
+    def _sample(self, trace_id) -> bool:
+        if trace_id is None:
+            # noinspection PyProtectedMember
+            return self._random_sampler._sample(None)
+        if not isinstance(trace_id, bytes):
+            trace_id = str(trace_id).encode('utf-8')
+        return zlib.crc32(trace_id) % self.out_of < self.likelihood
+
+
+@lru_cache(maxsize=256)
+def get_ratio_sampler(likelihood: int = 1, out_of: int = 1000) -> RandomSampler:
+    """
+    The shared sampler used for the likelihood/out_of kwargs
+    """
+    return RandomSampler(likelihood, out_of)
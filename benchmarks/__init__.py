@@ -0,0 +1,3 @@
+"""
+Micro-benchmarks for advanced_logger, run a module directly, e.g. `python -m benchmarks.bench_json_encoder`
+"""
@@ -0,0 +1,70 @@
+"""
+Runs the benchmark suite, see benchmarks.suite
+
+    python -m benchmarks [--records N] [--scenario NAME ...] [--json-backend NAME] [--output results.json]
+                         [--compare previous.json [--max-regression 0.1]]
+
+With --compare, exits with 1 if a scenario's records/sec dropped by more than --max-regression
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.suite import SCENARIOS, run_suite, compare_results
+
+__author__ = 'neil@everymundo.com'
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='advanced_logger benchmark suite')
+    parser.add_argument('--records', type=int, default=20000, help='records logged per scenario and measurement')
+    parser.add_argument(
+        '--scenario', action='append', choices=[scenario.name for scenario in SCENARIOS],
+        help='only run this scenario, can be repeated',
+    )
+    parser.add_argument('--json-backend', default='stdlib')
+    parser.add_argument('--output', help="write the results as JSON to this file, '-' for stdout")
+    parser.add_argument('--compare', help='results JSON from a previous run to compare against')
+    parser.add_argument(
+        '--max-regression', type=float, default=None,
+        help='with --compare, fail if records/sec dropped by more than this fraction, e.g. 0.1',
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = _parse_args(argv)
+    suite_results = run_suite(records=args.records, names=args.scenario, json_backend=args.json_backend)
+
+    # the table goes to stderr when the JSON goes to stdout
+    out = sys.stderr if args.output == '-' else sys.stdout
+    print('python {} ({}), json_backend={}'.format(
+        suite_results['python'], suite_results['implementation'], suite_results['json_backend']
+    ), file=out)
+    for name, result in suite_results['results'].items():
+        print('{:>18}: {:>12,} records/sec  p50 {:>8,} ns  p99 {:>8,} ns  ({})'.format(
+            name, result['records_per_sec'], result['p50_ns'], result['p99_ns'], result['description']
+        ), file=out)
+
+    if args.output == '-':
+        json.dump(suite_results, sys.stdout, indent=2)
+        print()
+    elif args.output:
+        with open(args.output, 'w') as f:
+            json.dump(suite_results, f, indent=2)
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            previous_results = json.load(f)
+        print('compared to {}:'.format(args.compare), file=out)
+        for name, ratio in compare_results(previous_results, suite_results).items():
+            regressed = args.max_regression is not None and ratio < 1 - args.max_regression
+            print('{:>18}: {:.2f}x records/sec{}'.format(name, ratio, '  REGRESSED' if regressed else ''), file=out)
+            if regressed:
+                exit_code = 1
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+Cost of a call at a level which isn't enabled, e.g. logger.debug() on an INFO logger,
+for a stdlib logging.Logger and an AdvancedLogger, before and after its level methods were swapped for no-ops
+"""
+import logging
+
+from advanced_logger import register_logger
+from benchmarks.common import time_per_call, print_comparison
+
+__author__ = 'neil@everymundo.com'
+
+
+def _original_debug(self, msg, *args, **kwargs):
+    """
+    AdvancedLogger.debug before the no-op swap, which checked the stdlib's isEnabledFor on every call
+    """
+    if logging.Logger.isEnabledFor(self, logging.DEBUG):
+        if self.debug_hook:
+            self.debug_hook(msg, *args, **kwargs)
+        return self.log(logging.DEBUG, msg, *args, **kwargs)
+
+
+def main():
+    stdlib_logger = logging.Logger('bench_disabled_levels_stdlib', level=logging.INFO)
+    advanced_logger = register_logger('bench_disabled_levels', level=logging.INFO)
+
+    stdlib = time_per_call(lambda: stdlib_logger.debug('suppressed %s', 1), number=200000)
+    # on a logger without the no-ops in its __dict__, as AdvancedLoggers were then. Only isEnabledFor runs,
+    # which is the same method on both classes
+    original_logger = logging.Logger('bench_disabled_levels_original', level=logging.INFO)
+    original = time_per_call(lambda: _original_debug(original_logger, 'suppressed %s', 1), number=200000)
+    swapped = time_per_call(lambda: advanced_logger.debug('suppressed %s', 1), number=200000)
+    print_comparison('stdlib logging.Logger vs AdvancedLogger', stdlib, swapped)
+    print_comparison('AdvancedLogger original debug vs no-ops', original, swapped)
+
+
+if __name__ == '__main__':
+    main()
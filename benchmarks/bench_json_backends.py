@@ -0,0 +1,53 @@
+"""
+Throughput of each installed JSON backend on typical log records
+"""
+import datetime
+import decimal
+import uuid
+
+from advanced_logger.json_encoder.json_backends import JSON_BACKENDS, available_json_backends, get_json_backend
+from benchmarks.common import time_per_call
+
+__author__ = 'neil@everymundo.com'
+
+
+def _log_obj(msg):
+    return {
+        'msg': msg,
+        'meta': {
+            'name': 'bench_logger',
+            'time': datetime.datetime.utcnow().isoformat(),
+            'level': 'INFO',
+        },
+    }
+
+
+_PAYLOADS = {
+    'small str msg': 'request finished',
+    'native dict msg': {'status': 200, 'path': '/foo/bar', 'durations': [1.5, 2.5, 3.5]},
+    'large native msg': {'rows': [{'id': i, 'name': 'row {}'.format(i), 'score': i / 3} for i in range(200)]},
+    'mixed types msg': {
+        'id': uuid.uuid4(),
+        'price': decimal.Decimal('10.25'),
+        'departures': [datetime.datetime.utcnow() + datetime.timedelta(hours=i) for i in range(10)],
+        'window': datetime.timedelta(minutes=5),
+    },
+}
+
+
+def main():
+    for name in JSON_BACKENDS:
+        if name not in available_json_backends():
+            print('{}: not installed'.format(name))
+            continue
+        backend = get_json_backend(name)
+        for title, payload in _PAYLOADS.items():
+            log_obj = _log_obj(payload)
+            ns_per_record = time_per_call(lambda: backend.dumps(log_obj), number=2000)
+            print('{:>8} {:>18}: {:>10,.0f} records/sec ({:,.0f} ns/record)'.format(
+                name, title, 1e9 / ns_per_record, ns_per_record
+            ))
+
+
+if __name__ == '__main__':
+    main()
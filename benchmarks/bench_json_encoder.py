@@ -0,0 +1,51 @@
+"""
+Per-record encoding cost of json.dumps(cls=AdvancedJSONEncoder) compared to a cached FastJSONEncoder
+"""
+import datetime
+import decimal
+import json
+import uuid
+
+from advanced_logger.json_encoder.advanced_json_encoder import AdvancedJSONEncoder
+from advanced_logger.json_encoder.fast_json_encoder import get_fast_encoder
+from benchmarks.common import time_per_call, print_comparison
+
+__author__ = 'neil@everymundo.com'
+
+
+def _log_obj(msg):
+    return {
+        'msg': msg,
+        'meta': {
+            'name': 'bench_logger',
+            'time': datetime.datetime.utcnow(),
+            'level': 'INFO',
+        },
+    }
+
+
+_PAYLOADS = {
+    'small str msg': 'request finished',
+    'native dict msg': {'status': 200, 'path': '/foo/bar', 'durations': [1.5, 2.5, 3.5]},
+    'mixed types msg': {
+        'id': uuid.uuid4(),
+        'price': decimal.Decimal('10.25'),
+        'departures': [datetime.datetime.utcnow() + datetime.timedelta(hours=i) for i in range(10)],
+        'dates': [datetime.date.today()] * 10,
+        'window': datetime.timedelta(minutes=5),
+    },
+}
+
+
+def main():
+    fast_encoder = get_fast_encoder()
+    for title, payload in _PAYLOADS.items():
+        log_obj = _log_obj(payload)
+        assert json.loads(json.dumps(log_obj, cls=AdvancedJSONEncoder)) == json.loads(fast_encoder.encode(log_obj))
+        before = time_per_call(lambda: json.dumps(cls=AdvancedJSONEncoder, obj=log_obj))
+        after = time_per_call(lambda: fast_encoder.encode(log_obj))
+        print_comparison(title, before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Per-record cost of encoding the whole record compared to splicing msg and time into the logger's cached envelope
+"""
+import logging
+
+from advanced_logger import register_logger, initialize_logger_settings
+from advanced_logger.advanced_logger import _encode_json, _serialize_record
+from benchmarks.common import time_per_call, print_comparison
+
+__author__ = 'neil@everymundo.com'
+
+_PAYLOADS = {
+    'small str msg': 'request finished',
+    'native dict msg': {'status': 200, 'path': '/foo/bar', 'durations': [1.5, 2.5, 3.5]},
+}
+
+_TIME = '2020-01-01T00:00:00.000000'
+_TIME_JSON = '"' + _TIME + '"'
+
+
+def main():
+    for json_backend in ('stdlib', 'orjson'):
+        try:
+            initialize_logger_settings(json_backend=json_backend)
+        except ImportError:
+            continue
+        bench_logger = register_logger('bench_logger')
+        for title, payload in _PAYLOADS.items():
+            def encode_whole_record():
+                return _encode_json({
+                    'msg': payload,
+                    'meta': {'name': bench_logger.name, 'time': _TIME, 'level': logging.getLevelName(logging.INFO)},
+                })
+
+            def splice_into_envelope():
+                envelope = bench_logger._get_envelope(logging.INFO)
+                return _serialize_record(bench_logger, envelope, payload, _TIME_JSON, None)
+
+            assert encode_whole_record() == splice_into_envelope()
+            before = time_per_call(encode_whole_record)
+            after = time_per_call(splice_into_envelope)
+            print_comparison('{} {}'.format(json_backend, title), before, after)
+    initialize_logger_settings(json_backend='stdlib')
+
+
+if __name__ == '__main__':
+    main()
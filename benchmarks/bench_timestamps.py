@@ -0,0 +1,30 @@
+"""
+Per-record cost of the record's timestamp, datetime.utcnow().isoformat() compared to the timestamp providers
+"""
+import warnings
+from datetime import datetime
+
+from advanced_logger.timestamps import get_timestamp_provider
+from benchmarks.common import time_per_call, print_comparison
+
+__author__ = 'neil@everymundo.com'
+
+
+def _utcnow_isoformat() -> str:
+    # the previous path, which encoded the result as a JSON string
+    return '"' + datetime.utcnow().isoformat() + '"'
+
+
+def main():
+    with warnings.catch_warnings():
+        # utcnow is deprecated in newer pythons
+        warnings.simplefilter('ignore', DeprecationWarning)
+        before = time_per_call(_utcnow_isoformat, number=100000)
+    for name in ('iso', 'epoch_ns'):
+        provider = get_timestamp_provider(name)
+        after = time_per_call(provider.now_json, number=100000)
+        print_comparison(name, before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import timeit
+from typing import Callable
+
+__author__ = 'neil@everymundo.com'
+
+
+def time_per_call(fn: Callable, number: int = 10000, repeat: int = 5) -> float:
+    """
+    Returns the best observed time per call of fn in nanoseconds
+    """
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9
+
+
+def print_comparison(title: str, before_ns: float, after_ns: float):
+    print('{}: before {:,.0f} ns/record, after {:,.0f} ns/record ({:.2f}x)'.format(
+        title, before_ns, after_ns, before_ns / after_ns
+    ))
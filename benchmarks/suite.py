@@ -0,0 +1,197 @@
+"""
+The benchmark suite for the logging hot paths, run with `python -m benchmarks`.
+Each scenario is measured twice: once in a tight loop for records/sec, and once timing every call for the p50/p99
+latencies (which include the ~50ns it takes to read the clock).
+"""
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, TextIO
+
+from advanced_logger import register_logger, initialize_logger_settings, basic_config
+from benchmarks.common import time_per_call
+
+__author__ = 'neil@everymundo.com'
+
+SMALL_PAYLOAD = 'request finished'
+LARGE_PAYLOAD = {'rows': [{'id': i, 'name': 'row {}'.format(i), 'score': i / 3} for i in range(200)]}
+
+
+class Scenario(NamedTuple):
+    name: str
+    description: str
+    # sets the scenario up and returns the call to measure, its arguments are the logger and a temp directory
+    setup: Callable[[logging.Logger, str], Callable[[], object]]
+    output_settings: Optional[Dict] = None
+
+
+def _raise_deep(depth: int):
+    if depth:
+        _raise_deep(depth - 1)
+    raise ValueError('deep')
+
+
+def _make_deep_exception() -> Exception:
+    try:
+        _raise_deep(50)
+    except ValueError as e:
+        return e
+
+
+def _make_chained_exception() -> Exception:
+    try:
+        try:
+            try:
+                raise KeyError('first')
+            except KeyError as e:
+                raise ValueError('second') from e
+        except ValueError:
+            raise RuntimeError('third')
+    except RuntimeError as e:
+        return e
+
+
+def _info(payload) -> Callable[[logging.Logger, str], Callable[[], object]]:
+    def setup(lgr: logging.Logger, tmp_dir: str) -> Callable[[], object]:
+        return lambda: lgr.info(payload)
+
+    return setup
+
+
+def _suppressed_debug(lgr: logging.Logger, tmp_dir: str) -> Callable[[], object]:
+    lgr.setLevel(logging.INFO)
+    return lambda: lgr.debug(SMALL_PAYLOAD)
+
+
+def _sampled_info(lgr: logging.Logger, tmp_dir: str) -> Callable[[], object]:
+    return lambda: lgr.info(SMALL_PAYLOAD, likelihood=1, out_of=100)
+
+
+def _exception(make_exception: Callable[[], Exception]) -> Callable[[logging.Logger, str], Callable[[], object]]:
+    def setup(lgr: logging.Logger, tmp_dir: str) -> Callable[[], object]:
+        e = make_exception()
+        return lambda: lgr.exception(e, msg='failed')
+
+    return setup
+
+
+SCENARIOS = [
+    Scenario('info_small', 'info() with a short str msg', _info(SMALL_PAYLOAD)),
+    Scenario('info_large', 'info() with a dict of 200 rows', _info(LARGE_PAYLOAD)),
+    Scenario('suppressed_debug', 'debug() on an INFO logger', _suppressed_debug),
+    Scenario('sampled_info', 'info() sampled with likelihood=1, out_of=100', _sampled_info),
+    Scenario('exception_deep', 'exception() with a 50 frame traceback', _exception(_make_deep_exception)),
+    Scenario('exception_chained', 'exception() with 3 chained exceptions', _exception(_make_chained_exception)),
+    Scenario('output_stream', 'info() written to a stream', _info(SMALL_PAYLOAD), {}),
+    Scenario('output_file', 'info() appended to a file', _info(SMALL_PAYLOAD), {'log_file_sink': 'file'}),
+    Scenario('output_buffered', 'info() written to a buffered file', _info(SMALL_PAYLOAD), {'buffered_output': True}),
+    Scenario(
+        'output_async', 'info() written to a stream from a background thread', _info(SMALL_PAYLOAD),
+        {'async_emission': True},
+    ),
+    Scenario('output_mmap', 'info() written to mmap segment files', _info(SMALL_PAYLOAD), {'log_file_sink': 'mmap'}),
+    Scenario(
+        'output_compressed', 'info() written to gzip segment files', _info(SMALL_PAYLOAD),
+        {'log_file_sink': 'compressed'},
+    ),
+]
+
+
+def _configure_output(output_settings: Optional[Dict], tmp_dir: str, stream: TextIO, json_backend: str):
+    """
+    Every scenario starts from the default settings. The ones without output settings only measure the logger,
+    and write to the null device
+    """
+    output_settings = dict(output_settings or {})
+    log_file_destination = None
+    if output_settings.get('log_file_sink') or output_settings.get('buffered_output'):
+        log_file_destination = os.path.join(tmp_dir, 'bench_{}.log'.format(time.time_ns()))
+    initialize_logger_settings(
+        reset_values_if_not_argument=True,
+        json_backend=json_backend,
+        log_stream_destination=stream,
+        log_file_destination=log_file_destination,
+        **output_settings
+    )
+    # changing only the destination doesn't replace the root handlers
+    basic_config(force=True)
+
+
+def _latencies_ns(fn: Callable[[], object], records: int) -> List[int]:
+    perf_counter_ns = time.perf_counter_ns
+    latencies = []
+    for _ in range(records):
+        start = perf_counter_ns()
+        fn()
+        latencies.append(perf_counter_ns() - start)
+    return latencies
+
+
+def _percentile(sorted_values: List[int], percentile: float) -> int:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))]
+
+
+def run_scenario(scenario: Scenario, records: int, tmp_dir: str, devnull: TextIO, json_backend: str) -> Dict:
+    _configure_output(scenario.output_settings, tmp_dir, devnull, json_backend)
+    lgr = register_logger('bench_{}'.format(scenario.name), level=logging.DEBUG)
+    try:
+        fn = scenario.setup(lgr, tmp_dir)
+        # warm up the caches (envelopes, formatted tracebacks, ...) before measuring
+        for _ in range(min(records, 1000)):
+            fn()
+        ns_per_record = time_per_call(fn, number=records, repeat=3)
+        latencies = sorted(_latencies_ns(fn, records))
+    finally:
+        lgr.deregister()
+    return {
+        'description': scenario.description,
+        'records': records,
+        'records_per_sec': round(1e9 / ns_per_record),
+        'p50_ns': _percentile(latencies, 50),
+        'p99_ns': _percentile(latencies, 99),
+    }
+
+
+def run_suite(records: int = 20000, names: Iterable[str] = None, json_backend: str = 'stdlib') -> Dict:
+    """
+    :return: the results of every scenario (or only the ones in names), along with what they were run on
+    """
+    names = set(names or ())
+    unknown = names - {scenario.name for scenario in SCENARIOS}
+    if unknown:
+        raise ValueError("unknown scenarios {}".format(sorted(unknown)))
+
+    results = {}
+    tmp_dir = tempfile.mkdtemp(prefix='advanced_logger_bench_')
+    try:
+        with open(os.devnull, 'w') as devnull:
+            for scenario in SCENARIOS:
+                if names and scenario.name not in names:
+                    continue
+                results[scenario.name] = run_scenario(scenario, records, tmp_dir, devnull, json_backend)
+            # back to the defaults, which also closes the last scenario's handlers
+            _configure_output(None, tmp_dir, sys.stdout, 'stdlib')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'json_backend': json_backend,
+        'results': results,
+    }
+
+
+def compare_results(before: Dict, after: Dict) -> Dict[str, float]:
+    """
+    :return: after's records/sec relative to before's for each scenario in both, e.g. 0.9 is 10% slower
+    """
+    return {
+        name: result['records_per_sec'] / before['results'][name]['records_per_sec']
+        for name, result in after['results'].items() if name in before['results']
+    }
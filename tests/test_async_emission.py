@@ -0,0 +1,141 @@
+import io
+import json
+import logging
+import threading
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.async_queue_handler import AsyncQueueHandler
+
+__author__ = 'neil@everymundo.com'
+
+
+class _BlockingHandler(logging.Handler):
+    """
+    Collects messages, but doesn't return from handle until released
+    """
+
+    def __init__(self):
+        super(_BlockingHandler, self).__init__()
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.messages = []
+
+    def handle(self, record):
+        self.started.set()
+        self.release.wait(5)
+        self.messages.append(record.getMessage())
+
+
+def _make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 0, msg, None, None)
+
+
+class AdvancedLoggingAsyncEmissionTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        super(AdvancedLoggingAsyncEmissionTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(async_emission=False, async_queue_size=0, async_overflow_policy='block')
+        super(AdvancedLoggingAsyncEmissionTestCase, self).tearDown()
+
+    def _fill_queue(self, overflow_policy: str, on_drop=None):
+        target = _BlockingHandler()
+        handler = AsyncQueueHandler([target], max_queue_size=2, overflow_policy=overflow_policy, on_drop=on_drop)
+        # the writer thread takes the first record and then gets stuck on it
+        handler.emit(_make_record('0'))
+        self.assertTrue(target.started.wait(5))
+        for i in range(1, 5):
+            handler.emit(_make_record(str(i)))
+        target.release.set()
+        handler.close()
+        return handler, target
+
+    def test_drop_new(self):
+        handler, target = self._fill_queue('drop_new')
+        self.assertEqual(['0', '1', '2'], target.messages)
+        self.assertEqual(2, handler.dropped_count)
+
+    def test_drop_oldest(self):
+        drops = []
+        handler, target = self._fill_queue('drop_oldest', on_drop=lambda: drops.append(1))
+        self.assertEqual(['0', '3', '4'], target.messages)
+        self.assertEqual(2, handler.dropped_count)
+        self.assertEqual(2, len(drops))
+
+    def test_block(self):
+        target = _BlockingHandler()
+        handler = AsyncQueueHandler([target], max_queue_size=1, overflow_policy='block')
+        handler.emit(_make_record('0'))
+        self.assertTrue(target.started.wait(5))
+        handler.emit(_make_record('1'))
+
+        blocked_emit = threading.Thread(target=handler.emit, args=(_make_record('2'),))
+        blocked_emit.start()
+        blocked_emit.join(0.1)
+        self.assertTrue(blocked_emit.is_alive())
+
+        target.release.set()
+        blocked_emit.join(5)
+        self.assertFalse(blocked_emit.is_alive())
+        handler.close()
+        self.assertEqual(['0', '1', '2'], target.messages)
+        self.assertEqual(0, handler.dropped_count)
+
+    def test_close_while_blocked(self):
+        drops = []
+        target = _BlockingHandler()
+        handler = AsyncQueueHandler(
+            [target], max_queue_size=1, overflow_policy='block', on_drop=lambda: drops.append(1)
+        )
+        handler.emit(_make_record('0'))
+        self.assertTrue(target.started.wait(5))
+        handler.emit(_make_record('1'))
+        blocked_emit = threading.Thread(target=handler.emit, args=(_make_record('2'),))
+        blocked_emit.start()
+        blocked_emit.join(0.1)
+
+        # the blocked record is written out rather than queued after the writer thread has stopped
+        closing = threading.Thread(target=handler.close)
+        closing.start()
+        target.release.set()
+        blocked_emit.join(5)
+        closing.join(5)
+        self.assertEqual(['0', '1', '2'], sorted(target.messages))
+
+        handler.emit(_make_record('3'))
+        self.assertEqual(3, len(target.messages))
+        self.assertEqual(1, handler.dropped_count)
+        self.assertEqual(1, len(drops))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            AsyncQueueHandler([], overflow_policy='foo')
+        with self.assertRaises(ValueError):
+            AsyncQueueHandler([], max_queue_size=0)
+
+    def test_async_emission_setting(self):
+        stream = io.StringIO()
+        initialize_logger_settings(async_emission=True, log_stream_destination=stream)
+        root_handlers = logging.getLogger().handlers
+        self.assertEqual(1, len(root_handlers))
+        self.assertIsInstance(root_handlers[0], AsyncQueueHandler)
+
+        test_logger = register_logger('test_async')
+        msg = {'foo': 'bar'}
+        test_logger.info(msg)
+        # the record is encoded on the calling thread, so later changes to msg aren't logged
+        msg['foo'] = 'baz'
+        root_handlers[0].flush()
+
+        logged = json.loads(stream.getvalue())
+        self.assertEqual({'foo': 'bar'}, logged['msg'])
+        self.assertEqual('INFO', logged['meta']['level'])
+
+        initialize_logger_settings(async_emission=False)
+        root_handlers = logging.getLogger().handlers
+        self.assertEqual(1, len(root_handlers))
+        self.assertNotIsInstance(root_handlers[0], AsyncQueueHandler)
@@ -0,0 +1,122 @@
+import asyncio
+import io
+import json
+import logging
+import threading
+import unittest
+
+from advanced_logger import register_logger, clear_all_loggers, initialize_logger_settings, request_context, \
+    PayloadLimits
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.asyncio_sink import get_asyncio_sink
+
+__author__ = 'neil@everymundo.com'
+
+
+class _ThreadRecordingStream(io.StringIO):
+    def __init__(self):
+        super(_ThreadRecordingStream, self).__init__()
+        self.writer_threads = set()
+
+    def write(self, s):
+        self.writer_threads.add(threading.current_thread())
+        return super(_ThreadRecordingStream, self).write(s)
+
+
+class AdvancedLoggingAsyncioTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.stream = _ThreadRecordingStream()
+        self.test_logger = register_logger('test_asyncio')
+        self.handler = logging.StreamHandler(self.stream)
+        self.test_logger.addHandler(self.handler)
+        self.test_logger.propagate = False
+        super(AdvancedLoggingAsyncioTestCase, self).setUp()
+
+    def tearDown(self):
+        self.test_logger.removeHandler(self.handler)
+        self.test_logger.propagate = True
+        super(AdvancedLoggingAsyncioTestCase, self).tearDown()
+
+    def _logged(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_awaitable_methods(self):
+        async def main():
+            msg = {'foo': 'bar'}
+            await self.test_logger.ainfo(msg)
+            # encoded in the caller, so later changes to msg aren't logged
+            msg['foo'] = 'baz'
+            await self.test_logger.adebug('not logged')
+            await self.test_logger.awarning('warning')
+            self.test_logger.error('sync')
+            returned = await self.test_logger.acritical('critical', return_it=True)
+            await self.test_logger.aexception('bar', msg='exception')
+            await self.test_logger.aclose()
+            return returned
+
+        returned = asyncio.run(main())
+        logged = self._logged()
+        self.assertEqual('CRITICAL', json.loads(returned)['meta']['level'])
+        async_logged = [record for record in logged if record.get('msg') != 'sync']
+        self.assertEqual([{'foo': 'bar'}, 'warning', 'critical', 'exception'], [r['msg'] for r in async_logged])
+        self.assertEqual('bar', async_logged[-1]['e'])
+        self.assertIn('sync', [r['msg'] for r in logged])
+
+    def test_exception_context(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_bytes=500))
+
+        async def main():
+            bound = self.test_logger.bind(request_id='r' * 100)
+            await bound.aexception(ValueError('x' * 1000), msg='failed')
+            with request_context(user=1):
+                await self.test_logger.aexception('bar', msg='exception')
+            await self.test_logger.aclose()
+
+        try:
+            asyncio.run(main())
+        finally:
+            initialize_logger_settings(payload_limits=False)
+        logged = self._logged()
+        self.assertEqual({'request_id': 'r' * 100}, logged[0]['ctx'])
+        self.assertEqual({'user': 1}, logged[1]['ctx'])
+        # the context counts towards max_bytes
+        for line in self.stream.getvalue().splitlines():
+            self.assertLessEqual(len(line), 500)
+
+    def test_written_off_the_loop(self):
+        async def main():
+            await self.test_logger.ainfo('foo')
+            await self.test_logger.aclose()
+
+        asyncio.run(main())
+        self.assertEqual(['foo'], [r['msg'] for r in self._logged()])
+        self.assertNotIn(threading.main_thread(), self.stream.writer_threads)
+
+    def test_pending_records_written_without_aclose(self):
+        async def main():
+            for i in range(100):
+                await self.test_logger.ainfo(i)
+
+        asyncio.run(main())
+        self.assertEqual(list(range(100)), [r['msg'] for r in self._logged()])
+
+    def test_sink_per_loop(self):
+        async def main():
+            sink = get_asyncio_sink()
+            self.assertIs(sink, get_asyncio_sink())
+            await sink.aclose()
+            self.assertTrue(sink.closed)
+            self.assertIsNot(sink, get_asyncio_sink())
+            with self.assertRaises(RuntimeError):
+                await sink.submit(self.test_logger, self.test_logger.makeRecord(
+                    self.test_logger.name, logging.INFO, __file__, 0, 'foo', None, None
+                ))
+            await self.test_logger.aclose()
+
+        asyncio.run(main())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+import zlib
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.binary_format import BinaryLogReader, HEADER, MAGIC, iter_binary_records
+from advanced_logger.handlers.binary_file_handler import BinaryFileHandler
+
+__author__ = 'neil@everymundo.com'
+
+
+def _make_record(name: str, level: int, msg: str) -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 0, msg, None, None)
+
+
+class AdvancedLoggingBinaryFormatTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.bin')
+        super(AdvancedLoggingBinaryFormatTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(log_file_sink='file', reset_values_if_not_argument=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingBinaryFormatTestCase, self).tearDown()
+
+    def _write(self, *records: logging.LogRecord):
+        handler = BinaryFileHandler(self.filename)
+        for record in records:
+            handler.emit(record)
+        handler.close()
+
+    def test_round_trip(self):
+        self._write(
+            _make_record('a', logging.INFO, 'first'),
+            _make_record('b', logging.ERROR, 'second'),
+            _make_record('a', logging.WARNING, 'third'),
+        )
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        self.assertTrue(data.startswith(MAGIC))
+        # the two names are defined once each
+        self.assertEqual(len(MAGIC) + HEADER.size * 5 + len('abfirstsecondthird'), len(data))
+
+        with BinaryLogReader(self.filename) as reader:
+            records = [(r.level, r.name, bytes(r.payload)) for r in reader]
+        self.assertEqual(
+            [(logging.INFO, 'a', b'first'), (logging.ERROR, 'b', b'second'), (logging.WARNING, 'a', b'third')],
+            records,
+        )
+
+    def test_filters(self):
+        first = _make_record('a', logging.INFO, 'first')
+        second = _make_record('b', logging.ERROR, 'second')
+        third = _make_record('a', logging.ERROR, 'third')
+        second.created = third.created = first.created + 10
+        self._write(first, second, third)
+
+        def payloads(**filters):
+            return [bytes(record.payload) for record in iter_binary_records(self.filename, **filters)]
+
+        self.assertEqual([b'second', b'third'], payloads(min_level=logging.ERROR))
+        self.assertEqual([b'first', b'third'], payloads(names={'a'}))
+        self.assertEqual([b'second', b'third'], payloads(since_ns=int((first.created + 5) * 1e9)))
+        self.assertEqual([b'first'], payloads(until_ns=int((first.created + 5) * 1e9)))
+
+    def test_appending_and_truncated_record(self):
+        self._write(_make_record('a', logging.INFO, 'first'))
+        self._write(_make_record('a', logging.INFO, 'second'))
+        with open(self.filename, 'rb') as f:
+            data = f.read()
+        # the magic is only written at the start of the file
+        self.assertEqual(1, data.count(MAGIC))
+
+        # a record which is still being written is skipped
+        with open(self.filename, 'ab') as f:
+            f.write(HEADER.pack(1, logging.INFO, zlib.crc32(b'a'), 0, 100) + b'partial')
+        self.assertEqual([b'first', b'second'], [bytes(r.payload) for r in iter_binary_records(self.filename)])
+
+    def test_not_a_binary_log(self):
+        with open(self.filename, 'w') as f:
+            f.write('{"msg": "foo"}\n')
+        with self.assertRaises(ValueError):
+            BinaryLogReader(self.filename)
+
+    def test_log_file_sink_setting(self):
+        initialize_logger_settings(log_file_destination=self.filename, log_file_sink='binary')
+        self.assertIsInstance(logging.getLogger().handlers[0], BinaryFileHandler)
+
+        test_logger = register_logger('test_binary')
+        test_logger.info('foo')
+        test_logger.error({'bar': 1})
+        records = list(iter_binary_records(self.filename))
+        self.assertEqual(['test_binary', 'test_binary'], [record.name for record in records])
+        self.assertEqual([logging.INFO, logging.ERROR], [record.level for record in records])
+        self.assertEqual(['foo', {'bar': 1}], [record.decode()['msg'] for record in records])
+        self.assertEqual('foo', json.loads(bytes(records[0].payload))['msg'])
@@ -0,0 +1,129 @@
+import asyncio
+import io
+import json
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import advanced_logger.advanced_logger as advanced_logger_module
+from advanced_logger import register_logger, clear_all_loggers, initialize_logger_settings, \
+    bind_request_context, reset_request_context, request_context, copy_request_context
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.json_encoder.json_backends import available_json_backends
+
+__author__ = 'neil@everymundo.com'
+
+
+class AdvancedLoggingBoundContextTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.test_logger = register_logger('test_bound_context')
+        super(AdvancedLoggingBoundContextTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(json_backend='stdlib')
+        super(AdvancedLoggingBoundContextTestCase, self).tearDown()
+
+    def _log(self, lgr, msg='foo', **kwargs):
+        return json.loads(lgr.info(msg, return_it=True, log_it=False, **kwargs))
+
+    def test_bind(self):
+        bound = self.test_logger.bind(request_id='abc', user=1)
+        logged = self._log(bound)
+        self.assertEqual({'request_id': 'abc', 'user': 1}, logged['ctx'])
+        self.assertEqual('foo', logged['msg'])
+        self.assertEqual(self.test_logger.name, logged['meta']['name'])
+
+        nested = bound.bind(user=2, extra=[1, 2])
+        self.assertEqual({'request_id': 'abc', 'user': 2, 'extra': [1, 2]}, self._log(nested)['ctx'])
+        # binding doesn't change the parent
+        self.assertEqual({'request_id': 'abc', 'user': 1}, self._log(bound)['ctx'])
+        self.assertNotIn('ctx', self._log(self.test_logger))
+        with self.assertRaises(TypeError):
+            bound.context.values['user'] = 3
+
+    def test_context_not_reencoded(self):
+        bound = self.test_logger.bind(request_id='abc')
+        with mock.patch.object(advanced_logger_module, '_encode_json', wraps=advanced_logger_module._encode_json) \
+                as encode_json:
+            for _ in range(3):
+                self._log(bound)
+        # only the log objects, not the context
+        self.assertEqual(3, encode_json.call_count)
+        for call in encode_json.call_args_list:
+            self.assertNotIn('ctx', call.args[0])
+
+    @unittest.skipUnless('ujson' in available_json_backends(), 'ujson is not installed')
+    def test_other_json_backend(self):
+        initialize_logger_settings(json_backend='ujson')
+        bound = self.test_logger.bind(request_id='abc')
+        self.assertEqual({'request_id': 'abc'}, self._log(bound)['ctx'])
+
+    def test_exception(self):
+        bound = self.test_logger.bind(request_id='abc')
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        self.test_logger.addHandler(handler)
+        try:
+            bound.exception('bar', msg='exception')
+        finally:
+            self.test_logger.removeHandler(handler)
+        logged = json.loads(stream.getvalue())
+        self.assertEqual({'request_id': 'abc'}, logged['ctx'])
+        self.assertEqual('exception', logged['msg'])
+
+    def test_request_context(self):
+        token = bind_request_context(request_id='abc')
+        try:
+            self.assertEqual({'request_id': 'abc'}, self._log(self.test_logger)['ctx'])
+            with request_context(user=1):
+                self.assertEqual({'request_id': 'abc', 'user': 1}, self._log(self.test_logger)['ctx'])
+                # a bound logger's own context comes after the request's
+                logged = self.test_logger.bind(user=2).info('foo', return_it=True, log_it=False)
+                self.assertEqual({'request_id': 'abc', 'user': 2}, json.loads(logged)['ctx'])
+            self.assertEqual({'request_id': 'abc'}, self._log(self.test_logger)['ctx'])
+        finally:
+            reset_request_context(token)
+        self.assertNotIn('ctx', self._log(self.test_logger))
+
+    def test_overlapping_keys(self):
+        def no_duplicate_keys(pairs):
+            keys = [key for key, _ in pairs]
+            self.assertEqual(len(keys), len(set(keys)))
+            return dict(pairs)
+
+        with request_context(request_id='abc', user=1):
+            bound = self.test_logger.bind(user=2, extra=3)
+            logged = json.loads(bound.info('foo', return_it=True, log_it=False), object_pairs_hook=no_duplicate_keys)
+            self.assertEqual({'request_id': 'abc', 'user': 2, 'extra': 3}, logged['ctx'])
+
+            # without keys in common, the fragments' JSON is joined as it is
+            bound = self.test_logger.bind(extra=3)
+            with mock.patch.object(advanced_logger_module, '_encode_json', wraps=advanced_logger_module._encode_json) \
+                    as encode_json:
+                logged = json.loads(bound.info('foo', return_it=True, log_it=False))
+            self.assertEqual({'request_id': 'abc', 'user': 1, 'extra': 3}, logged['ctx'])
+            self.assertEqual(1, encode_json.call_count)
+
+    def test_request_context_in_tasks_and_threads(self):
+        async def handle_request(request_id):
+            with request_context(request_id=request_id):
+                await asyncio.sleep(0)
+                return self._log(self.test_logger)['ctx']['request_id']
+
+        async def main():
+            return await asyncio.gather(*(handle_request(i) for i in range(5)))
+
+        self.assertEqual(list(range(5)), asyncio.run(main()))
+
+        with request_context(request_id='abc'), ThreadPoolExecutor(2) as executor:
+            without_context = executor.submit(self._log, self.test_logger).result()
+            with_context = executor.submit(copy_request_context(self._log), self.test_logger).result()
+        self.assertNotIn('ctx', without_context)
+        self.assertEqual({'request_id': 'abc'}, with_context['ctx'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.buffered_handler import BufferedStreamHandler, BufferedFileHandler
+
+__author__ = 'neil@everymundo.com'
+
+
+class _CountingStream(io.StringIO):
+    def __init__(self):
+        super(_CountingStream, self).__init__()
+        self.write_count = 0
+
+    def write(self, s):
+        self.write_count += 1
+        return super(_CountingStream, self).write(s)
+
+
+def _make_record(msg: str, level: int = logging.INFO) -> logging.LogRecord:
+    return logging.LogRecord('test', level, __file__, 0, msg, None, None)
+
+
+class AdvancedLoggingBufferedOutputTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        super(AdvancedLoggingBufferedOutputTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(buffered_output=False)
+        super(AdvancedLoggingBufferedOutputTestCase, self).tearDown()
+
+    def test_size_threshold(self):
+        stream = _CountingStream()
+        handler = BufferedStreamHandler(stream, max_buffer_bytes=30, flush_interval=60)
+        for i in range(5):
+            handler.emit(_make_record('message {}'.format(i)))
+        # 10 characters per line, so the 3rd record hits the threshold
+        self.assertEqual(1, stream.write_count)
+        self.assertEqual('message 0\nmessage 1\nmessage 2\n', stream.getvalue())
+        handler.close()
+        self.assertEqual(2, stream.write_count)
+        self.assertEqual(5, len(stream.getvalue().splitlines()))
+
+    def test_error_flushes(self):
+        stream = _CountingStream()
+        handler = BufferedStreamHandler(stream, flush_interval=60)
+        handler.emit(_make_record('info'))
+        self.assertEqual(0, stream.write_count)
+        handler.emit(_make_record('error', logging.ERROR))
+        self.assertEqual(1, stream.write_count)
+        self.assertEqual('info\nerror\n', stream.getvalue())
+        handler.close()
+
+    def test_time_threshold(self):
+        stream = _CountingStream()
+        handler = BufferedStreamHandler(stream, flush_interval=0.05)
+        handler.emit(_make_record('info'))
+        deadline = time.monotonic() + 5
+        while not stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual('info\n', stream.getvalue())
+        handler.close()
+
+    def test_no_time_threshold(self):
+        stream = _CountingStream()
+        handler = BufferedStreamHandler(stream, flush_interval=None)
+        self.assertIsNone(handler._flusher_thread)
+        handler._last_flush -= 60
+        handler.emit(_make_record('info'))
+        self.assertEqual(0, stream.write_count)
+        handler.close()
+        self.assertEqual('info\n', stream.getvalue())
+
+    def test_file_handler(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'test.log')
+            handler = BufferedFileHandler(filename, flush_interval=60)
+            handler.emit(_make_record('foo'))
+            with open(filename) as f:
+                self.assertEqual('', f.read())
+            handler.close()
+            with open(filename) as f:
+                self.assertEqual('foo\n', f.read())
+
+    def test_buffered_output_setting(self):
+        stream = io.StringIO()
+        initialize_logger_settings(buffered_output=True, buffer_flush_interval=60, log_stream_destination=stream)
+        root_handlers = logging.getLogger().handlers
+        self.assertEqual(1, len(root_handlers))
+        self.assertIsInstance(root_handlers[0], BufferedStreamHandler)
+
+        test_logger = register_logger('test_buffered')
+        test_logger.info('foo')
+        self.assertEqual('', stream.getvalue())
+        test_logger.error('bar')
+        self.assertEqual(['foo', 'bar'], [json.loads(line)['msg'] for line in stream.getvalue().splitlines()])
@@ -0,0 +1,157 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.compressed_file_handler import CompressedSegmentFileHandler, iter_compressed_lines
+
+__author__ = 'neil@everymundo.com'
+
+
+def _make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 0, msg, None, None)
+
+
+class AdvancedLoggingCompressedOutputTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.log')
+        super(AdvancedLoggingCompressedOutputTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(log_file_sink='file', reset_values_if_not_argument=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingCompressedOutputTestCase, self).tearDown()
+
+    def _read_index(self):
+        with open(self.filename + '.index.json') as f:
+            return json.load(f)
+
+    def test_size_segments_decode_on_their_own(self):
+        handler = CompressedSegmentFileHandler(self.filename, segment_size=44)
+        messages = ['message {:02d} {}'.format(i, 'x' * 10) for i in range(10)]  # 22 bytes with the newline
+        for message in messages:
+            handler.emit(_make_record(message))
+
+        # readable up to the last record while still being written to, once flushed
+        handler.flush()
+        self.assertEqual(messages, [line.decode() for line in iter_compressed_lines(self.filename)])
+        handler.close()
+        self.assertEqual(messages, [line.decode() for line in iter_compressed_lines(self.filename)])
+
+        segments = self._read_index()['segments']
+        self.assertEqual([2, 2, 2, 2, 2], [s['records'] for s in segments])
+        for i, segment in enumerate(segments):
+            path = os.path.join(self.tmp_dir.name, segment['file'])
+            self.assertEqual('test.log.{:06d}.gz'.format(i), segment['file'])
+            self.assertEqual(segment['compressed_bytes'], os.path.getsize(path))
+            with gzip.open(path, 'rt') as f:
+                self.assertEqual(messages[i * 2:i * 2 + 2], f.read().splitlines())
+
+    def test_time_segments(self):
+        handler = CompressedSegmentFileHandler(self.filename, segment_interval=0.05)
+        handler.emit(_make_record('first'))
+        handler.flush()
+        time.sleep(0.2)
+        # the first segment is finished even though nothing else was logged
+        with gzip.open(self.filename + '.000000.gz', 'rt') as f:
+            self.assertEqual('first\n', f.read())
+
+        handler.emit(_make_record('second'))
+        handler.close()
+        self.assertEqual([b'first', b'second'], list(iter_compressed_lines(self.filename)))
+        self.assertEqual([1, 1], [s['records'] for s in self._read_index()['segments']])
+
+    def test_continues_after_existing_segments(self):
+        handler = CompressedSegmentFileHandler(self.filename)
+        handler.emit(_make_record('before restart'))
+        handler.close()
+
+        handler = CompressedSegmentFileHandler(self.filename)
+        handler.emit(_make_record('after restart'))
+        handler.close()
+        self.assertEqual([b'before restart', b'after restart'], list(iter_compressed_lines(self.filename)))
+        self.assertEqual(2, len(self._read_index()['segments']))
+
+    def _block_writer(self, handler: CompressedSegmentFileHandler) -> threading.Event:
+        """
+        Makes the writer thread wait for the returned event before writing the next batch
+        """
+        writing, release = threading.Event(), threading.Event()
+        write_batch = handler._write_batch
+
+        def blocked_write_batch(batch):
+            writing.set()
+            release.wait()
+            return write_batch(batch)
+
+        handler._write_batch = blocked_write_batch
+        handler.emit(_make_record('stuck'))
+        writing.wait()
+        return release
+
+    def test_queue_overflow(self):
+        for overflow_policy, expected in (('drop_new', [0, 1]), ('drop_oldest', [3, 4])):
+            with self.subTest(overflow_policy=overflow_policy):
+                drops = []
+                handler = CompressedSegmentFileHandler(
+                    self.filename, max_queue_size=2, overflow_policy=overflow_policy, on_drop=lambda: drops.append(1)
+                )
+                release = self._block_writer(handler)
+                for i in range(5):
+                    handler.emit(_make_record(str(i)))
+                self.assertEqual(2, handler.queue_size)
+                release.set()
+                handler.close()
+                self.assertEqual(3, handler.dropped_count)
+                self.assertEqual(3, len(drops))
+                lines = [line.decode() for line in iter_compressed_lines(self.filename)]
+                self.assertEqual(['stuck'] + [str(i) for i in expected], lines[-3:])
+
+                # logged after it was closed
+                handler.emit(_make_record('too late'))
+                self.assertEqual(4, handler.dropped_count)
+
+    def test_queue_block(self):
+        handler = CompressedSegmentFileHandler(self.filename, max_queue_size=1)
+        release = self._block_writer(handler)
+        handler.emit(_make_record('queued'))
+        blocked = threading.Thread(target=handler.emit, args=(_make_record('waited'),))
+        blocked.start()
+        blocked.join(0.1)
+        self.assertTrue(blocked.is_alive())
+        release.set()
+        blocked.join()
+        handler.close()
+        self.assertEqual(0, handler.dropped_count)
+        self.assertEqual([b'stuck', b'queued', b'waited'], list(iter_compressed_lines(self.filename)))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            CompressedSegmentFileHandler(self.filename, compression='lz4')
+        with self.assertRaises(ValueError):
+            CompressedSegmentFileHandler(self.filename, segment_interval=-1)
+        with self.assertRaises(ValueError):
+            CompressedSegmentFileHandler(self.filename, overflow_policy='wait')
+        with self.assertRaises(ValueError):
+            initialize_logger_settings(log_file_compression='lz4')
+
+    def test_log_file_sink_setting(self):
+        initialize_logger_settings(log_file_destination=self.filename, log_file_sink='compressed')
+        root_handlers = logging.getLogger().handlers
+        self.assertIsInstance(root_handlers[0], CompressedSegmentFileHandler)
+        self.assertEqual('gzip', root_handlers[0].compression)
+
+        test_logger = register_logger('test_compressed')
+        test_logger.info('foo')
+        root_handlers[0].flush()
+        logged = [json.loads(line) for line in iter_compressed_lines(self.filename)]
+        self.assertEqual(['foo'], [record['msg'] for record in logged])
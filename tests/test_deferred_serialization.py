@@ -0,0 +1,74 @@
+import io
+import json
+import logging
+import unittest
+from unittest.mock import patch
+
+from advanced_logger import register_logger, clear_all_loggers
+from advanced_logger import advanced_logger as advanced_logger_module
+from advanced_logger.advanced_logger import set_global_log_level, _DeferredJSONMessage
+
+__author__ = 'neil@everymundo.com'
+
+
+class AdvancedLoggingDeferredSerializationTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.test_logger = register_logger('test_deferred')
+        self.test_logger.propagate = False
+        self.handlers = []
+        super(AdvancedLoggingDeferredSerializationTestCase, self).setUp()
+
+    def tearDown(self):
+        for handler in self.handlers:
+            self.test_logger.removeHandler(handler)
+        super(AdvancedLoggingDeferredSerializationTestCase, self).tearDown()
+
+    def _add_handler(self, level: int) -> io.StringIO:
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(level)
+        self.test_logger.addHandler(handler)
+        self.handlers.append(handler)
+        return stream
+
+    def test_not_serialized_when_no_handler_emits(self):
+        stream = self._add_handler(logging.ERROR)
+        encode_json = advanced_logger_module._encode_json
+        with patch.object(advanced_logger_module, '_encode_json', wraps=encode_json) as mock_encode:
+            self.test_logger.info({'foo': 'bar'})
+            self.test_logger.exception('e', msg='exception msg')
+        self.assertEqual(mock_encode.call_count, 1)
+        self.assertIn('"traceback"', stream.getvalue())
+        self.assertNotIn('"bar"', stream.getvalue())
+
+    def test_serialized_once_for_multiple_handlers(self):
+        stream1 = self._add_handler(logging.INFO)
+        stream2 = self._add_handler(logging.DEBUG)
+        encode_json = advanced_logger_module._encode_json
+        with patch.object(advanced_logger_module, '_encode_json', wraps=encode_json) as mock_encode:
+            self.test_logger.info({'foo': 'bar'})
+        self.assertEqual(mock_encode.call_count, 1)
+        self.assertEqual(stream1.getvalue(), stream2.getvalue())
+        logged = json.loads(stream1.getvalue())
+        self.assertEqual({'foo': 'bar'}, logged['msg'])
+        self.assertEqual('INFO', logged['meta']['level'])
+
+    def test_return_it_still_returns_string(self):
+        returned = self.test_logger.info('foo', return_it=True, log_it=False)
+        self.assertIsInstance(returned, str)
+        self.assertEqual('foo', json.loads(returned)['msg'])
+
+    def test_deferred_message(self):
+        calls = []
+
+        def serialize_fn():
+            calls.append(1)
+            return 'serialized'
+
+        deferred = _DeferredJSONMessage(serialize_fn)
+        self.assertEqual(calls, [])
+        self.assertEqual('serialized', str(deferred))
+        self.assertEqual('serialized', str(deferred))
+        self.assertEqual(calls, [1])
@@ -0,0 +1,94 @@
+import logging
+import unittest
+
+from advanced_logger import register_logger, clear_all_loggers, initialize_logger_settings
+from advanced_logger.advanced_logger import set_global_log_level
+
+__author__ = 'neil@everymundo.com'
+
+
+class AdvancedLoggingDisabledLevelsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        super(AdvancedLoggingDisabledLevelsTestCase, self).setUp()
+
+    def tearDown(self):
+        logging.disable(logging.NOTSET)
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        initialize_logger_settings(debug_hook_fn=None, reset_values_if_not_argument=False)
+        super(AdvancedLoggingDisabledLevelsTestCase, self).tearDown()
+
+    def _logged_levels(self, lgr):
+        return [
+            name for name in ('debug', 'info', 'warning', 'error', 'critical')
+            if getattr(lgr, name)('msg', return_it=True, log_it=False) is not None
+        ]
+
+    def test_level_methods_swapped_on_set_level(self):
+        lgr = register_logger('disabled_levels', level=logging.WARNING)
+        self.assertIn('debug', vars(lgr))
+        self.assertIn('info', vars(lgr))
+        self.assertNotIn('warning', vars(lgr))
+        self.assertEqual(self._logged_levels(lgr), ['warning', 'error', 'critical'])
+
+        lgr.setLevel(logging.DEBUG)
+        self.assertNotIn('debug', vars(lgr))
+        self.assertEqual(self._logged_levels(lgr), ['debug', 'info', 'warning', 'error', 'critical'])
+
+        # no level of its own, the parents decide
+        lgr.setLevel(logging.NOTSET)
+        self.assertNotIn('critical', vars(lgr))
+
+    def test_global_level_changes(self):
+        lgr = register_logger('disabled_levels_global', level=logging.ERROR)
+        bound = lgr.bind(request_id=1)
+        self.assertIsNone(bound.info('msg', return_it=True, log_it=False))
+
+        set_global_log_level(logging.INFO)
+        # the stale no-op notices the global level changed
+        self.assertEqual(self._logged_levels(lgr), ['info', 'warning', 'error', 'critical'])
+        self.assertIsNotNone(bound.info('msg', return_it=True, log_it=False))
+
+        set_global_log_level(logging.CRITICAL)
+        self.assertEqual(self._logged_levels(lgr), ['critical'])
+
+    def test_global_level_with_stdlib_child(self):
+        lgr = register_logger('disabled_levels_parent', level=logging.INFO)
+        logger_class = logging.getLoggerClass()
+        logging.setLoggerClass(logging.Logger)
+        try:
+            child = logging.getLogger('disabled_levels_parent.child')
+        finally:
+            logging.setLoggerClass(logger_class)
+        self.assertIs(lgr, child.parent)
+        self.assertFalse(child.isEnabledFor(logging.DEBUG))
+
+        set_global_log_level(logging.DEBUG)
+        self.assertTrue(lgr.isEnabledFor(logging.DEBUG))
+        self.assertTrue(child.isEnabledFor(logging.DEBUG))
+
+    def test_logging_disable(self):
+        lgr = register_logger('disabled_levels_disable')
+        logging.disable(logging.WARNING)
+        self.assertEqual(self._logged_levels(lgr), ['error', 'critical'])
+        self.assertIsNone(lgr.log(logging.INFO, 'msg', return_it=True, log_it=False))
+        lgr.setLevel(logging.DEBUG)
+        self.assertIn('warning', vars(lgr))
+
+        logging.disable(logging.NOTSET)
+        self.assertEqual(self._logged_levels(lgr), ['debug', 'info', 'warning', 'error', 'critical'])
+
+    def test_debug_hook_only_called_when_enabled(self):
+        calls = []
+        initialize_logger_settings(debug_hook_fn=lambda msg, *args, **kwargs: calls.append(msg))
+        lgr = register_logger('disabled_levels_hook', level=logging.INFO)
+        lgr.debug('dropped')
+        lgr.setLevel(logging.DEBUG)
+        lgr.debug('kept', log_it=False)
+        self.assertEqual(calls, ['kept'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import logging
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, ExceptionAggregator
+from advanced_logger.advanced_logger import set_global_log_level
+
+__author__ = 'neil@everymundo.com'
+
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _raise_value_error(value):
+    raise ValueError('bad value {}'.format(value))
+
+
+def _raise_chained():
+    try:
+        _raise_value_error(0)
+    except ValueError as e:
+        raise KeyError('foo') from e
+
+
+def _catch(fn, *args) -> BaseException:
+    try:
+        fn(*args)
+    except Exception as e:
+        return e
+    raise AssertionError('nothing raised')
+
+
+class AdvancedLoggingExceptionAggregationTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.clock = _FakeClock()
+        self.aggregator = ExceptionAggregator(window=60, max_fingerprints=2, clock=self.clock)
+        self.test_logger = register_logger('test_exception_aggregation', exception_aggregator=self.aggregator)
+        super(AdvancedLoggingExceptionAggregationTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(exception_aggregator=False)
+        super(AdvancedLoggingExceptionAggregationTestCase, self).tearDown()
+
+    def _log(self, e: BaseException):
+        return self.test_logger.exception(e, msg='foo', return_it=True, log_it=False)
+
+    def test_compact_after_first(self):
+        first = self._log(_catch(_raise_value_error, 1))
+        self.assertIn('traceback', first)
+        self.assertEqual('bad value 1', first['e'])
+
+        self.clock.now += 5
+        # a different message from the same place is the same exception
+        second = self._log(_catch(_raise_value_error, 2))
+        self.assertEqual({
+            'msg': 'foo',
+            'e': 'bad value 2',
+            'fingerprint': first['fingerprint'],
+            'count': 2,
+            'first_seen': '1970-01-01T00:16:40',
+            'last_seen': '1970-01-01T00:16:45',
+        }, second)
+
+        # a new window logs the traceback again
+        self.clock.now += 60
+        third = self._log(_catch(_raise_value_error, 3))
+        self.assertIn('traceback', third)
+        self.assertEqual(first['fingerprint'], third['fingerprint'])
+
+    def test_fingerprint(self):
+        fingerprints = {
+            self._log(e)['fingerprint'] for e in [
+                _catch(_raise_value_error, 1),
+                _catch(_raise_chained),
+                ValueError('no traceback'),
+                KeyError('no traceback'),
+            ]
+        }
+        self.assertEqual(4, len(fingerprints))
+        self.assertEqual(16, len(fingerprints.pop()))
+
+    def test_lru(self):
+        self._log(_catch(_raise_value_error, 0))
+        self._log(_catch(_raise_chained))
+        self._log(ValueError('no traceback'))
+        self.assertEqual(2, len(self.aggregator))
+        # the first one was forgotten
+        self.assertIn('traceback', self._log(_catch(_raise_value_error, 0)))
+        self.assertNotIn('traceback', self._log(ValueError('no traceback')))
+
+    def test_global_aggregator(self):
+        other_logger = register_logger('test_exception_aggregation_global')
+        e = ValueError('foo')
+        self.assertNotIn('fingerprint', other_logger.exception(e, return_it=True, log_it=False))
+
+        initialize_logger_settings(exception_aggregator=ExceptionAggregator())
+        self.assertIn('traceback', other_logger.exception(e, return_it=True, log_it=False))
+        self.assertEqual(2, other_logger.exception(e, return_it=True, log_it=False)['count'])
+        # string exceptions have nothing to aggregate
+        self.assertEqual(
+            {'msg': None, 'e': 'foo', 'traceback': 'traceback not provided'},
+            other_logger.exception('foo', return_it=True, log_it=False)
+        )
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            ExceptionAggregator(window=0)
+        with self.assertRaises(ValueError):
+            ExceptionAggregator(max_fingerprints=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import datetime
+import decimal
+import json
+import re
+import unittest
+import uuid
+
+from advanced_logger.json_encoder.advanced_json_encoder import AdvancedJSONEncoder
+from advanced_logger.json_encoder.fast_json_encoder import get_fast_encoder, get_dispatch_table, _get_fast_encoder, \
+    _get_dispatch_table, _MAX_CACHED_ENCODERS
+
+__author__ = 'neil@everymundo.com'
+
+
+class _SubDecimal(decimal.Decimal):
+    pass
+
+
+class _Custom(object):
+    def __init__(self, value):
+        self.value = value
+
+
+class AdvancedLoggingFastJSONEncoderTestCase(unittest.TestCase):
+    def test_same_output_as_advanced_json_encoder(self):
+        test_obj = {
+            'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+            'datetime_aware': datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            'date': datetime.date(2020, 1, 2),
+            'time': datetime.time(3, 4, 5, 678901),
+            'timedelta': datetime.timedelta(days=-1, seconds=5, microseconds=3),
+            'decimal': decimal.Decimal('1.10'),
+            'sub_decimal': _SubDecimal('2.5'),
+            'uuid': uuid.UUID('12345678123456781234567812345678'),
+            'regex': re.compile('^foo$'),
+            'frozenset': frozenset([1]),
+            'native': [1, 2.5, None, True, 'str', {'nested': 'dict'}],
+        }
+        self.assertEqual(json.dumps(test_obj, cls=AdvancedJSONEncoder), get_fast_encoder().encode(test_obj))
+        self.assertEqual(
+            json.dumps(test_obj, cls=AdvancedJSONEncoder, indent=2),
+            get_fast_encoder(indent=2).encode(test_obj)
+        )
+
+    def test_unknown_type_raises(self):
+        with self.assertRaises(TypeError):
+            get_fast_encoder().encode({'foo': _Custom(1)})
+
+    def test_custom_type_encoders(self):
+        type_encoders = {_Custom: lambda o: {'custom': o.value}, decimal.Decimal: float}
+        encoder = get_fast_encoder(type_encoders=type_encoders)
+        self.assertEqual(
+            {'foo': {'custom': 1}, 'bar': 1.5, 'baz': 2.5},
+            json.loads(encoder.encode({'foo': _Custom(1), 'bar': decimal.Decimal('1.5'), 'baz': _SubDecimal('2.5')}))
+        )
+
+    def test_cached_per_configuration(self):
+        self.assertIs(get_fast_encoder(), get_fast_encoder())
+        self.assertIsNot(get_fast_encoder(), get_fast_encoder(indent=2))
+        self.assertIs(get_dispatch_table(), get_dispatch_table())
+        type_encoders = {_Custom: str}
+        self.assertIs(get_fast_encoder(type_encoders=type_encoders), get_fast_encoder(type_encoders=type_encoders))
+        self.assertIsNot(get_fast_encoder(), get_fast_encoder(type_encoders=type_encoders))
+
+        # a new function every call doesn't keep every encoder built with it
+        for _ in range(200):
+            get_fast_encoder(type_encoders={_Custom: lambda o: o.value})
+        self.assertLessEqual(_get_fast_encoder.cache_info().currsize, _MAX_CACHED_ENCODERS)
+        self.assertLessEqual(_get_dispatch_table.cache_info().currsize, _MAX_CACHED_ENCODERS)
+
+    def test_dispatch_lookup_caches_subclasses(self):
+        dispatch_table = get_dispatch_table()
+        self.assertIs(dispatch_table.lookup(decimal.Decimal), dispatch_table.lookup(_SubDecimal))
+        self.assertIsNone(dispatch_table.lookup(_Custom))
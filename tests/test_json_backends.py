@@ -0,0 +1,108 @@
+import datetime
+import decimal
+import io
+import json
+import logging
+import re
+import unittest
+import uuid
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.json_encoder.advanced_json_encoder import AdvancedJSONEncoder
+from advanced_logger.json_encoder.json_backends import get_json_backend, available_json_backends, JSON_BACKENDS
+
+__author__ = 'neil@everymundo.com'
+
+_PARITY_CASES = {
+    'datetime': datetime.datetime(2020, 1, 2, 3, 4, 5, 678901),
+    'datetime_no_microseconds': datetime.datetime(2020, 1, 2, 3, 4, 5),
+    'datetime_aware': datetime.datetime(2020, 1, 2, 3, 4, 5, 6, tzinfo=datetime.timezone.utc),
+    'date': datetime.date(2020, 1, 2),
+    'time': datetime.time(3, 4, 5, 678901),
+    'timedelta': datetime.timedelta(days=3, hours=2, microseconds=1),
+    'negative_timedelta': datetime.timedelta(days=-1),
+    'decimal': decimal.Decimal('1.10'),
+    'decimals_in_containers': {'list': [decimal.Decimal('2.50')], 'tuple': (decimal.Decimal('0E-8'),)},
+    'uuid': uuid.UUID('12345678123456781234567812345678'),
+    'regex': re.compile(r'^foo/[0-9]+$'),
+    'frozenset': frozenset(['a']),
+    'unicode': 'café ☃ / "quoted" \\ \n',
+    'big_int': 2 ** 70,
+    'non_str_keys': {1: 'one', 2.5: 'two point five', None: 'none', True: 'true'},
+    'nested': {'list': [1, [2, [3, {'tuple': (4, 5)}]]], 'empty': {}, 'none': None, 'bool': False},
+}
+
+
+class AdvancedLoggingJSONBackendsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        super(AdvancedLoggingJSONBackendsTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(json_backend='stdlib')
+        super(AdvancedLoggingJSONBackendsTestCase, self).tearDown()
+
+    def _backends(self):
+        for name in JSON_BACKENDS:
+            if name not in available_json_backends():
+                with self.subTest(backend=name):
+                    self.skipTest('{} is not installed'.format(name))
+                continue
+            yield name, get_json_backend(name)
+
+    def test_parity_with_advanced_json_encoder(self):
+        for name, backend in self._backends():
+            for case_name, value in _PARITY_CASES.items():
+                with self.subTest(backend=name, case=case_name):
+                    expected = json.loads(json.dumps({'msg': value}, cls=AdvancedJSONEncoder))
+                    self.assertEqual(expected, json.loads(backend.dumps({'msg': value})))
+
+    def test_decimal_precision(self):
+        # ujson would encode these as the numbers 1.1 and 2.5
+        decimals = [decimal.Decimal('1.10'), decimal.Decimal('2.50')]
+        for name, backend in self._backends():
+            with self.subTest(backend=name):
+                self.assertEqual('["1.10", "2.50"]', json.dumps(json.loads(backend.dumps(decimals))))
+
+    def test_indent(self):
+        for name, backend in self._backends():
+            with self.subTest(backend=name):
+                self.assertEqual(json.dumps({'a': [1]}, indent=2), backend.dumps({'a': [1]}, indent=2))
+
+    def test_unserializable_raises_type_error(self):
+        for name, backend in self._backends():
+            with self.subTest(backend=name):
+                with self.assertRaises(TypeError):
+                    backend.dumps({'msg': object()})
+
+    def test_type_encoders(self):
+        for name in available_json_backends():
+            with self.subTest(backend=name):
+                backend = get_json_backend(name, type_encoders={complex: lambda o: [o.real, o.imag]})
+                self.assertEqual({'msg': [1.0, 2.0]}, json.loads(backend.dumps({'msg': complex(1, 2)})))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            get_json_backend('foo')
+        # ujson is only as fast as the stdlib once its Decimals are converted
+        expected = 'orjson' if 'orjson' in available_json_backends() else 'stdlib'
+        self.assertEqual(expected, get_json_backend('auto').name)
+
+    def test_logger_uses_backend(self):
+        for name in available_json_backends():
+            with self.subTest(backend=name):
+                initialize_logger_settings(json_backend=name)
+                test_logger = register_logger('test_json_backend')
+                stream = io.StringIO()
+                handler = logging.StreamHandler(stream)
+                test_logger.addHandler(handler)
+                try:
+                    test_logger.info({'when': datetime.date(2020, 1, 2)})
+                finally:
+                    test_logger.removeHandler(handler)
+
+                logged = json.loads(stream.getvalue())
+                self.assertEqual({'when': '2020-01-02'}, logged['msg'])
+                self.assertEqual('INFO', logged['meta']['level'])
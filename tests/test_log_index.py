@@ -0,0 +1,178 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, basic_config
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.json_encoder.json_backends import JSON_BACKENDS, available_json_backends
+from advanced_logger.handlers.indexed_file_handler import IndexedFileHandler
+from advanced_logger.log_index import iter_index_entries, iter_time_range, level_bit, line_time_ns, rebuild_index
+from advanced_logger.log_reader import _parse_time
+
+__author__ = 'neil@everymundo.com'
+
+_START = 1600000000.0
+
+
+def _make_record(created: float, level: int, msg: str) -> logging.LogRecord:
+    record = logging.LogRecord('test', level, __file__, 0, msg, None, None)
+    record.created = created
+    return record
+
+
+class _RecordFormatter(logging.Formatter):
+    # a record with meta.time set from created, like the JSON advanced_logger writes
+    def format(self, record: logging.LogRecord) -> str:
+        return '{{"msg": "{}", "meta": {{"name": "{}", "time": {}, "level": "{}"}}}}'.format(
+            record.msg, record.name, int(getattr(record, 'meta_time', record.created) * 1e9), record.levelname
+        )
+
+
+class AdvancedLoggingLogIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.log')
+        super(AdvancedLoggingLogIndexTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(reset_values_if_not_argument=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingLogIndexTestCase, self).tearDown()
+
+    def _write(self, records, bucket_seconds=1.0):
+        handler = IndexedFileHandler(self.filename, bucket_seconds=bucket_seconds)
+        handler.setFormatter(_RecordFormatter())
+        for record in records:
+            handler.emit(record)
+        handler.close()
+
+    def _msgs(self, **query):
+        return [record['msg'] for record in iter_time_range(self.filename, **query)]
+
+    def test_index_entries(self):
+        self._write([
+            _make_record(_START, logging.INFO, 'a'),
+            _make_record(_START + 0.5, logging.ERROR, 'b'),
+            # written late by another thread, stays in the current bucket
+            _make_record(_START - 3, logging.INFO, 'c'),
+            _make_record(_START + 2, logging.INFO, 'd'),
+        ])
+        with open(self.filename, 'rb') as f:
+            offsets = [0]
+            for line in f:
+                offsets.append(offsets[-1] + len(line))
+        self.assertEqual([
+            (int(_START * 1e9), 0, level_bit(logging.INFO) | level_bit(logging.ERROR)),
+            (int((_START + 2) * 1e9), offsets[3], level_bit(logging.INFO)),
+        ], list(iter_index_entries(self.filename)))
+
+    def test_time_range(self):
+        self._write([_make_record(_START + i, logging.INFO, str(i)) for i in range(100)])
+
+        self.assertEqual([str(i) for i in range(40, 45)], self._msgs(since=_START + 40, until=_START + 45))
+        self.assertEqual([str(i) for i in range(95, 100)], self._msgs(since=_START + 95))
+        self.assertEqual(['0', '1'], self._msgs(until=_START + 2))
+        self.assertEqual([], self._msgs(since=_START + 1000))
+
+    def test_skips_buckets_without_the_level(self):
+        self._write([
+            _make_record(_START + i, logging.ERROR if i in (10, 70) else logging.INFO, str(i)) for i in range(100)
+        ])
+        self.assertEqual(['10', '70'], self._msgs(min_level='ERROR'))
+        self.assertEqual(['70'], self._msgs(min_level='ERROR', since=_START + 50))
+
+    def test_appending_and_rebuilding(self):
+        self._write([_make_record(_START + i, logging.INFO, str(i)) for i in range(10)])
+        self._write([_make_record(_START + i, logging.INFO, str(i)) for i in range(10, 20)])
+        entries = list(iter_index_entries(self.filename))
+        self.assertEqual(20, len(entries))
+        self.assertEqual(['9', '10'], self._msgs(since=_START + 9, until=_START + 11))
+
+        # the same index is built from the log file
+        os.remove(self.filename + '.idx')
+        self.assertEqual(20, rebuild_index(self.filename))
+        self.assertEqual(entries, list(iter_index_entries(self.filename)))
+
+        # appending to a log without an index builds it first
+        os.remove(self.filename + '.idx')
+        self._write([_make_record(_START + 20, logging.INFO, '20')])
+        self.assertEqual(21, len(list(iter_index_entries(self.filename))))
+        self.assertEqual(['19', '20'], self._msgs(since=_START + 19))
+
+        self.assertEqual(3, rebuild_index(self.filename, bucket_seconds=10))
+        self.assertEqual([str(i) for i in range(5, 21)], self._msgs(since=_START + 5))
+
+    def test_line_time_ns(self):
+        iso = '2020-09-13T12:26:40.123456'
+        line = '{{"msg": 1, "meta": {{"time": "{}"}}}}'.format(iso).encode()
+        self.assertEqual(_parse_time(iso)[1], line_time_ns(line))
+        line = b'{"meta": {"time": "2020-09-13T12:26:40"}}'
+        self.assertEqual(_parse_time('2020-09-13T12:26:40')[1], line_time_ns(line))
+        # the record's meta, not one in msg
+        line = b'{"msg": {"meta": {"time": 1}}, "meta": {"name": "a", "time": 5, "level": "INFO"}}'
+        self.assertEqual(5, line_time_ns(line))
+        # compact JSON, like the orjson and ujson backends write
+        self.assertEqual(5, line_time_ns(b'{"msg":1,"meta":{"name":"a","time":5,"level":"INFO"}}'))
+        # logger.exception() records don't have a meta
+        self.assertIsNone(line_time_ns(b'{"msg": "a", "e": "b", "traceback": []}'))
+
+    def test_indexed_by_meta_time(self):
+        # meta.time is taken just before the record is created, so it can be in the bucket before created's
+        record = _make_record(_START + 1.001, logging.INFO, 'a')
+        record.meta_time = _START + 0.999
+        self._write([record])
+        self.assertEqual([(int(_START * 1e9), 0, level_bit(logging.INFO))], list(iter_index_entries(self.filename)))
+
+    def test_same_index_as_rebuild(self):
+        initialize_logger_settings(log_file_destination=self.filename, log_file_index=True, timestamp_format='iso')
+        test_logger = register_logger('test_log_index_rebuild')
+        # a record without a time before the first entry
+        test_logger.exception(ValueError('first'))
+        for i in range(5):
+            test_logger.info(i)
+        test_logger.exception(ValueError('later'))
+        test_logger.warning('last')
+        initialize_logger_settings(reset_values_if_not_argument=True)
+        basic_config(force=True)
+
+        entries = list(iter_index_entries(self.filename))
+        self.assertEqual(0, entries[0][1])
+        rebuild_index(self.filename)
+        self.assertEqual(entries, list(iter_index_entries(self.filename)))
+
+    def test_json_backends(self):
+        for json_backend in JSON_BACKENDS:
+            if json_backend not in available_json_backends():
+                continue
+            with self.subTest(json_backend=json_backend):
+                filename = os.path.join(self.tmp_dir.name, '{}.log'.format(json_backend))
+                initialize_logger_settings(
+                    log_file_destination=filename, log_file_index=True, json_backend=json_backend
+                )
+                test_logger = register_logger('test_log_index_{}'.format(json_backend))
+                for i in range(5):
+                    test_logger.info(i)
+                initialize_logger_settings(reset_values_if_not_argument=True)
+                basic_config(force=True)
+
+                self.assertEqual(list(range(5)), [record['msg'] for record in iter_time_range(filename)])
+                entries = list(iter_index_entries(filename))
+                self.assertTrue(entries)
+                self.assertEqual(len(entries), rebuild_index(filename))
+                self.assertEqual(entries, list(iter_index_entries(filename)))
+
+    def test_log_file_index_setting(self):
+        with self.assertRaises(ValueError):
+            initialize_logger_settings(log_file_index=True, log_file_sink='mmap')
+        initialize_logger_settings(log_file_sink='file', log_file_index=False)
+
+        initialize_logger_settings(log_file_destination=self.filename, log_file_index=True, timestamp_format='iso')
+        self.assertIsInstance(logging.getLogger().handlers[0], IndexedFileHandler)
+        test_logger = register_logger('test_log_index')
+        test_logger.info('foo')
+        test_logger.error('bar')
+        self.assertEqual(['foo', 'bar'], self._msgs(since='2000-01-01'))
+        self.assertEqual(['bar'], self._msgs(since='2000-01-01', min_level=logging.ERROR))
@@ -0,0 +1,149 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, basic_config
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.exception_aggregation import ExceptionAggregator
+from advanced_logger.log_reader import LogQuery, iter_records, format_traceback
+
+__author__ = 'neil@everymundo.com'
+
+
+def _raise_chained():
+    try:
+        {}['missing']
+    except KeyError as e:
+        raise ValueError('bad value') from e
+
+
+class AdvancedLoggingLogReaderTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.log')
+        initialize_logger_settings(log_file_destination=self.filename)
+        basic_config(force=True)
+        super(AdvancedLoggingLogReaderTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(reset_values_if_not_argument=True)
+        basic_config(force=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingLogReaderTestCase, self).tearDown()
+
+    def _log_records(self):
+        billing = register_logger('billing.invoices', level=logging.DEBUG)
+        search = register_logger('search', level=logging.DEBUG)
+        billing.debug('debug')
+        billing.info('info')
+        search.warning({'query': 'foo'})
+        search.error('error')
+        try:
+            _raise_chained()
+        except ValueError as e:
+            billing.exception(e, msg='failed')
+        with open(self.filename, 'a') as f:
+            f.write('not a record\n')
+        billing.critical('critical')
+
+    def test_filters(self):
+        self._log_records()
+
+        def msgs(query=None):
+            return [record['msg'] for record in iter_records(self.filename, query)]
+
+        self.assertEqual(['debug', 'info', {'query': 'foo'}, 'error', 'failed', 'critical'], msgs())
+        self.assertEqual(['error', 'failed', 'critical'], msgs(LogQuery(min_level='error')))
+        self.assertEqual(['error', 'failed', 'critical'], msgs(LogQuery(min_level=logging.ERROR)))
+        self.assertEqual(['debug', 'info', 'critical'], msgs(LogQuery(name_prefix='billing.')))
+        self.assertEqual(['critical'], msgs(LogQuery(min_level='ERROR', name_prefix='billing')))
+        self.assertEqual([], msgs(LogQuery(until='2000-01-01')))
+        self.assertEqual(['debug', 'info', {'query': 'foo'}, 'error', 'critical'], msgs(LogQuery(since=0)))
+        self.assertEqual([], msgs(LogQuery(since=datetime.utcnow().replace(year=3000))))
+        with self.assertRaises(ValueError):
+            LogQuery(min_level='LOUD')
+
+    def test_aggregated_exceptions(self):
+        initialize_logger_settings(exception_aggregator=ExceptionAggregator())
+        test_logger = register_logger('aggregated', level=logging.DEBUG)
+        for _ in range(3):
+            try:
+                _raise_chained()
+            except ValueError as e:
+                test_logger.exception(e, msg='failed')
+        test_logger.info('info')
+
+        records = list(iter_records(self.filename, LogQuery(min_level='ERROR')))
+        self.assertEqual(['failed'] * 3, [record['msg'] for record in records])
+        self.assertEqual([None, 2, 3], [record.get('count') for record in records])
+
+    def test_epoch_ns_times(self):
+        initialize_logger_settings(timestamp_format='epoch_ns')
+        self._log_records()
+        query = LogQuery(since='2000-01-01T00:00:00', until=datetime.utcnow().replace(year=3000))
+        self.assertEqual(5, len(list(iter_records(self.filename, query))))
+        self.assertEqual(0, len(list(iter_records(self.filename, LogQuery(until=946684800)))))
+
+    def test_parallel_matches_sequential(self):
+        lgr = register_logger('parallel', level=logging.DEBUG)
+        for i in range(500):
+            lgr.log(logging.ERROR if i % 7 == 0 else logging.INFO, 'message {}'.format(i))
+
+        query = LogQuery(min_level='ERROR')
+        sequential = list(iter_records(self.filename, query, raw=True))
+        # chunks small enough that most of them split a line
+        parallel = list(iter_records(self.filename, query, raw=True, processes=3, chunk_size=997))
+        self.assertEqual(len(range(0, 500, 7)), len(sequential))
+        self.assertEqual(sequential, parallel)
+        self.assertEqual(500, len(list(iter_records(self.filename, processes=2, chunk_size=1000))))
+
+    def test_gzipped_file(self):
+        self._log_records()
+        with open(self.filename, 'rb') as f_in, gzip.open(self.filename + '.gz', 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        self.assertEqual(
+            list(iter_records(self.filename, LogQuery(min_level='WARNING'))),
+            list(iter_records(self.filename + '.gz', LogQuery(min_level='WARNING'), processes=2)),
+        )
+
+    def test_format_traceback(self):
+        self._log_records()
+        record = next(r for r in iter_records(self.filename) if 'traceback' in r)
+        lines = format_traceback(record['traceback']).splitlines()
+        self.assertEqual('Traceback (most recent call last):', lines[0])
+        self.assertTrue(lines[1].startswith('  File "'))
+        self.assertTrue(lines[1].endswith('in _raise_chained'))
+        self.assertEqual("    {}['missing']", lines[2])
+        self.assertEqual("KeyError: 'missing'", lines[lines.index('') - 1])
+        self.assertIn('The above exception was the direct cause of the following exception:', lines)
+        self.assertEqual('ValueError: bad value', lines[-1])
+        self.assertEqual('traceback not provided', format_traceback('traceback not provided'))
+
+    def test_command_line(self):
+        self._log_records()
+        output = subprocess.run(
+            [sys.executable, '-m', 'advanced_logger', self.filename, '--level', 'ERROR', '--name', 'search'],
+            stdout=subprocess.PIPE, check=True,
+        ).stdout
+        self.assertEqual(['error'], [json.loads(line)['msg'] for line in output.splitlines()])
+
+        output = subprocess.run(
+            [sys.executable, '-m', 'advanced_logger', self.filename, '--count'], stdout=subprocess.PIPE, check=True,
+        ).stdout
+        self.assertEqual(b'6\n', output)
+
+        output = subprocess.run(
+            [sys.executable, '-m', 'advanced_logger', self.filename, '--level', 'ERROR', '--tracebacks'],
+            stdout=subprocess.PIPE, check=True,
+        ).stdout.decode()
+        self.assertIn('failed\nTraceback (most recent call last):\n', output)
+        self.assertIn('\nValueError: bad value\n', output)
@@ -0,0 +1,204 @@
+import gc
+import logging
+import unittest
+
+from advanced_logger import register_logger, deregister_logger, clear_all_loggers, initialize_logger_settings, \
+    get_registry_stats
+from advanced_logger.advanced_logger import set_global_log_level, _registered_loggers, _get_logger_by_name
+from advanced_logger.registry import LoggerRegistry
+
+__author__ = 'neil@everymundo.com'
+
+
+class _NamedObject(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class LoggerRegistryTestCase(unittest.TestCase):
+    def test_set_like(self):
+        registry = LoggerRegistry()
+        a, b = _NamedObject('a'), _NamedObject('b')
+        registry.add(a)
+        registry.add(b)
+        registry.add(a)
+        self.assertEqual(len(registry), 2)
+        self.assertIn(a, registry)
+        # a different object with the same name isn't the registered one
+        self.assertNotIn(_NamedObject('a'), registry)
+        self.assertEqual({lgr.name for lgr in registry}, {'a', 'b'})
+
+        registry.remove(a)
+        self.assertNotIn(a, registry)
+        with self.assertRaises(KeyError):
+            registry.remove(a)
+        registry.discard(a)
+        self.assertEqual(len(registry), 1)
+
+    def test_prefix_index_kept_up_to_date(self):
+        registry = LoggerRegistry()
+        for name in ('tenant.b', 'tenant.a', 'tenant2.a', 'other', 'tenant.a.child'):
+            registry.add(_NamedObject(name))
+        self.assertEqual(registry.names_with_prefix('tenant.'), ['tenant.a', 'tenant.a.child', 'tenant.b'])
+
+        registry.add(_NamedObject('tenant.c'))
+        registry.remove(registry.get('tenant.a'))
+        self.assertEqual(registry.names_with_prefix('tenant.'), ['tenant.a.child', 'tenant.b', 'tenant.c'])
+        self.assertEqual(registry.names_with_prefix('tenant'), ['tenant.a.child', 'tenant.b', 'tenant.c', 'tenant2.a'])
+        self.assertEqual(registry.names_with_prefix('missing'), [])
+        self.assertEqual(len(registry.names_with_prefix('')), len(registry))
+
+    def test_weak_mode(self):
+        registry = LoggerRegistry(mode='weak')
+        kept, dropped = _NamedObject('kept'), _NamedObject('dropped')
+        registry.add(kept)
+        registry.add(dropped)
+        self.assertEqual(registry.names_with_prefix(''), ['dropped', 'kept'])
+
+        del dropped
+        gc.collect()
+        self.assertEqual(len(registry), 1)
+        self.assertEqual(registry.names_with_prefix(''), ['kept'])
+        self.assertIsNone(registry.get('dropped'))
+        self.assertEqual(registry.stats().collected, 1)
+
+    def test_lru_mode(self):
+        released = []
+        clock = _FakeClock()
+        registry = LoggerRegistry(mode='lru', max_loggers=2, idle_timeout=10, on_release=released.append, clock=clock)
+        a, b, c = _NamedObject('a'), _NamedObject('b'), _NamedObject('c')
+        registry.add(a)
+        clock.now = 1
+        registry.add(b)
+        clock.now = 2
+        # a is now more recently used than b
+        self.assertIs(registry.get('a'), a)
+        registry.add(c)
+        self.assertEqual(released, [b])
+        self.assertEqual(registry.names_with_prefix(''), ['a', 'c'])
+
+        clock.now = 12
+        registry.expire()
+        self.assertEqual(released, [b, a, c])
+        self.assertEqual(len(registry), 0)
+        stats = registry.stats()
+        self.assertEqual((stats.mode, stats.live, stats.evicted, stats.expired), ('lru', 0, 1, 2))
+
+    def test_configure(self):
+        registry = LoggerRegistry()
+        loggers = [_NamedObject(str(i)) for i in range(5)]
+        for lgr in loggers:
+            registry.add(lgr)
+        registry.configure('lru', max_loggers=3)
+        self.assertEqual(len(registry), 3)
+        with self.assertRaises(ValueError):
+            registry.configure('strong', max_loggers=3)
+        with self.assertRaises(ValueError):
+            registry.configure('soft')
+
+
+class AdvancedLoggingRegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        super(AdvancedLoggingRegistryTestCase, self).setUp()
+
+    def tearDown(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        initialize_logger_settings(global_log_name_prefix='', registry_mode='strong')
+        super(AdvancedLoggingRegistryTestCase, self).tearDown()
+
+    def test_lookup_and_deregister_by_name(self):
+        lgr = register_logger('registry_lookup')
+        self.assertIs(_get_logger_by_name('registry_lookup'), lgr)
+        deregister_logger('registry_lookup')
+        self.assertTrue(lgr.disabled)
+        self.assertNotIn('registry_lookup', logging.Logger.manager.loggerDict)
+        with self.assertRaises(ValueError):
+            _get_logger_by_name('registry_lookup')
+
+    def test_clear_filters(self):
+        names = ['tenant.1', 'tenant.2', 'tenant.2.child', 'tenant10', 'other.tenant', 'other']
+        loggers = {name: register_logger(name) for name in names}
+
+        clear_all_loggers(exact_filter='other')
+        self.assertEqual(len(_registered_loggers), 5)
+        self.assertTrue(loggers['other'].disabled)
+
+        clear_all_loggers(prefix_filter='tenant.')
+        self.assertEqual({lgr.name for lgr in _registered_loggers}, {'tenant10', 'other.tenant'})
+
+        clear_all_loggers(regex_filter=r'^tenant\d+$')
+        self.assertEqual({lgr.name for lgr in _registered_loggers}, {'other.tenant'})
+
+        clear_all_loggers(substr_filter='tenant')
+        self.assertEqual(len(_registered_loggers), 0)
+        self.assertTrue(all(lgr.disabled for lgr in loggers.values()))
+
+        # registering again after being cleared
+        self.assertIs(register_logger('tenant.1'), _get_logger_by_name('tenant.1'))
+
+    def test_global_level_applied_lazily(self):
+        lgr = register_logger('registry_level')
+        other = register_logger('registry_level_other', level=logging.INFO)
+        self.assertTrue(lgr.isEnabledFor(logging.DEBUG))
+
+        set_global_log_level(logging.ERROR, update_existing=False)
+        self.assertEqual(lgr.level, logging.DEBUG)
+        self.assertEqual(register_logger('registry_level_new').level, logging.ERROR)
+
+        set_global_log_level(logging.WARNING)
+        self.assertFalse(lgr.isEnabledFor(logging.INFO))
+        self.assertTrue(lgr.isEnabledFor(logging.WARNING))
+        self.assertEqual(other.getEffectiveLevel(), logging.WARNING)
+        self.assertIsNone(lgr.info('dropped', return_it=True, log_it=False))
+
+        # a level set after the global one wins
+        lgr.setLevel(logging.DEBUG)
+        self.assertTrue(lgr.isEnabledFor(logging.DEBUG))
+        self.assertEqual(other.level, logging.WARNING)
+
+    def test_weak_registry_mode(self):
+        initialize_logger_settings(registry_mode='weak')
+        lgr = register_logger('registry_weak')
+        self.assertNotIn('registry_weak', logging.Logger.manager.loggerDict)
+        self.assertIs(register_logger('registry_weak'), lgr)
+        self.assertIs(_get_logger_by_name('registry_weak'), lgr)
+
+        collected_before = get_registry_stats().collected
+        del lgr
+        gc.collect()
+        stats = get_registry_stats()
+        self.assertEqual(stats.live, 0)
+        self.assertEqual(stats.collected, collected_before + 1)
+
+        # back to strong, the loggers which are still alive are added back to the stdlib manager
+        lgr = register_logger('registry_weak')
+        initialize_logger_settings(registry_mode='strong')
+        self.assertIs(logging.Logger.manager.loggerDict['registry_weak'], lgr)
+
+    def test_lru_registry_mode(self):
+        initialize_logger_settings(registry_max_loggers=2)
+        first = register_logger('registry_lru_1')
+        register_logger('registry_lru_2')
+        register_logger('registry_lru_3')
+        stats = get_registry_stats()
+        self.assertEqual((stats.mode, stats.live), ('lru', 2))
+        self.assertNotIn('registry_lru_1', logging.Logger.manager.loggerDict)
+        # released loggers still work, but aren't deregistered
+        self.assertFalse(first.disabled)
+        self.assertIsNotNone(first.info('still logging', return_it=True, log_it=False))
+        self.assertIsNot(register_logger('registry_lru_1'), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import io
+import json
+import logging
+import time
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, get_metrics_snapshot, \
+    reset_metrics, EveryNthSampler, RateLimiter
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.metrics import Histogram
+
+__author__ = 'neil@everymundo.com'
+
+
+class HistogramTestCase(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        self.assertEqual(histogram.snapshot()['p50_ns'], 0)
+        for value in [100] * 98 + [5000, 70000]:
+            histogram.record(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 100)
+        self.assertEqual(snapshot['total_ns'], 100 * 98 + 5000 + 70000)
+        # the upper bound of the power of two bucket each falls in
+        self.assertEqual(snapshot['p50_ns'], 127)
+        self.assertEqual(snapshot['p99_ns'], 8191)
+        self.assertEqual(snapshot['max_ns'], 131071)
+
+
+class AdvancedLoggingMetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        logging.getLogger().addHandler(self.handler)
+        reset_metrics()
+        super(AdvancedLoggingMetricsTestCase, self).setUp()
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+        initialize_logger_settings(metrics=True, metrics_interval=0, rate_limiter=False)
+        super(AdvancedLoggingMetricsTestCase, self).tearDown()
+
+    def test_counters(self):
+        lgr = register_logger('metrics_counters')
+        lgr.info('foo')
+        lgr.info('bar')
+        lgr.warning({'baz': 1})
+        lgr.exception(ValueError('qux'))
+
+        lgr.addFilter(lambda record: False)
+        lgr.info('filtered')
+        lgr.filters.clear()
+
+        lgr.sampler = EveryNthSampler(1, 2)
+        lgr.info('kept')
+        lgr.info('sampled')
+        lgr.sampler = None
+
+        initialize_logger_settings(rate_limiter=RateLimiter(rate=0.001, burst=1))
+        for _ in range(2):
+            lgr.info('limited')
+
+        # a circular reference can't be encoded, its str() is logged instead
+        circular = {}
+        circular['self'] = circular
+        lgr.info(circular)
+
+        snapshot = get_metrics_snapshot()
+        # the fallback also logs an exception
+        self.assertEqual(snapshot['emitted'], {'INFO': 5, 'WARNING': 1, 'ERROR': 2})
+        self.assertEqual(snapshot['dropped'], {'sampled': 1, 'rate_limited': 1, 'filtered': 1, 'queue_overflow': 0})
+        self.assertEqual(snapshot['encode_fallbacks'], 1)
+        self.assertEqual(snapshot['traceback_time']['count'], 2)
+        self.assertEqual(snapshot['encode_time']['count'], 8)
+        # every record is ASCII, the newlines are added by the handler
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(snapshot['bytes_written'], sum(len(line) for line in lines))
+
+        reset_metrics()
+        self.assertEqual(get_metrics_snapshot()['emitted'], {})
+
+    def test_turned_off(self):
+        initialize_logger_settings(metrics=False)
+        self.assertIsNone(get_metrics_snapshot())
+        register_logger('metrics_off').info('foo')
+        initialize_logger_settings(metrics=True)
+        self.assertEqual(get_metrics_snapshot()['emitted'], {})
+
+    def test_periodic_record(self):
+        initialize_logger_settings(metrics_interval=0.01)
+        lgr = register_logger('metrics_periodic')
+        lgr.info('starts the interval')
+        time.sleep(0.02)
+        lgr.info('logs the metrics after it')
+
+        logged = [json.loads(line) for line in self.stream.getvalue().splitlines()]
+        self.assertEqual(len(logged), 3)
+        self.assertEqual(logged[2]['meta']['name'], 'advanced_logger.metrics')
+        self.assertEqual(logged[2]['metrics']['emitted'], {'INFO': 2})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.mmap_file_handler import MmapSegmentFileHandler, iter_segment_lines
+
+__author__ = 'neil@everymundo.com'
+
+
+def _make_record(msg: str) -> logging.LogRecord:
+    return logging.LogRecord('test', logging.INFO, __file__, 0, msg, None, None)
+
+
+class AdvancedLoggingMmapFileHandlerTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.log')
+        super(AdvancedLoggingMmapFileHandlerTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(log_file_sink='file', reset_values_if_not_argument=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingMmapFileHandlerTestCase, self).tearDown()
+
+    def _read_index(self):
+        with open(self.filename + '.index.json') as f:
+            return json.load(f)
+
+    def test_rotation_and_index(self):
+        handler = MmapSegmentFileHandler(self.filename, segment_size=64)
+        messages = ['message {:02d} {}'.format(i, 'x' * 10) for i in range(10)]  # 22 bytes with the newline
+        for message in messages:
+            handler.emit(_make_record(message))
+
+        # readable while still being written to
+        self.assertEqual(messages, [line.decode() for line in iter_segment_lines(self.filename)])
+        handler.close()
+        self.assertEqual(messages, [line.decode() for line in iter_segment_lines(self.filename)])
+
+        segments = self._read_index()['segments']
+        self.assertEqual([2, 2, 2, 2, 2], [s['records'] for s in segments])
+        self.assertEqual([0, 44, 88, 132, 176], [s['offset'] for s in segments])
+        for segment in segments:
+            self.assertEqual(segment['bytes'], os.path.getsize(os.path.join(self.tmp_dir.name, segment['file'])))
+            self.assertLessEqual(segment['first_time'], segment['last_time'])
+
+    def test_oversized_record(self):
+        handler = MmapSegmentFileHandler(self.filename, segment_size=16)
+        handler.emit(_make_record('x' * 100))
+        handler.emit(_make_record('y'))
+        handler.close()
+        self.assertEqual([b'x' * 100, b'y'], list(iter_segment_lines(self.filename)))
+
+    def test_recovers_after_crash(self):
+        handler = MmapSegmentFileHandler(self.filename, segment_size=1024)
+        handler.emit(_make_record('before crash'))
+        # simulate a crash, the segment is never truncated and the index never updated
+        handler._mmap.close()
+        os.close(handler._fd)
+        self.assertEqual(1024, os.path.getsize(self.filename + '.000000'))
+
+        handler = MmapSegmentFileHandler(self.filename, segment_size=1024)
+        handler.emit(_make_record('after crash'))
+        handler.close()
+        self.assertEqual(len('before crash\n'), os.path.getsize(self.filename + '.000000'))
+        self.assertEqual([b'before crash', b'after crash'], list(iter_segment_lines(self.filename)))
+        self.assertEqual([0, len('before crash\n')], [s['offset'] for s in self._read_index()['segments']])
+
+    def test_log_file_sink_setting(self):
+        with self.assertRaises(ValueError):
+            initialize_logger_settings(log_file_sink='foo')
+
+        initialize_logger_settings(log_file_destination=self.filename, log_file_sink='mmap')
+        root_handlers = logging.getLogger().handlers
+        self.assertIsInstance(root_handlers[0], MmapSegmentFileHandler)
+
+        test_logger = register_logger('test_mmap')
+        test_logger.info('foo')
+        logged = [json.loads(line) for line in iter_segment_lines(self.filename)]
+        self.assertEqual(['foo'], [record['msg'] for record in logged])
@@ -0,0 +1,131 @@
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.handlers.async_queue_handler import AsyncQueueHandler
+from advanced_logger.handlers.multiprocess_handler import MultiprocessLogServer, MultiprocessClientHandler
+
+__author__ = 'neil@everymundo.com'
+
+_WORKERS = 4
+_RECORDS_PER_WORKER = 200
+
+
+class _ListHandler(logging.Handler):
+    def __init__(self):
+        super(_ListHandler, self).__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord):
+        self.messages.append(self.format(record))
+
+
+def _run_in_children(target, count: int):
+    pids = []
+    for i in range(count):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                target(i)
+            except BaseException:
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        pids.append(pid)
+    return [os.waitpid(pid, 0)[1] for pid in pids]
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), "requires os.fork")
+class AdvancedLoggingMultiprocessTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmp_dir.name, 'test.log')
+        self.socket_path = os.path.join(self.tmp_dir.name, 'test.sock')
+        super(AdvancedLoggingMultiprocessTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(multiprocess_mode=False, reset_values_if_not_argument=True)
+        self.tmp_dir.cleanup()
+        super(AdvancedLoggingMultiprocessTestCase, self).tearDown()
+
+    def _read_lines(self):
+        with open(self.filename) as f:
+            return f.read().splitlines()
+
+    def test_forked_workers_share_writer(self):
+        server = MultiprocessLogServer(socket_path=self.socket_path, filename=self.filename)
+        server.start()
+        handler = MultiprocessClientHandler(self.socket_path)
+        payload = 'x' * 5000  # records bigger than a single socket read
+
+        handler.emit(logging.LogRecord('test', logging.INFO, __file__, 0, 'parent', None, None))
+
+        def worker(i):
+            for j in range(_RECORDS_PER_WORKER):
+                msg = '{} {} {}'.format(i, j, payload)
+                handler.emit(logging.LogRecord('test', logging.INFO, __file__, 0, msg, None, None))
+            handler.close()
+
+        self.assertEqual([0] * _WORKERS, _run_in_children(worker, _WORKERS))
+        handler.close()
+        server.stop()
+        self.assertFalse(server.is_running)
+
+        lines = self._read_lines()
+        self.assertEqual('parent', lines[0])
+        self.assertEqual(1 + _WORKERS * _RECORDS_PER_WORKER, len(lines))
+        seen = set()
+        for line in lines[1:]:
+            i, j, rest = line.split(' ')
+            self.assertEqual(payload, rest)
+            seen.add((int(i), int(j)))
+        self.assertEqual({(i, j) for i in range(_WORKERS) for j in range(_RECORDS_PER_WORKER)}, seen)
+
+    def test_stream_must_be_stdout_or_stderr(self):
+        with tempfile.TemporaryFile('w') as f:
+            with self.assertRaises(ValueError):
+                MultiprocessLogServer(socket_path=self.socket_path, stream=f)
+
+    def test_multiprocess_mode_setting(self):
+        initialize_logger_settings(
+            log_file_destination=self.filename, multiprocess_mode=True, multiprocess_socket_path=self.socket_path
+        )
+        self.assertIsInstance(logging.getLogger().handlers[0], MultiprocessClientHandler)
+
+        test_logger = register_logger('test_multiprocess')
+        test_logger.info('from parent')
+        self.assertEqual([0, 0], _run_in_children(lambda i: test_logger.info('from child {}'.format(i)), 2))
+
+        initialize_logger_settings(multiprocess_mode=False, reset_values_if_not_argument=True)
+        messages = sorted(json.loads(line)['msg'] for line in self._read_lines())
+        self.assertEqual(['from child 0', 'from child 1', 'from parent'], messages)
+
+    def test_async_handler_after_fork(self):
+        target = _ListHandler()
+        handler = AsyncQueueHandler([target])
+        read_fd, write_fd = os.pipe()
+
+        def child(_):
+            os.close(read_fd)
+            # the writer thread has to be running again in the child
+            handler.emit(logging.LogRecord('test', logging.INFO, __file__, 0, 'child', None, None))
+            handler.flush(timeout=5)
+            os.write(write_fd, json.dumps(target.messages).encode())
+
+        self.assertEqual([0], _run_in_children(child, 1))
+        os.close(write_fd)
+        with os.fdopen(read_fd) as f:
+            self.assertEqual(['child'], json.load(f))
+        handler.close()
+        self.assertEqual([], target.messages)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import io
+import json
+import logging
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, basic_config, \
+    PayloadLimits
+from advanced_logger.advanced_logger import set_global_log_level
+
+__author__ = 'neil@everymundo.com'
+
+
+class _CountingList(list):
+    """
+    Counts how many of its items were looked at
+    """
+
+    def __init__(self, *args):
+        super(_CountingList, self).__init__(*args)
+        self.visited = 0
+
+    def __iter__(self):
+        for item in super(_CountingList, self).__iter__():
+            self.visited += 1
+            yield item
+
+
+def _recurse(n):
+    if n % 2:
+        return _recurse(n - 1)
+    return _recurse(n - 1) if n else 1 / 0
+
+
+class _Text(str):
+    pass
+
+
+class AdvancedLoggingPayloadLimitsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.stream = io.StringIO()
+        initialize_logger_settings(log_stream_destination=self.stream)
+        basic_config(force=True)
+        self.lgr = register_logger('test_payload_limits')
+        super(AdvancedLoggingPayloadLimitsTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(reset_values_if_not_argument=True)
+        basic_config(force=True)
+        super(AdvancedLoggingPayloadLimitsTestCase, self).tearDown()
+
+    def _logged(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_bound(self):
+        limits = PayloadLimits(max_depth=2, max_items=2, max_string_length=5)
+        obj = {'a': [1, 2, 3], 'b': {'c': {'d': 1}}, 'e': 'abcdefgh', 'f': 1}
+        bounded, truncated = limits.bound(obj)
+        self.assertTrue(truncated)
+        self.assertEqual(
+            {'a': [1, 2, '...<1 more items>'], 'b': {'c': '<dict of 1 items>'}, '...': '...<2 more items>'}, bounded
+        )
+        self.assertEqual('abcde...<3 more characters>', limits.bound('abcdefgh')[0])
+        self.assertEqual('abcde...<3 more characters>', limits.bound(_Text('abcdefgh'))[0])
+        self.assertEqual(('abcde...<3 more characters>', True), limits.bound_string('abcdefgh'))
+        self.assertEqual(('abc', False), limits.bound_string('abc'))
+
+        small = {'a': [1, 2], 'b': 'abc'}
+        self.assertIs(small, limits.bound(small)[0])
+        self.assertFalse(limits.bound(small)[1])
+
+        with self.assertRaises(ValueError):
+            PayloadLimits(max_items=0)
+
+    def test_stops_early(self):
+        limits = PayloadLimits(max_items=10)
+        big = _CountingList(range(100000))
+        bounded, truncated = limits.bound({'rows': big})
+        self.assertTrue(truncated)
+        self.assertEqual(11, len(bounded['rows']))
+        self.assertEqual(11, big.visited)
+
+        # max_bytes alone stops the walk too
+        big = _CountingList('x' * 10 for _ in range(100000))
+        bounded, truncated = PayloadLimits(max_bytes=1000).bound(big)
+        self.assertTrue(truncated)
+        self.assertLess(big.visited, 100)
+
+    def test_circular_reference(self):
+        circular = []
+        circular.append(circular)
+        bounded, truncated = PayloadLimits(max_items=10).bound(circular)
+        self.assertTrue(truncated)
+
+    def test_truncated_records(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_items=3, max_string_length=20, max_bytes=400))
+        self.lgr.info(list(range(1000)))
+        self.lgr.info('x' * 1000)
+        self.lgr.info('small')
+        self.lgr.info({'key {}'.format(i): 'value' for i in range(3)})
+
+        logged = self._logged()
+        self.assertEqual([0, 1, 2, '...<997 more items>'], logged[0]['msg'])
+        self.assertEqual('x' * 20 + '...<980 more characters>', logged[1]['msg'])
+        self.assertEqual([True, True, None, None], [record['meta'].get('truncated') for record in logged])
+        self.assertEqual('INFO', logged[0]['meta']['level'])
+
+    def test_max_bytes(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_bytes=300))
+        # escaped characters make the encoded msg larger than the walk's estimate
+        self.lgr.info({'key {}'.format(i): '"' * 40 for i in range(50)})
+        self.lgr.info(['y' * 50 for _ in range(50)])
+        for line in self.stream.getvalue().splitlines():
+            self.assertLessEqual(len(line), 300)
+            self.assertTrue(json.loads(line)['meta']['truncated'])
+
+    def test_str_fallback(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_items=2, max_string_length=50))
+        unencodable = {'a': object(), 'rows': list(range(1000))}
+        self.lgr.info(unencodable)
+        record = [record for record in self._logged() if 'meta' in record and 'name' in record['meta']][-1]
+        self.assertTrue(record['meta']['truncated'])
+        self.assertTrue(record['msg'].startswith("{'a': <object object at "))
+        self.assertLessEqual(len(record['msg']), 50 + len('...<1000 more characters>'))
+
+    def test_exception_records(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_items=2, max_string_length=20))
+        try:
+            raise ValueError('z' * 100)
+        except ValueError as e:
+            self.lgr.exception(e, msg={'rows': list(range(100))})
+            self.lgr.exception(ValueError('short'), msg='failed')
+        logged = self._logged()
+        self.assertEqual({'rows': [0, 1, '...<98 more items>']}, logged[0]['msg'])
+        self.assertEqual('z' * 20 + '...<80 more characters>', logged[0]['e'])
+        self.assertEqual('ValueError: ' + 'z' * 8 + '...<92 more characters>', logged[0]['traceback'][-1])
+        self.assertEqual({'truncated': True}, logged[0]['meta'])
+        self.assertNotIn('meta', logged[1])
+
+    def test_exception_record_size(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_string_length=100, max_bytes=2000))
+        self.lgr.exception(ValueError('x' * 100000))
+        try:
+            raise ValueError('x' * 100000)
+        except ValueError as e:
+            self.lgr.bind(request_id='r' * 50).exception(e)
+
+        initialize_logger_settings(payload_limits=PayloadLimits(max_bytes=1500))
+        try:
+            _recurse(40)
+        except ZeroDivisionError as e:
+            self.lgr.exception(e, msg='y' * 3000)
+
+        lines = self.stream.getvalue().splitlines()
+        for line in lines:
+            self.assertLessEqual(len(line), 2000)
+        logged = self._logged()
+        for record in logged:
+            self.assertTrue(record['meta']['truncated'])
+        self.assertEqual('ValueError: ' + 'x' * 88 + '...<99912 more characters>', logged[0]['traceback'][-1])
+        self.assertEqual('ValueError: ' + 'x' * 88 + '...<99912 more characters>', logged[1]['traceback'][-1])
+        self.assertEqual({'request_id': 'r' * 50}, logged[1]['ctx'])
+
+        # the oldest frames go first, the ones closest to the error are kept
+        self.assertLessEqual(len(lines[2]), 1500)
+        formatted_tb = logged[2]['traceback']
+        self.assertRegex(formatted_tb[1], r'^\.\.\.<\d+ more frames>$')
+        self.assertEqual('    return _recurse(n - 1) if n else 1 / 0', formatted_tb[-2][1])
+        self.assertEqual('ZeroDivisionError: division by zero', formatted_tb[-1])
+
+    def test_removing_limits(self):
+        initialize_logger_settings(payload_limits=PayloadLimits(max_items=1))
+        initialize_logger_settings(payload_limits=False)
+        self.lgr.info([1, 2, 3])
+        self.assertEqual([1, 2, 3], self._logged()[0]['msg'])
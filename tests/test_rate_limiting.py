@@ -0,0 +1,174 @@
+import gc
+import io
+import json
+import logging
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers, \
+    flush_rate_limit_summaries, RateLimiter
+from advanced_logger.advanced_logger import set_global_log_level, _log_suppressed_summaries
+
+__author__ = 'neil@everymundo.com'
+
+
+class _FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class AdvancedLoggingRateLimitingTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.clock = _FakeClock()
+        self.stream = io.StringIO()
+        self.handler = logging.StreamHandler(self.stream)
+        logging.getLogger().addHandler(self.handler)
+        super(AdvancedLoggingRateLimitingTestCase, self).setUp()
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+        initialize_logger_settings(rate_limiter=False)
+        super(AdvancedLoggingRateLimitingTestCase, self).tearDown()
+
+    def _logged(self):
+        return [json.loads(line) for line in self.stream.getvalue().splitlines()]
+
+    def test_token_bucket(self):
+        rate_limiter = RateLimiter(rate=2, burst=3, summary_interval=100, clock=self.clock)
+        self.assertEqual([True] * 3 + [False] * 2, [rate_limiter.check('foo')[0] for _ in range(5)])
+        # other keys have their own bucket
+        self.assertTrue(rate_limiter.check('bar')[0])
+
+        self.clock.now = 0.5
+        allowed, summaries = rate_limiter.check('foo', logging.ERROR)
+        self.assertTrue(allowed)
+        self.assertEqual([('foo', 2, 0)], summaries)
+        self.assertFalse(rate_limiter.check('foo', logging.ERROR)[0])
+        self.assertEqual(3, rate_limiter.suppressed_count)
+
+    def test_periodic_summary(self):
+        rate_limiter = RateLimiter(rate=1, summary_interval=10, clock=self.clock)
+        for _ in range(5):
+            rate_limiter.check('foo', logging.WARNING)
+        self.clock.now = 10
+        # any key triggers the summaries of every key
+        allowed, summaries = rate_limiter.check('bar')
+        self.assertTrue(allowed)
+        self.assertEqual([('foo', 4, logging.WARNING)], summaries)
+        self.assertEqual([], rate_limiter.take_summaries())
+
+    def test_lru_eviction(self):
+        rate_limiter = RateLimiter(rate=1, max_keys=2, summary_interval=100, clock=self.clock)
+        rate_limiter.check('a')
+        rate_limiter.check('a', logging.INFO)
+        rate_limiter.check('b')
+        rate_limiter.check('a')  # a is now the most recently used
+        allowed, summaries = rate_limiter.check('c')
+        self.assertEqual(2, len(rate_limiter))
+        self.assertEqual([], summaries)
+        # b was evicted, so it gets a full bucket again, and a's suppressed records are reported when it's evicted
+        allowed, summaries = rate_limiter.check('b')
+        self.assertTrue(allowed)
+        self.assertEqual([('a', 2, logging.INFO)], summaries)
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(rate=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(max_keys=0)
+
+    def test_logger_rate_limiter(self):
+        test_logger = register_logger(
+            'test_rate_limiting', rate_limiter=RateLimiter(rate=1, summary_interval=100, clock=self.clock)
+        )
+
+        def storm():
+            test_logger.info('storm')
+
+        for i in range(5):
+            storm()
+        test_logger.info('other message')
+        for _ in range(5):
+            test_logger.exception(ValueError('foo'))
+        test_logger.exception(KeyError('foo'))
+
+        self.clock.now = 1
+        storm()
+        logged = self._logged()
+        self.assertEqual(
+            ['storm', 'other message', None, None, '4 similar records were suppressed by rate limiting', 'storm'],
+            [record['msg'] for record in logged]
+        )
+        # keyed by exception type
+        self.assertEqual(['foo', "'foo'"], [record['e'] for record in logged[2:4]])
+        storm_line = storm.__code__.co_firstlineno + 1
+        self.assertEqual({'count': 4, 'key': '{}:{}'.format(__file__, storm_line)}, logged[4]['suppressed'])
+        self.assertEqual('INFO', logged[4]['meta']['level'])
+
+        flush_rate_limit_summaries()
+        summary = self._logged()[-1]
+        self.assertEqual({'count': 4, 'key': 'ValueError'}, summary['suppressed'])
+        self.assertEqual('ERROR', summary['meta']['level'])
+
+    def test_keyed_by_call_site(self):
+        test_logger = register_logger(
+            'test_rate_limiting_call_site', rate_limiter=RateLimiter(rate=0.001, burst=2, clock=self.clock)
+        )
+        for i in range(50):
+            test_logger.info('request {} failed'.format(i))
+        self.assertEqual(['request 0 failed', 'request 1 failed'], [record['msg'] for record in self._logged()])
+        self.assertEqual(1, len(test_logger.rate_limiter))
+
+        # dicts logged from different places don't share a bucket
+        test_logger.info({'event': 'started'})
+        test_logger.info({'event': 'started'})
+        test_logger.info({'event': 'shutdown'})
+        self.assertEqual(
+            [{'event': 'started'}, {'event': 'started'}, {'event': 'shutdown'}],
+            [record['msg'] for record in self._logged()[2:]]
+        )
+
+    def test_released_logger_summary(self):
+        initialize_logger_settings(registry_mode='weak')
+        try:
+            test_logger = register_logger(
+                'test_rate_limiting_released', rate_limiter=RateLimiter(rate=1, clock=self.clock)
+            )
+            for _ in range(3):
+                test_logger.info('storm')
+            rate_limiter = test_logger.rate_limiter
+            del test_logger
+            gc.collect()
+            self.assertNotIn('test_rate_limiting_released', logging.Logger.manager.loggerDict)
+
+            for summary in rate_limiter.take_summaries():
+                _log_suppressed_summaries([summary])
+            self.assertEqual('test_rate_limiting_released', self._logged()[-1]['meta']['name'])
+            # logging the summary didn't create the logger again
+            self.assertNotIn('test_rate_limiting_released', logging.Logger.manager.loggerDict)
+        finally:
+            initialize_logger_settings(registry_mode='strong')
+
+    def test_global_rate_limiter(self):
+        initialize_logger_settings(rate_limiter=RateLimiter(rate=1, summary_interval=100, clock=self.clock))
+        test_logger = register_logger('test_rate_limiting_global')
+        for i in range(3):
+            test_logger.info('storm {}', rate_limit_key='storm')
+        self.assertEqual(1, len(self._logged()))
+
+        own_logger = register_logger('test_rate_limiting_own', rate_limiter=RateLimiter(rate=100, clock=self.clock))
+        for i in range(3):
+            own_logger.info('storm')
+        self.assertEqual(4, len(self._logged()))
+
+        initialize_logger_settings(rate_limiter=False)
+        test_logger.info('storm {}', rate_limit_key='storm')
+        self.assertEqual(5, len(self._logged()))
+
+
+if __name__ == '__main__':
+    unittest.main()
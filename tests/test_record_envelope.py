@@ -0,0 +1,82 @@
+import datetime
+import json
+import logging
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger import advanced_logger as advanced_logger_module
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.json_encoder.json_backends import available_json_backends
+
+__author__ = 'neil@everymundo.com'
+
+_MSGS = [
+    'foo',
+    'ünïcödé "quoted" \\ \n',
+    {'foo': [1, 2.5, None, True], 'bar': {'baz': 'qux'}},
+    ['a', 1],
+    None,
+    datetime.date(2020, 1, 2),
+]
+
+
+class AdvancedLoggingRecordEnvelopeTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.DEBUG)
+        super(AdvancedLoggingRecordEnvelopeTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(json_backend='stdlib', global_log_name_prefix='')
+        super(AdvancedLoggingRecordEnvelopeTestCase, self).tearDown()
+
+    def _log(self, lgr, msg, level=logging.INFO):
+        logged = lgr.log(level, msg, return_it=True, log_it=False)
+        return logged, json.loads(logged)
+
+    def test_same_as_encoding_whole_record(self):
+        for json_backend in available_json_backends():
+            initialize_logger_settings(json_backend=json_backend)
+            test_logger = register_logger('test_envelope "ünïcödé"')
+            for msg in _MSGS:
+                for level in (logging.DEBUG, logging.ERROR, logging.CRITICAL + 5):
+                    with self.subTest(json_backend=json_backend, msg=msg, level=level):
+                        logged, parsed = self._log(test_logger, msg, level)
+                        expected = advanced_logger_module._encode_json({
+                            'msg': msg,
+                            'meta': {
+                                'name': test_logger.name,
+                                'time': parsed['meta']['time'],
+                                'level': logging.getLevelName(level),
+                            },
+                        })
+                        self.assertEqual(expected, logged)
+
+    def test_envelope_cache_invalidation(self):
+        test_logger = register_logger('test_envelope_cache')
+        self._log(test_logger, 'foo')
+        envelope = test_logger._get_envelope(logging.INFO)
+        self.assertIs(envelope, test_logger._get_envelope(logging.INFO))
+
+        test_logger.setLevel(logging.INFO)
+        self.assertIsNot(envelope, test_logger._get_envelope(logging.INFO))
+
+        envelope = test_logger._get_envelope(logging.INFO)
+        initialize_logger_settings(json_backend='stdlib')
+        self.assertIsNot(envelope, test_logger._get_envelope(logging.INFO))
+
+        envelope = test_logger._get_envelope(logging.INFO)
+        register_logger('test_envelope_cache')
+        self.assertIsNot(envelope, test_logger._get_envelope(logging.INFO))
+
+    def test_backend_change(self):
+        if 'orjson' not in available_json_backends():
+            self.skipTest('orjson not installed')
+        test_logger = register_logger('test_envelope_backend')
+        self.assertIn('"meta": {', self._log(test_logger, 'foo')[0])
+        initialize_logger_settings(json_backend='orjson')
+        self.assertIn('"meta":{', self._log(test_logger, 'foo')[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import logging
+import unittest
+
+from advanced_logger import register_logger, clear_all_loggers, random_chance, \
+    RandomSampler, EveryNthSampler, HashSampler
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.sampling import get_ratio_sampler
+
+__author__ = 'neil@everymundo.com'
+
+
+class AdvancedLoggingSamplingTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        super(AdvancedLoggingSamplingTestCase, self).setUp()
+
+    def test_random_sampler(self):
+        sampler = RandomSampler(1, 10)
+        kept = sum(sampler.should_log() for _ in range(10000))
+        self.assertEqual(kept, sampler.kept_count)
+        self.assertEqual(10000 - kept, sampler.dropped_count)
+        self.assertTrue(700 < kept < 1300, kept)
+
+        self.assertTrue(all(RandomSampler(10, 10).should_log() for _ in range(1000)))
+        self.assertFalse(any(RandomSampler(0, 10).should_log() for _ in range(1000)))
+
+    def test_every_nth_sampler(self):
+        sampler = EveryNthSampler(2, 5)
+        self.assertEqual([True, True, False, False, False] * 3, [sampler.should_log() for _ in range(15)])
+        self.assertEqual((6, 9), (sampler.kept_count, sampler.dropped_count))
+        sampler.reset_counts()
+        self.assertEqual((0, 0), (sampler.kept_count, sampler.dropped_count))
+
+    def test_hash_sampler(self):
+        sampler = HashSampler(1, 4)
+        decisions = {trace_id: sampler.should_log(trace_id) for trace_id in range(1000)}
+        # the same trace always gets the same decision, even from another sampler
+        other_sampler = HashSampler(1, 4)
+        self.assertEqual(decisions, {trace_id: other_sampler.should_log(trace_id) for trace_id in range(1000)})
+        self.assertTrue(150 < sum(decisions.values()) < 350)
+
+    def test_invalid_ratio(self):
+        with self.assertRaises(ValueError):
+            RandomSampler(1, 0)
+        with self.assertRaises(ValueError):
+            EveryNthSampler(-1, 10)
+
+    def test_logger_sampler(self):
+        sampler = EveryNthSampler(1, 3)
+        test_logger = register_logger('test_sampling', sampler=sampler)
+        self.assertIs(sampler, test_logger.sampler)
+        logged = [test_logger.info(i, return_it=True, log_it=False) for i in range(6)]
+        self.assertEqual([True, False, False, True, False, False], [msg is not None for msg in logged])
+        # records below the logger's level aren't counted
+        test_logger.debug('foo')
+        self.assertEqual((2, 4), (sampler.kept_count, sampler.dropped_count))
+
+        # a sampler for the call wins over the logger's own
+        self.assertIsNotNone(test_logger.info('foo', return_it=True, log_it=False, sampler=RandomSampler(1, 1)))
+        self.assertIsNone(test_logger.exception('foo', return_it=True, log_it=False, sampler=RandomSampler(0, 1)))
+
+    def test_trace_id(self):
+        test_logger = register_logger('test_sampling_trace', sampler=HashSampler(1, 2))
+        for trace_id in range(20):
+            logged = [test_logger.info(i, return_it=True, log_it=False, trace_id=trace_id) for i in range(5)]
+            self.assertIn(sum(msg is not None for msg in logged), (0, 5))
+
+    def test_ratio_sampler_cached(self):
+        self.assertIs(get_ratio_sampler(1, 100), get_ratio_sampler(1, 100))
+        test_logger = register_logger('test_sampling_ratio')
+        sampler = get_ratio_sampler(0, 7)
+        test_logger.info('foo', likelihood=0, out_of=7)
+        self.assertEqual(1, sampler.dropped_count)
+
+    def test_random_chance(self):
+        self.assertTrue(all(random_chance(100, 100) for _ in range(1000)))
+        self.assertFalse(any(random_chance(0, 100) for _ in range(1000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
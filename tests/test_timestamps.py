@@ -0,0 +1,85 @@
+import json
+import logging
+import random
+import unittest
+from datetime import datetime, timezone
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level
+from advanced_logger.timestamps import IsoTimestampProvider, EpochNsTimestampProvider, get_timestamp_provider, \
+    format_timestamp
+
+__author__ = 'neil@everymundo.com'
+
+
+class _FakeClock(object):
+    def __init__(self, now_ns: int = 0):
+        self.now_ns = now_ns
+
+    def __call__(self) -> int:
+        return self.now_ns
+
+
+def _isoformat(now_ns: int) -> str:
+    return datetime.fromtimestamp(now_ns // 1000 / 1e6, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class AdvancedLoggingTimestampsTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        super(AdvancedLoggingTimestampsTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(timestamp_format='iso')
+        super(AdvancedLoggingTimestampsTestCase, self).tearDown()
+
+    def test_iso(self):
+        clock = _FakeClock()
+        provider = IsoTimestampProvider(clock)
+        rng = random.Random(0)
+        for _ in range(1000):
+            # whole microseconds, so float rounding in the expected value doesn't matter
+            clock.now_ns = rng.randrange(0, 4102444800 * 10 ** 6) * 1000
+            self.assertEqual(_isoformat(clock.now_ns), provider.now())
+            self.assertEqual('"{}"'.format(_isoformat(clock.now_ns)), provider.now_json())
+
+        clock.now_ns = 1577934245 * 10 ** 9
+        self.assertEqual('2020-01-02T03:04:05', provider.now())
+        clock.now_ns += 123456789
+        self.assertEqual('2020-01-02T03:04:05.123456', provider.now())
+        self.assertEqual('2020-01-02T03:04:05.123456', format_timestamp(1577934245.123456))
+
+    def test_second_prefix_cached(self):
+        clock = _FakeClock(1577934245 * 10 ** 9)
+        provider = IsoTimestampProvider(clock)
+        provider.now()
+        cached_second = provider._cached_second
+        clock.now_ns += 999999999
+        provider.now()
+        self.assertIs(cached_second, provider._cached_second)
+        clock.now_ns += 1
+        self.assertEqual('2020-01-02T03:04:06', provider.now())
+        self.assertIsNot(cached_second, provider._cached_second)
+
+    def test_epoch_ns(self):
+        provider = EpochNsTimestampProvider(_FakeClock(1577934245123456789))
+        self.assertEqual(1577934245123456789, provider.now())
+        self.assertEqual('1577934245123456789', provider.now_json())
+
+    def test_timestamp_format_setting(self):
+        with self.assertRaises(ValueError):
+            get_timestamp_provider('foo')
+
+        test_logger = register_logger('test_timestamps')
+        logged = json.loads(test_logger.info('foo', return_it=True, log_it=False))
+        self.assertIsInstance(datetime.fromisoformat(logged['meta']['time']), datetime)
+
+        initialize_logger_settings(timestamp_format='epoch_ns')
+        logged = json.loads(test_logger.info('foo', return_it=True, log_it=False))
+        self.assertIsInstance(logged['meta']['time'], int)
+        self.assertEqual(['name', 'time', 'level'], list(logged['meta']))
+
+
+if __name__ == '__main__':
+    unittest.main()
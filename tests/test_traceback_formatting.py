@@ -0,0 +1,112 @@
+import logging
+import re
+import traceback
+import unittest
+
+from advanced_logger import register_logger, initialize_logger_settings, clear_all_loggers
+from advanced_logger.advanced_logger import set_global_log_level, _format_traceback_line, _format_frames
+
+__author__ = 'neil@everymundo.com'
+
+# newer pythons underline the failing expression, which the formatter has never output
+_CARET_LINE_RE = re.compile(r'^\s*[~^]+\s*$')
+
+
+def _format_by_parsing(e: BaseException):
+    """
+    The previous implementation, which rendered the traceback and then parsed it line by line
+    """
+    formatted_tb = []
+    inner_formatted_tb = formatted_tb
+    for line in traceback.format_exception(type(e), e, e.__traceback__):
+        line = '\n'.join(split_line for split_line in line.split('\n') if not _CARET_LINE_RE.match(split_line))
+        formatted_line, start_of_chained_exception = _format_traceback_line(line)
+        inner_formatted_tb += formatted_line
+        if start_of_chained_exception:
+            inner_formatted_tb.append([])
+            inner_formatted_tb = inner_formatted_tb[-1]
+    return formatted_tb
+
+
+def _raise_with_cause():
+    try:
+        {}['foo']
+    except KeyError as e:
+        raise ValueError('bar') from e
+
+
+def _raise_with_context():
+    try:
+        _raise_with_cause()
+    except ValueError:
+        raise RuntimeError('baz')
+
+
+def _raise_with_suppressed_context():
+    try:
+        {}['foo']
+    except KeyError:
+        raise ValueError('bar') from None
+
+
+def _recurse(depth: int):
+    if depth:
+        _recurse(depth - 1)
+    raise ValueError('bottom')
+
+
+def _catch(fn, *args) -> BaseException:
+    try:
+        fn(*args)
+    except Exception as e:
+        return e
+    raise AssertionError('nothing raised')
+
+
+class AdvancedLoggingTracebackFormattingTestCase(unittest.TestCase):
+    def setUp(self):
+        clear_all_loggers()
+        set_global_log_level(logging.INFO)
+        self.test_logger = register_logger('test_traceback_formatting')
+        super(AdvancedLoggingTracebackFormattingTestCase, self).setUp()
+
+    def tearDown(self):
+        initialize_logger_settings(project_dir_name=None)
+        super(AdvancedLoggingTracebackFormattingTestCase, self).tearDown()
+
+    def _get_traceback(self, e: BaseException):
+        return self.test_logger.exception(e, return_it=True, log_it=False)['traceback']
+
+    def test_same_as_parsing_rendered_traceback(self):
+        cases = {
+            'cause': _catch(_raise_with_cause),
+            'context': _catch(_raise_with_context),
+            'suppressed context': _catch(_raise_with_suppressed_context),
+            'recursion': _catch(_recurse, 10),
+            'no traceback': ValueError('foo'),
+        }
+        for project_dir_name in (None, 'tests', 'not in any path'):
+            initialize_logger_settings(project_dir_name=project_dir_name)
+            for name, e in cases.items():
+                with self.subTest(name, project_dir_name=project_dir_name):
+                    self.assertEqual(_format_by_parsing(e), self._get_traceback(e))
+
+    def test_frames_formatted_once_per_location(self):
+        _format_frames.cache_clear()
+        for _ in range(3):
+            self._get_traceback(_catch(_raise_with_cause))
+        cache_info = _format_frames.cache_info()
+        # one traceback for each exception in the chain
+        self.assertEqual(2, cache_info.misses)
+        self.assertEqual(4, cache_info.hits)
+
+        # the cached frames can't be changed through a logged traceback
+        formatted_tb = self._get_traceback(_catch(_raise_with_suppressed_context))
+        formatted_tb[1][0][0] = 'changed'
+        self.assertEqual(_format_by_parsing(_catch(_raise_with_suppressed_context)), self._get_traceback(
+            _catch(_raise_with_suppressed_context)
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()